@@ -0,0 +1,59 @@
+"""add covering (user_id, created_at) index on mood_logs
+
+Revision ID: 3c9d41f2a7b6
+Revises: 8e5f0c4bc987
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d41f2a7b6'
+down_revision: Union[str, Sequence[str], None] = '8e5f0c4bc987'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_mood_logs_user_id_created_at',
+            'mood_logs',
+            ['user_id', sa.text('created_at DESC')],
+            unique=False,
+            postgresql_include=['mood_value', 'energy_level'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Duplicates the primary key index and only adds write amplification
+        op.drop_index(
+            op.f('ix_mood_logs_id'),
+            table_name='mood_logs',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_mood_logs_id'),
+            'mood_logs',
+            ['id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_mood_logs_user_id_created_at',
+            table_name='mood_logs',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
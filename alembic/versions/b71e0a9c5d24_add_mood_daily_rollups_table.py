@@ -0,0 +1,42 @@
+"""add mood_daily_rollups table
+
+Revision ID: b71e0a9c5d24
+Revises: 3c9d41f2a7b6
+Create Date: 2026-10-18 11:40:06.118254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e0a9c5d24'
+down_revision: Union[str, Sequence[str], None] = '3c9d41f2a7b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Populate with `python -m scripts.backfill_mood_rollups` after upgrading
+    op.create_table(
+        'mood_daily_rollups',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('log_count', sa.Integer(), nullable=False),
+        sa.Column('mood_sum', sa.Integer(), nullable=False),
+        sa.Column('mood_min', sa.Integer(), nullable=False),
+        sa.Column('mood_max', sa.Integer(), nullable=False),
+        sa.Column('energy_sum', sa.Integer(), nullable=False),
+        sa.Column('energy_min', sa.Integer(), nullable=False),
+        sa.Column('energy_max', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('mood_daily_rollups')
@@ -0,0 +1,68 @@
+"""add weather_conditions table and structured weather columns on mood_logs
+
+Revision ID: d4f2a8c61b37
+Revises: b71e0a9c5d24
+Create Date: 2026-10-18 15:02:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# OpenWeather's condition descriptions plus "other" for any other weather text, as of this
+# revision (src.shared.models.WEATHER_CONDITIONS may grow; names missing here are inserted
+# on first use)
+CONDITIONS = [
+    "thunderstorm with light rain", "thunderstorm with rain", "thunderstorm with heavy rain",
+    "light thunderstorm", "thunderstorm", "heavy thunderstorm", "ragged thunderstorm",
+    "thunderstorm with light drizzle", "thunderstorm with drizzle", "thunderstorm with heavy drizzle",
+    "light intensity drizzle", "drizzle", "heavy intensity drizzle", "light intensity drizzle rain",
+    "drizzle rain", "heavy intensity drizzle rain", "shower rain and drizzle",
+    "heavy shower rain and drizzle", "shower drizzle",
+    "light rain", "moderate rain", "heavy intensity rain", "very heavy rain", "extreme rain",
+    "freezing rain", "light intensity shower rain", "shower rain", "heavy intensity shower rain",
+    "ragged shower rain",
+    "light snow", "snow", "heavy snow", "sleet", "light shower sleet", "shower sleet",
+    "light rain and snow", "rain and snow", "light shower snow", "shower snow", "heavy shower snow",
+    "mist", "smoke", "haze", "sand/dust whirls", "fog", "sand", "dust", "volcanic ash", "squalls", "tornado",
+    "clear sky", "few clouds", "scattered clouds", "broken clouds", "overcast clouds",
+    "other",
+]
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f2a8c61b37'
+down_revision: Union[str, Sequence[str], None] = 'b71e0a9c5d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Populate existing rows with `python -m scripts.backfill_weather_columns` after upgrading
+    weather_conditions = op.create_table(
+        'weather_conditions',
+        sa.Column('id', sa.SmallInteger(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(weather_conditions, [{'name': name} for name in CONDITIONS])
+    # Nullable columns without defaults: no table rewrite on Postgres
+    op.add_column('mood_logs', sa.Column('temperature_c', sa.Float(), nullable=True))
+    op.add_column('mood_logs', sa.Column('condition_id', sa.SmallInteger(), nullable=True))
+    op.create_foreign_key(
+        'fk_mood_logs_condition_id_weather_conditions',
+        'mood_logs', 'weather_conditions',
+        ['condition_id'], ['id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('fk_mood_logs_condition_id_weather_conditions', 'mood_logs', type_='foreignkey')
+    op.drop_column('mood_logs', 'condition_id')
+    op.drop_column('mood_logs', 'temperature_c')
+    op.drop_table('weather_conditions')
@@ -0,0 +1,58 @@
+"""add generated notes_tsv column and GIN index for journal search
+
+Revision ID: e8b3c5d19a42
+Revises: d4f2a8c61b37
+Create Date: 2026-10-18 16:21:09.774310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3c5d19a42'
+down_revision: Union[str, Sequence[str], None] = 'd4f2a8c61b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The config must match MOOD_SEARCH_CONFIG in src/shared/models.py. Adding a stored
+    # generated column rewrites mood_logs once.
+    op.add_column(
+        'mood_logs',
+        sa.Column(
+            'notes_tsv',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english'::regconfig, coalesce(notes, ''))", persisted=True),
+            nullable=True,
+        )
+    )
+    # btree_gin lets one GIN index serve "user_id = ? AND notes_tsv @@ ?" (trusted extension since PG 13)
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_mood_logs_user_id_notes_tsv',
+            'mood_logs',
+            ['user_id', 'notes_tsv'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_mood_logs_user_id_notes_tsv',
+            table_name='mood_logs',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column('mood_logs', 'notes_tsv')
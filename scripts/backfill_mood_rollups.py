@@ -0,0 +1,40 @@
+"""
+Backfill (or rebuild) mood_daily_rollups from mood_logs
+
+Run after `alembic upgrade head` adds the rollup table, or any time the rollups
+need to be recomputed. Each user is rebuilt in its own transaction.
+
+Usage (from the repo root, with the DATABASE_* variables set):
+    python -m scripts.backfill_mood_rollups
+    python -m scripts.backfill_mood_rollups --user-id 42
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from src.shared import database
+from src.shared.models import MoodLog, MoodLogRepositoryV2
+
+
+async def backfill(user_ids: list[int] | None):
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        if user_ids is None:
+            user_ids = session.execute(select(MoodLog.user_id).distinct().order_by(MoodLog.user_id)).scalars().all()
+
+        repo = MoodLogRepositoryV2(session)
+        for done, user_id in enumerate(user_ids, start=1):
+            await repo.rebuild_rollups(user_id)
+            print(f"[{done}/{len(user_ids)}] rebuilt rollups for user {user_id}")
+    finally:
+        session.close()
+        await database.dispose_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="Only rebuild these users (repeatable)")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.user_ids))
@@ -0,0 +1,38 @@
+"""
+Backfill mood_logs.temperature_c/condition_id from the free-text weather column
+
+Run after `alembic upgrade head` adds the columns. Rows are parsed and updated in
+batches of --batch-size, each in its own transaction, so the command can be
+stopped and re-run; rows already backfilled are skipped.
+
+Usage (from the repo root, with the DATABASE_* variables set):
+    python -m scripts.backfill_weather_columns
+    python -m scripts.backfill_weather_columns --batch-size 5000
+"""
+import argparse
+import asyncio
+
+from src.shared import database
+from src.shared.models import MoodLogRepositoryV2
+
+
+async def backfill(batch_size: int):
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        repo = MoodLogRepositoryV2(session)
+        last_id = 0
+        batches = 0
+        while (last_id := await repo.backfill_weather_columns(after_id=last_id, batch_size=batch_size)) is not None:
+            batches += 1
+            print(f"batch {batches}: backfilled up to mood log {last_id}")
+    finally:
+        session.close()
+        await database.dispose_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UPDATE transaction")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size))
@@ -0,0 +1,70 @@
+"""
+Latency benchmark for GET /mood/stats/{username}
+
+Fires N concurrent requests at a running server and reports latency percentiles.
+Run it once against a build from before a change and once after, and compare.
+
+Usage (from the repo root, with the server up):
+    python -m scripts.bench_mood_stats --username foo
+    python -m scripts.bench_mood_stats --username foo --concurrency 200 --rounds 5 --label after
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_round(client: httpx.AsyncClient, path: str, concurrency: int) -> tuple[list[float], int]:
+    async def one_call() -> tuple[float, int]:
+        start = time.perf_counter()
+        response = await client.get(path)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    results = await asyncio.gather(*(one_call() for _ in range(concurrency)))
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status != 200)
+    return latencies, errors
+
+
+async def main(args):
+    path = f"/mood/stats/{args.username}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+        # Warm up the server's connection pool before measuring
+        await run_round(client, path, min(args.concurrency, 10))
+
+        latencies = []
+        errors = 0
+        wall_start = time.perf_counter()
+        for _ in range(args.rounds):
+            round_latencies, round_errors = await run_round(client, path, args.concurrency)
+            latencies.extend(round_latencies)
+            errors += round_errors
+        wall = time.perf_counter() - wall_start
+
+    print(f"[{args.label}] {len(latencies)} requests to {path} ({args.concurrency} concurrent, {args.rounds} rounds)")
+    print(f"  p50:  {percentile(latencies, 50):8.1f} ms")
+    print(f"  p95:  {percentile(latencies, 95):8.1f} ms")
+    print(f"  p99:  {percentile(latencies, 99):8.1f} ms")
+    print(f"  max:  {max(latencies):8.1f} ms")
+    print(f"  mean: {statistics.mean(latencies):8.1f} ms")
+    print(f"  throughput: {len(latencies) / wall:.1f} req/s, errors: {errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8200")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--label", default="run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Latency and memory benchmark for MoodLogRepositoryV2.get_weekly_mood_stats
+
+Seeds an in-memory SQLite database with one user whose history grows from 100 to
+1,000,000 logs (spread over the same three years), then times the weekly stats:
+  - legacy:   the old approach, hydrating every ORM row and grouping in Python
+  - rollups:  the default GROUP BY over mood_daily_rollups
+  - local tz: the GROUP BY over mood_logs used when a time zone is requested
+
+Usage (from the repo root):
+    python -m scripts.bench_weekly_stats
+    python -m scripts.bench_weekly_stats --sizes 100 10000 1000000 --legacy-max 100000
+"""
+import argparse
+import asyncio
+import calendar
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from src.shared.models import Base, MoodLog, MoodLogRepositoryV2
+
+HISTORY = timedelta(days=3 * 365)
+SEED_CHUNK = 50_000
+
+
+def seed(session: Session, user_id: int, size: int):
+    start = datetime(2022, 1, 1)
+    step = HISTORY / size
+    for chunk_start in range(0, size, SEED_CHUNK):
+        session.execute(insert(MoodLog), [{
+            "user_id": user_id,
+            "mood_value": random.randint(1, 5),
+            "energy_level": random.randint(1, 5),
+            "created_at": start + step * i
+        } for i in range(chunk_start, min(size, chunk_start + SEED_CHUNK))])
+    asyncio.run(MoodLogRepositoryV2(session).rebuild_rollups(user_id))
+
+
+async def legacy_weekly_stats(repo: MoodLogRepositoryV2, user_id: int) -> list[dict]:
+    logs = (await repo._execute(select(MoodLog).where(MoodLog.user_id == user_id))).scalars().all()
+    groups = {}
+    for log in logs:
+        groups.setdefault(calendar.day_name[log.created_at.weekday()], []).append(log)
+    return [{
+        "day": day,
+        "avg_mood": sum(log.mood_value for log in day_logs) / len(day_logs),
+        "avg_energy": sum(log.energy_level for log in day_logs) / len(day_logs),
+        "total_logs": len(day_logs)
+    } for day, day_logs in groups.items()]
+
+
+def measure(session: Session, run, repeats: int) -> tuple[float, float]:
+    latencies = []
+    peak = 0
+    for _ in range(repeats):
+        session.expunge_all()
+        tracemalloc.start()
+        begin = time.perf_counter()
+        asyncio.run(run())
+        latencies.append((time.perf_counter() - begin) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(latencies), peak / 1024
+
+
+def main(args):
+    print(f"{'rows':>10} | {'variant':>9} | {'median ms':>10} | {'peak KiB':>10}")
+    print("-" * 50)
+
+    for size in args.sizes:
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as session:
+            session.execute(text("INSERT INTO users (id, name, email, hashed_password, tier) VALUES (1, 'bench', 'bench', 'x', 1)"))
+            seed(session, 1, size)
+            session.commit()
+
+            repo = MoodLogRepositoryV2(session)
+            variants = [
+                ("rollups", lambda: repo.get_weekly_mood_stats(1)),
+                ("local tz", lambda: repo.get_weekly_mood_stats(1, tz=args.tz)),
+            ]
+            if size <= args.legacy_max:
+                variants.insert(0, ("legacy", lambda: legacy_weekly_stats(repo, 1)))
+
+            for name, run in variants:
+                latency, peak = measure(session, run, args.repeats)
+                print(f"{size:>10} | {name:>9} | {latency:>10.2f} | {peak:>10.1f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=100_000, help="Skip the legacy variant above this many rows")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tz", default="America/Vancouver")
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""
+Argon2 cost calibration for the password pool
+
+Benchmarks Argon2id verification on this host for a grid of memory and time costs
+and picks the strongest setting whose median verify latency stays under a target.
+Memory is preferred over iterations (it is what makes GPU cracking expensive).
+The chosen values are printed as environment variables for ARGON2_* settings;
+existing users are moved onto them transparently on their next login.
+
+Usage (from the repo root):
+    python -m scripts.calibrate_argon2
+    python -m scripts.calibrate_argon2 --target-ms 250 --parallelism 2 --memory-kib 19456 65536 131072
+"""
+import argparse
+import statistics
+import time
+
+from src.mindfuly.auth.passwords import configured_password_hash
+
+SAMPLE_INPUT = "correct horse battery staple"
+
+
+def measure(memory_cost: int, time_cost: int, parallelism: int, repeats: int) -> float:
+    password_hash = configured_password_hash(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hashed = password_hash.hash(SAMPLE_INPUT)
+
+    latencies = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        password_hash.verify(SAMPLE_INPUT, hashed)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(latencies)
+
+
+def main(args):
+    print(f"{'memory KiB':>10} | {'time cost':>9} | {'median ms':>10}")
+    print("-" * 36)
+
+    best = None
+    for memory_cost in sorted(args.memory_kib):
+        for time_cost in range(1, args.max_time_cost + 1):
+            latency = measure(memory_cost, time_cost, args.parallelism, args.repeats)
+            print(f"{memory_cost:>10} | {time_cost:>9} | {latency:>10.2f}")
+            if latency > args.target_ms:
+                break # More iterations at this memory cost only get slower
+            best = (memory_cost, time_cost, latency)
+
+    print()
+    if best is None:
+        print(f"No setting verifies within {args.target_ms} ms; lower --memory-kib or raise --target-ms")
+        return
+
+    memory_cost, time_cost, latency = best
+    print(f"Strongest setting under {args.target_ms} ms ({latency:.2f} ms per verify):")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_PARALLELISM={args.parallelism}")
+    print()
+    print(f"With PASSWORD_HASH_WORKERS=N that is roughly N * {1000 / latency:.1f} logins/s per process")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=100, help="Highest acceptable median verify latency")
+    parser.add_argument("--memory-kib", type=int, nargs="+", default=[19_456, 47_104, 65_536, 131_072])
+    parser.add_argument("--max-time-cost", type=int, default=6)
+    parser.add_argument("--parallelism", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
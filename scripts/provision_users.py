@@ -0,0 +1,79 @@
+"""
+Bulk-provision users from a CSV or NDJSON file
+
+Streams the input (CSV needs a name,email,password[,tier] header; NDJSON one object
+per line), hashes passwords across a process pool with the configured ARGON2_*
+parameters, and inserts them in batches with ON CONFLICT DO NOTHING. Every input
+row gets a line in the result file: created (with its id), duplicate_name,
+duplicate_email or invalid (with the validation errors).
+
+Usage (from the repo root, with the DATABASE_* variables set):
+    python -m scripts.provision_users partner_users.csv --output results.csv
+    python -m scripts.provision_users partner_users.ndjson --workers 8 --batch-size 2000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.shared import database
+from src.shared.provisioning import USER_PROVISION_BATCH_SIZE, UserProvisioner, parse_rows, row_format, write_results
+
+_password_hash = None
+
+
+def _hash_password(password: str) -> str:
+    # One PasswordHash per worker process, built on first use
+    global _password_hash
+    if _password_hash is None:
+        from src.mindfuly.auth.passwords import configured_password_hash
+        _password_hash = configured_password_hash()
+    return _password_hash.hash(password)
+
+
+async def provision(args):
+    database.init_db()
+    session = database.SessionLocal()
+    provisioner = UserProvisioner(session)
+    results = []
+    started = time.perf_counter()
+
+    try:
+        with open(args.input, newline="", encoding="utf-8-sig") as f, ProcessPoolExecutor(max_workers=args.workers) as executor:
+            rows = parse_rows(f, row_format(args.input))
+            while batch := list(itertools.islice(rows, args.batch_size)):
+                valid = []
+                for row, entry, errors in batch:
+                    if errors:
+                        results.append({"row": row, "status": "invalid", "errors": errors})
+                    else:
+                        valid.append((row, entry))
+
+                hashes = executor.map(_hash_password, [entry.password for _, entry in valid], chunksize=16)
+                results.extend(await provisioner.insert_batch([
+                    (row, entry, hashed_password) for (row, entry), hashed_password in zip(valid, hashes)
+                ]))
+                print(f"{len(results)} rows processed ({time.perf_counter() - started:.1f}s)")
+    finally:
+        session.close()
+        await database.dispose_db()
+
+    results.sort(key=lambda result: result["row"])
+    write_results(results, args.output)
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"Done in {time.perf_counter() - started:.1f}s: {summary}. Per-row results in {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV (.csv) or NDJSON file of users")
+    parser.add_argument("--output", default="provision_results.ndjson", help="Result file; .csv for CSV, anything else for NDJSON")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing processes")
+    parser.add_argument("--batch-size", type=int, default=USER_PROVISION_BATCH_SIZE, help="Users per INSERT")
+    asyncio.run(provision(parser.parse_args()))
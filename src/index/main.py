@@ -2,14 +2,19 @@ from fastapi import Depends, HTTPException
 from nicegui import ui
 import logging, random
 import asyncio
+import uuid
 from datetime import timedelta
 from typing import Optional
 import httpx
 
 from src.mindfuly.routes.users import create_user
 from user_service_v2.models.user import UserSchema, get_user_repository_v2, UserRepositoryV2
-from src.shared.models import get_mood_log_repository_v2, MoodLogRepositoryV2
-from src.mindfuly.auth.jwt_utils import create_access_token, verify_token
+from src.shared.models import OTHER_WEATHER_CONDITION, get_mood_log_repository_v2, MoodLogRepositoryV2
+from src.shared.user_cache import get_cached_user, update_user, delete_user
+from src.shared import database, write_behind
+from src.shared.idempotency import run_idempotent
+from src.mindfuly.auth.passwords import create_account, verify_password
+from src.mindfuly.auth.jwt_utils import create_access_token, token_claims, verify_token
 
 logger = logging.getLogger('uvicorn.error')
 
@@ -185,10 +190,17 @@ async def login_page(user_repo: UserRepositoryV2 = Depends(get_user_repository_v
                     error_label.visible = True
                     return
 
-                if await user_repo.verify_password(user, password_input.value):
+                try:
+                    password_ok = await verify_password(user, password_input.value, user_repo)
+                except HTTPException:
+                    error_label.text = "Too many sign-ins right now. Please try again in a moment."
+                    error_label.visible = True
+                    return
+
+                if password_ok:
                     # Create JWT token
                     access_token = create_access_token(
-                        data={"sub": username_input.value},
+                        data=token_claims(user),
                         expires_delta=timedelta(hours=24)
                     )
                     
@@ -277,7 +289,12 @@ async def signup_page(user_repo: UserRepositoryV2 = Depends(get_user_repository_
                     error_label.visible = True
                     return
 
-                result = await user_repo.create(username_input.value, email_input.value, password_input.value, tier=1)
+                try:
+                    result = await create_account(user_repo, username_input.value, email_input.value, password_input.value, tier=1)
+                except HTTPException as e:
+                    error_label.text = e.detail
+                    error_label.visible = True
+                    return
                 if not result:
                     error_label.text = "Username or email already exists. Please try again."
                     error_label.visible = True
@@ -341,10 +358,12 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
     if not authenticated_user:
         return
     
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
     if not user: 
         ui.label("User not found.")
         return
+
+    dashboard = await mood_log_repo.get_dashboard(user.id, sections=("weekly_mood_stats", "weather_mood_stats"))
     
     # Add custom styles for dashboard
     ui.add_head_html('''
@@ -444,7 +463,13 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                 ui.label("Why do you feel this way today?").classes("text-xl font-bold mb-4")
                 notes_textarea = ui.textarea(placeholder="Write your notes here...").classes("w-full mb-4 text-center").props("outlined autogrow rows=4")
 
+                # One key per form fill: a double click or retry replays the first save instead of writing twice
+                submission_key = uuid.uuid4().hex
+
                 async def submit_mood_log():
+                    nonlocal submission_key
+                    key = submission_key
+
                     # Get weather data from the weather label
                     try:
                         weather_text = await ui.run_javascript('document.getElementById("weather-text")?.innerText || ""', timeout=1.0)
@@ -456,15 +481,25 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                     energy_level = int(energy_slider.value)
                     notes = notes_textarea.value.strip() if notes_textarea.value and notes_textarea.value.strip() else None
                     
-                    try:
-                        mood_log = await mood_log_repo.create_mood_log(
+                    async def save():
+                        mood_log, _ = await write_behind.create_mood_log(
+                            mood_log_repo,
                             user_id=user.id,
                             mood_value=mood_value,
                             energy_level=energy_level,
                             notes=notes,
                             weather=weather
                         )
-                        if mood_log:
+                        return (201, {}) if mood_log else (409, {})
+
+                    try:
+                        status_code, _, _ = await run_idempotent(
+                            ("mood_log", user.id),
+                            key,
+                            {"mood_value": mood_value, "energy_level": energy_level, "notes": notes, "weather": weather},
+                            save
+                        )
+                        if status_code < 300:
                             ui.notify("Note Submitted!", color="green")
                             # Clear the form
                             mood_slider.value = 5
@@ -472,9 +507,14 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                             notes_textarea.value = ""
                         else:
                             ui.notify('Failed to save journal entry. Please try again.', color='red', icon='error')
+                    except write_behind.WriteBehindFull:
+                        ui.notify('Lots of people are journaling right now. Please try again in a moment.', color='orange', icon='schedule')
                     except Exception as e:
                         logger.error(f"Error saving mood log: {e}")
                         ui.notify('Error saving journal entry. Please try again.', color='red', icon='error')
+                    finally:
+                        # Failures aren't remembered, so the next click is a fresh attempt either way
+                        submission_key = uuid.uuid4().hex
 
                 ui.button("Submit!", on_click=submit_mood_log).classes("bg-blue-500 text-white px-6 py-3 rounded-lg shadow hover:bg-blue-600")
 
@@ -533,18 +573,10 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                 .props("id=weather-text")
 
             with ui.column().classes("bg-yellow-50 rounded-xl border p-4 items-center w-full text-center"):
-                weather_stats = await mood_log_repo.get_weather_mood_stats(user.id)
-                weekly_stats = await mood_log_repo.get_weekly_mood_stats(user.id)
-
-                def extract_weather_type(full_weather: str) -> str:
+                # "other" isn't a weather the insights can name
+                weather_stats = [entry for entry in dashboard["weather_mood_stats"] if entry["weather"] != OTHER_WEATHER_CONDITION]
+                weekly_stats = dashboard["weekly_mood_stats"]
 
-                    if "–" in full_weather:
-                        weather_only = full_weather.split("–")[1].strip()
-                    else:
-                        weather_only = full_weather.strip()
-
-                    return weather_only
-                
                 def get_max_mood_weather(weather_stats):
                     if not weather_stats:
                         return "no data available yet."
@@ -593,14 +625,10 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                 insights_mood_weather = []
                 
                 if (len(weather_stats) >= 1):
-                    no_temp1 = get_max_mood_weather(weather_stats)
-                    happiest_mood_weather = extract_weather_type(no_temp1)
-
-                    no_temp2 = get_min_mood_weather(weather_stats)
-                    saddest_mood_weather = extract_weather_type(no_temp2)
-
-                    no_temp3 = get_neutral_mood_weather(weather_stats)
-                    neutral_mood_weather = extract_weather_type(no_temp3)
+                    # Stats are grouped by condition, so the names carry no temperature
+                    happiest_mood_weather = get_max_mood_weather(weather_stats)
+                    saddest_mood_weather = get_min_mood_weather(weather_stats)
+                    neutral_mood_weather = get_neutral_mood_weather(weather_stats)
 
                     insights_mood_weather.append(f"You tend to feel the most happy when it is {happiest_mood_weather}")
                     insights_mood_weather.append(f"You tend to feel the saddest when it is {saddest_mood_weather}")
@@ -934,8 +962,8 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                     // Show loading state on the selected mood display
                     selectedMoodDisplay.innerText = 'Loading music...';
                     
-                    // Request more videos to account for unavailable ones
-                    const response = await fetch(`/youtube/search/by-mood/${{currentMood}}?max_results=15`);
+                    // Only embeddable videos up to an hour long, so the player doesn't stall on streams
+                    const response = await fetch(`/youtube/search/by-mood/${{currentMood}}?max_results=15&embeddable_only=true&max_duration=3600`);
                     
                     if (!response.ok) {{
                         const errorData = await response.json();
@@ -1022,7 +1050,10 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
                 
                 const upcomingVideos = videoQueue.slice(currentVideoIndex + 1, currentVideoIndex + 4);
                 ytQueueList.innerHTML = upcomingVideos.map((video, idx) => {{
-                    return `<div class="mb-1">${{idx + 1}}. ${{video.title}}</div>`;
+                    return `<div class="mb-1 flex items-center gap-2">
+                        <img src="/media/thumb/${{video.video_id}}?w=120" width="64" height="36" loading="lazy" alt="" class="rounded">
+                        <span>${{idx + 1}}. ${{video.title}}</span>
+                    </div>`;
                 }}).join('') || 'No more videos';
             }}
             
@@ -1052,13 +1083,31 @@ async def user_home_screen(username: str, user_repo: UserRepositoryV2 = Depends(
     ''', timeout=5.0)
 
 
+async def fetch_journal_page(user_id: int, search_query: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    A page of the journal, or of a search over it, for a UI event: (logs, highlights, cursor).
+    Those events run after the page's own session has been closed, so each read opens a
+    session that hands its connection back when done.
+    """
+    if database.AsyncSessionLocal is None:
+        database.init_db()
+
+    async with database.AsyncSessionLocal() as db:
+        mood_log_repo = MoodLogRepositoryV2(db)
+        if search_query:
+            results, cursor = await mood_log_repo.search_mood_logs(user_id, search_query, limit=20, cursor=cursor)
+            return [log for log, _, _ in results], [highlight for _, _, highlight in results], cursor
+        logs, cursor = await mood_log_repo.get_mood_logs_page(user_id, limit=20, cursor=cursor)
+        return logs, None, cursor
+
+
 @ui.page("/users/{username}/journal")
 async def user_journal_page(username: str, user_repo: UserRepositoryV2 = Depends(get_user_repository_v2), mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)):
     authenticated_user = await require_auth(username)
     if not authenticated_user:
         return
     
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
     if not user: 
         ui.label("User not found.")
         return
@@ -1112,21 +1161,57 @@ async def user_journal_page(username: str, user_repo: UserRepositoryV2 = Depends
     with ui.column().classes('w-full items-center mt-10 mb-8 px-4'):
         ui.label(f"{username}'s Journal").classes('text-4xl font-bold text-center mb-1 text-gray-800')
 
-    mood_logs = await mood_log_repo.get_mood_logs(user.id, limit=20)
+    mood_logs, next_cursor = await mood_log_repo.get_mood_logs_page(user.id, limit=20)
+    search_query = None
+
+    def render_logs(logs, highlights=None):
+        for index, log in enumerate(logs):
+            with ui.card().classes("dashboard-card p-6 mb-4 items-center text-center"):
+                with ui.row().classes("justify-between items-center mb-2"):
+                    ui.label(f"Mood: {log.mood_value}").classes("font-semibold text-lg text-purple-600")
+                    ui.label(f"Energy: {log.energy_level}").classes("font-semibold text-lg text-blue-600")
+                    ui.label(f"Created on: {log.created_at.date()}").classes("text-gray-500 text-sm")
+                if highlights and highlights[index]:
+                    # Already HTML-escaped by the repository, with matches in <mark>
+                    ui.html(highlights[index], sanitize=False).classes("mt-2 text-gray-700")
+                elif log.notes:
+                    ui.label(log.notes).classes("mt-2 text-gray-700")
 
     with ui.column().classes('w-full max-w-4xl mx-auto px-4 items-center'):
         if not mood_logs:
             with ui.card().classes('dashboard-card p-8 text-center items-center'):
                 ui.label("No journal entries found. Start logging your mood today!").classes("text-gray-600 italic text-lg")
         else:
-            for log in mood_logs:
-                with ui.card().classes("dashboard-card p-6 mb-4 items-center text-center"):
-                    with ui.row().classes("justify-between items-center mb-2"):
-                        ui.label(f"Mood: {log.mood_value}").classes("font-semibold text-lg text-purple-600")
-                        ui.label(f"Energy: {log.energy_level}").classes("font-semibold text-lg text-blue-600")
-                        ui.label(f"Created on: {log.created_at.date()}").classes("text-gray-500 text-sm")
-                    if log.notes:
-                        ui.label(log.notes).classes("mt-2 text-gray-700")
+            async def run_search():
+                nonlocal search_query, next_cursor
+                search_query = search_input.value.strip() or None
+                logs, highlights, next_cursor = await fetch_journal_page(user.id, search_query)
+                logs_column.clear()
+                with logs_column:
+                    if logs:
+                        render_logs(logs, highlights)
+                    else:
+                        ui.label("No entries match your search.").classes("text-gray-600 italic text-lg")
+                load_more_button.visible = next_cursor is not None
+
+            with ui.row().classes('w-full items-center gap-2 mb-4'):
+                search_input = ui.input(placeholder="Search your notes...").classes("flex-1").props("outlined clearable").on("keydown.enter", run_search)
+                ui.button("Search", on_click=run_search).classes("bg-blue-500 text-white px-4 py-2 rounded-lg")
+
+            logs_column = ui.column().classes('w-full items-center')
+            with logs_column:
+                render_logs(mood_logs)
+
+            # Older entries (or further search results) are fetched page by page with the keyset cursor
+            async def load_more():
+                nonlocal next_cursor
+                older_logs, highlights, next_cursor = await fetch_journal_page(user.id, search_query, next_cursor)
+                with logs_column:
+                    render_logs(older_logs, highlights)
+                load_more_button.visible = next_cursor is not None
+
+            load_more_button = ui.button("Load older entries", on_click=load_more).classes("bg-blue-500 text-white px-6 py-3 rounded-lg shadow hover:bg-blue-600 mb-8")
+            load_more_button.visible = next_cursor is not None
 
 
 @ui.page("/users/{username}/analytics")
@@ -1135,10 +1220,12 @@ async def user_analytics_page(username: str, user_repo: UserRepositoryV2 = Depen
     if not authenticated_user:
         return
     
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
     if not user: 
         ui.label("User not found.")
         return
+
+    dashboard = await mood_log_repo.get_dashboard(user.id, log_limit=20, running_limit=20, sections=("running_means", "mood_logs"))
     
     ui.add_head_html('''
         <style>
@@ -1189,8 +1276,8 @@ async def user_analytics_page(username: str, user_repo: UserRepositoryV2 = Depen
     with ui.column().classes('w-full items-center mt-10 mb-8 px-4'):
         ui.label(f"{username}'s Analytics").classes('text-4xl font-bold text-center mb-1 text-gray-800')
 
-    running_means = await mood_log_repo.get_running_means(user.id, limit=20)
-    mood_logs = await mood_log_repo.get_mood_logs(user.id, limit=20)
+    running_means = dashboard["running_means"]
+    mood_logs = dashboard["mood_logs"]
 
     if not mood_logs:
         with ui.card().classes('dashboard-card p-8 text-center max-w-4xl mx-auto mt-6'):
@@ -1289,7 +1376,7 @@ async def users_settings_page(username: str, user_repo: UserRepositoryV2 = Depen
     if not authenticated_user:
         return
     
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
     
     ui.add_head_html('''
         <style>
@@ -1339,7 +1426,8 @@ async def users_settings_page(username: str, user_repo: UserRepositoryV2 = Depen
         new_name = name_input.value.strip()
         new_email = email_input.value.strip()
 
-        updated_user = await user_repo.update_user(
+        updated_user = await update_user(
+            user_repo,
             current_user,
             new_name or None,
             new_email or None,
@@ -1359,7 +1447,7 @@ async def users_settings_page(username: str, user_repo: UserRepositoryV2 = Depen
             ui.notify("User not found", color="red")
             return
     
-        await user_repo.delete(current_user.id)
+        await delete_user(user_repo, current_user.id)
         ui.notify("User Deleted Successfully!", color="green", icon='check_circle')
         await asyncio.sleep(0.7)
         await ui.run_javascript("localStorage.clear()")
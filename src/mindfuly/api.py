@@ -1,13 +1,35 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.mindfuly.routes import authorization, users, mood, weather, youtube
+from src.mindfuly.routes import authorization, users, mood, weather, youtube, media, metrics
+from src.mindfuly.auth.passwords import password_pool
+from src.shared import database, http_clients
+from src.shared.write_behind import mood_write_behind
 
 from index.main import ui
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the database and upstream connection pools once, before taking traffic
+    database.init_db()
+    await database.warm_up_pool()
+    http_clients.start_clients()
+    youtube.mood_reservoir.start()
+    mood_write_behind.start()
+    yield
+    # Drain queued mood logs while the database pool is still open
+    await mood_write_behind.stop()
+    await youtube.mood_reservoir.stop()
+    await http_clients.close_clients()
+    password_pool.shutdown()
+    await database.dispose_db()
+
+
 app = FastAPI(
     title="Mindfuly",
     version="1.0.0",
     decription="Handles mood logs, YouTube music sessions, weather context, and user authentication",
+    lifespan=lifespan,
 )
 
 app.include_router(authorization.router)
@@ -15,6 +37,8 @@ app.include_router(users.router)
 app.include_router(mood.router)
 app.include_router(youtube.router)
 app.include_router(weather.router)
+app.include_router(media.router)
+app.include_router(metrics.router)
 
 ui.run_with(
     app,
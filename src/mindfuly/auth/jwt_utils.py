@@ -1,10 +1,15 @@
 # src/mindfuly/auth/jwt_utils.py
 
+import hashlib
 import os
+import time
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel
+
+from src.shared.cache import TTLCache
 
 # Load from environment variable
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
@@ -16,6 +21,27 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/authorization/token")
 
+# Comma-separated user ids allowed to call admin endpoints. Checked against the token's
+# uid claim, which (unlike the username) can't be taken over by registering or renaming
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+# Already-verified tokens, keyed by SHA-256 digest and kept only until each token's exp
+VERIFIED_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("VERIFIED_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+verified_token_cache = TTLCache(VERIFIED_TOKEN_CACHE_MAX_ENTRIES, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+class TokenClaims(BaseModel):
+    """
+    Identity carried by a verified access token; user_id and tier are None on
+    tokens minted before they were added as claims
+    """
+    username: str
+    user_id: int | None = None
+    tier: int | None = None
+    expires_at: float
+
+    model_config = {"frozen": True}
+
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
@@ -27,22 +53,61 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def verify_token(token: str) -> str:
+def token_claims(user) -> dict:
+    """
+    Claims to mint for a user, so verified requests need no users lookup
+    """
+    return {"sub": user.name, "uid": user.id, "tier": user.tier}
+
+
+def verify_token_claims(token: str) -> TokenClaims:
+
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = verified_token_cache.get(digest)
+    if claims is not None:
+        return claims
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
 
-        if username is None:
+        if username is None or payload.get("exp") is None:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        return username
+        claims = TokenClaims(
+            username=username,
+            user_id=payload.get("uid"),
+            tier=payload.get("tier"),
+            expires_at=float(payload["exp"])
+        )
     
-    except JWTError:
+    except (JWTError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    ttl = claims.expires_at - time.time()
+    if ttl > 0:
+        verified_token_cache.set(digest, claims, ttl_seconds=ttl)
+    return claims
+
+
+def verify_token(token: str) -> str:
+
+    return verify_token_claims(token).username
+
+
+async def get_current_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+
+    return verify_token_claims(token)
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
 
     username = verify_token(token)
-    return username
\ No newline at end of file
+    return username
+
+
+async def require_admin(claims: TokenClaims = Depends(get_current_claims)) -> TokenClaims:
+
+    if claims.user_id is None or claims.user_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return claims
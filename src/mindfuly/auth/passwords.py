@@ -0,0 +1,199 @@
+# src/mindfuly/auth/passwords.py
+
+import argon2
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from pwdlib import PasswordHash
+from pwdlib.exceptions import UnknownHashError
+from pwdlib.hashers.argon2 import Argon2Hasher
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.shared.histogram import LatencyHistogram
+
+# Argon2 releases the GIL while hashing, so a thread pool gives real parallelism
+# without the pickling cost of a process pool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
+
+# Argon2 cost; pick values for the host with `python -m scripts.calibrate_argon2`.
+# Stored hashes made with other parameters are upgraded on the user's next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", str(argon2.DEFAULT_TIME_COST)))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", str(argon2.DEFAULT_MEMORY_COST)))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", str(argon2.DEFAULT_PARALLELISM)))
+
+logger = logging.getLogger('uvicorn.error')
+
+
+def configured_password_hash(time_cost: int = ARGON2_TIME_COST,
+                             memory_cost: int = ARGON2_MEMORY_COST,
+                             parallelism: int = ARGON2_PARALLELISM) -> PasswordHash:
+    return PasswordHash((Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism),))
+
+
+class PasswordPoolBusy(Exception):
+    """
+    Raised instead of queueing once PASSWORD_HASH_MAX_QUEUE jobs are already waiting
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHashPool:
+    """
+    Runs Argon2 hashing/verification off the event loop with a concurrency cap
+    (the worker count) and a bounded queue that sheds load when it fills up
+    """
+
+    def __init__(self,
+                 workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+                 password_hash: PasswordHash | None = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.password_hash = password_hash or configured_password_hash()
+        self._executor = None
+
+        self.in_flight = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.queue_wait = LatencyHistogram()
+        self.hash_time = LatencyHistogram()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # Jobs beyond the worker count wait in the executor's queue; refuse once that queue is full
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolBusy(PASSWORD_HASH_RETRY_AFTER_SECONDS)
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started, time.perf_counter()
+
+        self.in_flight += 1
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            self.in_flight -= 1
+
+        # Observed on the loop thread so the histograms never need a lock
+        self.queue_wait.observe((started - submitted) * 1000)
+        self.hash_time.observe((finished - started) * 1000)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.password_hash.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.password_hash.verify, password, hashed_password)
+
+    async def run(self, coroutine_fn, *args, **kwargs):
+        """
+        Run a coroutine function that hashes inline on a pool worker, in an event loop of
+        its own. Only for calls that block rather than await (a repository on a sync Session).
+        """
+        return await self._run(lambda: asyncio.run(coroutine_fn(*args, **kwargs)))
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verify, and if the stored hash was made with other parameters also return a
+        fresh hash computed in the same pool job
+        """
+        return await self._run(self.password_hash.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "argon2": {
+                "time_cost": ARGON2_TIME_COST,
+                "memory_cost": ARGON2_MEMORY_COST,
+                "parallelism": ARGON2_PARALLELISM,
+            },
+            "queue_wait": self.queue_wait.snapshot(),
+            "hash_time": self.hash_time.snapshot(),
+        }
+
+
+password_pool = PasswordHashPool()
+
+
+async def _save_rehashed_password(user_repo, user, hashed_password: str):
+    """
+    Persist an upgraded hash through the repository's session; a failure only
+    means the upgrade is retried on the next login
+    """
+    session = user_repo.session
+    user.hashed_password = hashed_password
+    try:
+        if isinstance(session, AsyncSession):
+            await session.commit()
+        else:
+            session.commit()
+        password_pool.rehashed += 1
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not store upgraded password hash for user {user.id}: {e}")
+        if isinstance(session, AsyncSession):
+            await session.rollback()
+        else:
+            session.rollback()
+
+
+async def verify_password(user, password: str, user_repo=None) -> bool:
+    """
+    Check a login attempt on the password pool, turning a full queue into 503 + Retry-After.
+    With a user_repo, a hash made with outdated Argon2 parameters is transparently replaced.
+    """
+    try:
+        valid, updated_hash = await password_pool.verify_and_update(password, user.hashed_password)
+    except PasswordPoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-ins in progress, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except UnknownHashError:
+        return False
+
+    if valid and updated_hash and user_repo is not None:
+        await _save_rehashed_password(user_repo, user, updated_hash)
+    return valid
+
+
+async def create_account(user_repo, name: str, email: str, password: str, tier: int = 1):
+    """
+    Sign a user up on the password pool: UserRepositoryV2.create hashes the password
+    itself, so the whole call runs there. A full queue becomes 503 + Retry-After.
+    """
+    try:
+        return await password_pool.run(user_repo.create, name, email, password, tier=tier)
+    except PasswordPoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-ups in progress, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
@@ -4,7 +4,8 @@ from datetime import timedelta
 from pydantic import BaseModel
 
 from user_service_v2.models.user import get_user_repository_v2, UserRepositoryV2
-from src.mindfuly.auth.jwt_utils import create_access_token, verify_token, get_current_user
+from src.mindfuly.auth.passwords import verify_password
+from src.mindfuly.auth.jwt_utils import TokenClaims, create_access_token, get_current_claims, get_current_user, token_claims
 
 router = APIRouter(prefix="/authorization", tags=["Authorization"])
 
@@ -47,7 +48,7 @@ async def login(
         )
     
     # Verify password
-    if not await user_repo.verify_password(user, login_data.password):
+    if not await verify_password(user, login_data.password, user_repo):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -56,7 +57,7 @@ async def login(
     
     # Create access token
     access_token = create_access_token(
-        data={"sub": user.name},
+        data=token_claims(user),
         expires_delta=timedelta(hours=24)
     )
     
@@ -73,7 +74,7 @@ async def login_for_access_token(
     """
     user = await user_repo.get_by_name(form_data.username)
     
-    if not user or not await user_repo.verify_password(user, form_data.password):
+    if not user or not await verify_password(user, form_data.password, user_repo):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -81,7 +82,7 @@ async def login_for_access_token(
         )
     
     access_token = create_access_token(
-        data={"sub": user.name},
+        data=token_claims(user),
         expires_delta=timedelta(hours=24)
     )
     
@@ -100,12 +101,12 @@ async def verify_current_token(current_user: str = Depends(get_current_user)):
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(current_user: str = Depends(get_current_user)):
+async def refresh_token(claims: TokenClaims = Depends(get_current_claims)):
     """
     Refresh the access token for authenticated user
     """
     access_token = create_access_token(
-        data={"sub": current_user},
+        data={"sub": claims.username, "uid": claims.user_id, "tier": claims.tier},
         expires_delta=timedelta(hours=24)
     )
     
@@ -0,0 +1,121 @@
+"""
+Thumbnail proxy for the music panel: YouTube thumbnails fetched once, resized with
+Pillow and served from a content-addressed disk cache
+"""
+from fastapi import APIRouter, HTTPException, Request, Response
+from PIL import Image, UnidentifiedImageError
+from typing import Optional
+import asyncio
+import httpx
+import io
+import os
+import re
+import tempfile
+
+from src.shared.disk_cache import ContentAddressedCache
+from src.shared.http_clients import upstream_get
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mindfuly-media"))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# A video's thumbnail practically never changes, so browsers may keep a variant for a year
+THUMB_MAX_AGE_SECONDS = int(os.getenv("THUMB_MAX_AGE_SECONDS", "31536000"))
+THUMB_WIDTHS = (120, 240, 320)
+THUMB_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+THUMB_SOURCE_PATH = "/vi/{video_id}/mqdefault.jpg"
+
+VIDEO_ID_RE = re.compile(r"[A-Za-z0-9_-]{11}")
+
+thumbnail_cache = ContentAddressedCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES)
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+def resize_thumbnail(source: bytes, width: int, fmt: str) -> bytes:
+    image = Image.open(io.BytesIO(source))
+    # Let the JPEG decoder downscale while decoding when the target is much smaller
+    image.draft("RGB", (width, width))
+    image = image.convert("RGB")
+    image.thumbnail((width, max(1, round(width * image.height / image.width))), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == "webp":
+        image.save(out, "WEBP", quality=75, method=4)
+    else:
+        image.save(out, "JPEG", quality=80, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+async def _fetch_source(video_id: str) -> bytes:
+    cached = await thumbnail_cache.get_async(f"{video_id}/source")
+    if cached:
+        return cached[1]
+
+    try:
+        response = await upstream_get("ytimg", THUMB_SOURCE_PATH.format(video_id=video_id))
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch thumbnail: {str(e)}")
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="Thumbnail upstream error")
+
+    # Keep the original so other sizes/formats don't fetch it again
+    await thumbnail_cache.put_async(f"{video_id}/source", response.content)
+    return response.content
+
+
+async def _render_variant(video_id: str, width: int, fmt: str, key: str) -> tuple[str, bytes]:
+    source = await _fetch_source(video_id)
+    try:
+        data = await asyncio.to_thread(resize_thumbnail, source, width, fmt)
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=502, detail="Thumbnail upstream returned an invalid image")
+    return await thumbnail_cache.put_async(key, data), data
+
+
+async def thumbnail_variant(video_id: str, width: int, fmt: str) -> tuple[str, bytes]:
+    """
+    (digest, bytes) of a resized thumbnail, rendering it at most once per process
+    even when several requests miss at the same time
+    """
+    key = f"{video_id}/{width}.{fmt}"
+    cached = await thumbnail_cache.get_async(key)
+    if cached:
+        return cached
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_variant(video_id, width, fmt, key))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+@router.get("/thumb/{video_id}")
+async def get_thumbnail(video_id: str, request: Request, w: int = 240, format: Optional[str] = None):
+    """
+    A resized video thumbnail; WebP when the browser accepts it unless `format` is given
+    """
+    if not VIDEO_ID_RE.fullmatch(video_id):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    if w not in THUMB_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"w must be one of {', '.join(map(str, THUMB_WIDTHS))}")
+
+    fmt = format or ("webp" if "image/webp" in request.headers.get("accept", "") else "jpeg")
+    if fmt not in THUMB_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be webp or jpeg")
+
+    digest, data = await thumbnail_variant(video_id, w, fmt)
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": f"public, max-age={THUMB_MAX_AGE_SECONDS}, immutable",
+    }
+    if format is None:
+        headers["Vary"] = "Accept"
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=THUMB_FORMATS[fmt], headers=headers)
@@ -0,0 +1,82 @@
+"""
+Runtime telemetry for sizing pools and caches
+"""
+from fastapi import APIRouter
+
+from src.mindfuly.auth.jwt_utils import verified_token_cache
+from src.mindfuly.auth.passwords import password_pool
+from src.mindfuly.routes.media import thumbnail_cache
+from src.mindfuly.routes.weather import weather_cache
+from src.mindfuly.routes.youtube import mood_reservoir, quota_ledger, search_cache, video_details_cache
+from src.shared import database, http_clients
+from src.shared.idempotency import idempotency_cache
+from src.shared.models import analytics_cache
+from src.shared.user_cache import user_cache
+from src.shared.write_behind import mood_write_behind
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/db_pool")
+async def get_db_pool_stats():
+    """
+    Connection pool occupancy, overflow and checkout wait times
+    """
+    return {"db_pool": database.pool_stats()}
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Hit/miss/eviction counters for the in-process caches
+    """
+    return {
+        "analytics": analytics_cache.stats(),
+        "users": user_cache.stats(),
+        "verified_tokens": verified_token_cache.stats(),
+        "weather": weather_cache.stats(),
+        "youtube_search": search_cache.stats(),
+        "youtube_video_details": video_details_cache.stats(),
+        "thumbnails": thumbnail_cache.stats(),
+        "idempotency_keys": idempotency_cache.stats(),
+    }
+
+
+@router.get("/password_hashing")
+async def get_password_hashing_stats():
+    """
+    Argon2 pool occupancy, shed requests, and queue-wait/hash-time histograms
+    """
+    return {"password_hashing": password_pool.stats()}
+
+
+@router.get("/upstreams")
+async def get_upstream_stats():
+    """
+    Latency histograms and connection reuse for the outbound weather/YouTube clients
+    """
+    return {"upstreams": http_clients.upstream_stats_snapshot()}
+
+
+@router.get("/youtube_reservoir")
+async def get_youtube_reservoir_stats():
+    """
+    How many mood queries are stocked, how old they are, and the remaining quota budget
+    """
+    return {"youtube_reservoir": mood_reservoir.stats()}
+
+
+@router.get("/youtube_quota")
+async def get_youtube_quota_stats():
+    """
+    YouTube quota units spent today per API endpoint, and how often search degraded
+    """
+    return {"youtube_quota": quota_ledger.stats()}
+
+
+@router.get("/mood_write_behind")
+async def get_mood_write_behind_stats():
+    """
+    Queue depth, rejected submissions, batch sizes and flush latency of the mood log write-behind queue
+    """
+    return {"mood_write_behind": mood_write_behind.stats()}
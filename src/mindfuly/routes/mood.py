@@ -1,43 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 from datetime import datetime, timedelta
 from typing import List, Optional
+import json
+import os
 import random
 
 from src.shared.database import get_db
-from src.shared.models import MoodLog, MoodLogCreate, MoodLogResponse, get_mood_log_repository_v2, MoodLogRepositoryV2
+from src.mindfuly.auth.jwt_utils import TokenClaims, get_current_claims
+from src.shared.user_cache import get_cached_user
+from src.shared import write_behind
+from src.shared.idempotency import run_idempotent
+from src.shared.models import DASHBOARD_SECTIONS, MoodLog, MoodLogBulkEntry, MoodLogCreate, MoodLogEntry, MoodLogResponse, MoodSearchResult, get_mood_log_repository_v2, MoodLogRepositoryV2
 from user_service_v2.models.user import get_user_repository_v2, UserRepositoryV2
 
 router = APIRouter(prefix="/mood", tags=["Mood"])
 
+MOOD_BULK_MAX_ROWS = int(os.getenv("MOOD_BULK_MAX_ROWS", "10000"))
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def _iter_ndjson_lines(request: Request):
+    """
+    Yield each non-blank line of an NDJSON body as it streams in
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _iter_bulk_entries(request: Request):
+    """
+    Yield raw entries from either an NDJSON stream (as bytes) or a JSON array (as dicts)
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        async for line in _iter_ndjson_lines(request):
+            yield line
+        return
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError: # JSONDecodeError, or UnicodeDecodeError for a body that isn't UTF-8
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or an NDJSON stream")
+
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or an NDJSON stream")
+
+    for item in payload:
+        yield item
+
+async def _create_log(mood_log_repo: MoodLogRepositoryV2, user_id: int, mood_data: MoodLogEntry) -> tuple[int, dict]:
+    """
+    Status code and body for a new mood log, written now or queued for write-behind
+    """
+    try:
+        mood_log, queued = await write_behind.create_mood_log(
+            mood_log_repo,
+            user_id=user_id,
+            mood_value=mood_data.mood_value,
+            energy_level=mood_data.energy_level,
+            notes=mood_data.notes,
+            weather=mood_data.weather
+        )
+        # 202: accepted by the write-behind queue; it reaches the database within a flush interval
+        return 202 if queued else 201, {"mood_log": MoodLogResponse.from_db_model(mood_log)}
+    except write_behind.WriteBehindFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many mood logs being saved, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except (IntegrityError, AttributeError):
+        return 409, {"detail": "Something went wrong"}
+
+async def _create_log_once(mood_log_repo: MoodLogRepositoryV2,
+                           user_id: int,
+                           mood_data: MoodLogEntry,
+                           idempotency_key: Optional[str],
+                           response: Response) -> dict:
+    # Keys are scoped per user; a replay returns the first response without touching the database
+    status_code, body, replayed = await run_idempotent(
+        ("mood_log", user_id),
+        idempotency_key,
+        mood_data.model_dump(include=set(MoodLogEntry.model_fields)),
+        lambda: _create_log(mood_log_repo, user_id, mood_data)
+    )
+    response.status_code = status_code
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return body
+
+# Send the same Idempotency-Key when retrying so the log is only written once
 @router.post("/log", status_code=201)
 async def create_mood_log(
     mood_data: MoodLogCreate,
     response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
     
-    user = await user_repo.get_by_name(mood_data.username)
+    user = await get_cached_user(user_repo, mood_data.username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    try:
-        mood_log = await mood_log_repo.create_mood_log(
-            user_id=user.id,
-            mood_value=mood_data.mood_value,
-            energy_level=mood_data.energy_level,
-            notes=mood_data.notes,
-            weather=mood_data.weather
-        )
-
-        return {"mood_log": MoodLogResponse.from_db_model(mood_log)}
-    except (IntegrityError, AttributeError):
-        response.status_code = 409
-        return {"detail": "Something went wrong"}
+    return await _create_log_once(mood_log_repo, user.id, mood_data, idempotency_key, response)
     
+# Create a mood log for the user the bearer token was issued to; the id comes from
+# the token's uid claim, so no users lookup is needed
+@router.post("/me/log", status_code=201)
+async def create_own_mood_log(
+    mood_data: MoodLogEntry,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    claims: TokenClaims = Depends(get_current_claims),
+    user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
+    mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
+):
+    user_id = claims.user_id
+    if user_id is None:
+        # Tokens minted before the uid claim existed only carry the username
+        user = await get_cached_user(user_repo, claims.username)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_id = user.id
+
+    return await _create_log_once(mood_log_repo, user_id, mood_data, idempotency_key, response)
+
 # Edit the latest mood log for a user
 @router.put("/edit_log", status_code=200)
 async def edit_mood_log(
@@ -45,15 +145,11 @@ async def edit_mood_log(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(mood_data.username)
+    user = await get_cached_user(user_repo, mood_data.username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    latest_log = await mood_log_repo.get_latest_mood_log(user.id)
-    if not latest_log:
-        raise HTTPException(status_code=404, detail="No mood log found to edit")
-    
     try:
         updated_log = await mood_log_repo.edit_latest_mood_log(
             user_id=user.id,
@@ -61,10 +157,13 @@ async def edit_mood_log(
             energy_level=mood_data.energy_level,
             notes=mood_data.notes
         )
-
-        return {"mood_log": MoodLogResponse.from_db_model(updated_log)}
     except IntegrityError:
         raise HTTPException(status_code=409, detail="Could not edit mood log")
+
+    if not updated_log:
+        raise HTTPException(status_code=404, detail="No mood log found to edit")
+
+    return {"mood_log": MoodLogResponse.from_db_model(updated_log)}
     
 @router.get("/most_recent_log_date/{username}")
 async def get_most_recent_log_date(
@@ -72,7 +171,7 @@ async def get_most_recent_log_date(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2),
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -90,7 +189,7 @@ async def get_latest_mood_log(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2),
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -101,20 +200,102 @@ async def get_latest_mood_log(
     
     return {"latest_mood_log": MoodLogResponse.from_db_model(latest_log)}
     
+# Get a page of mood logs for a user, newest first; pass 'next_cursor' back as 'cursor' for the next page
 @router.get("/logs/{username}")
 async def get_mood_logs(
     username: str,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2),
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    mood_logs = await mood_log_repo.get_mood_logs(user.id, limit=limit)
-    return {"mood_logs": [MoodLogResponse.from_db_model(log) for log in mood_logs]}
+    try:
+        mood_logs, next_cursor = await mood_log_repo.get_mood_logs_page(
+            user.id,
+            limit=limit,
+            cursor=cursor,
+            start=start,
+            end=end
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "mood_logs": [MoodLogResponse.from_db_model(log) for log in mood_logs],
+        "next_cursor": next_cursor
+    }
+
+# Search a user's notes, best matches first; pass 'next_cursor' back as 'cursor' for the next page
+@router.get("/search/{username}")
+async def search_mood_logs(
+    username: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
+    mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2),
+):
+    user = await get_cached_user(user_repo, username)
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        results, next_cursor = await mood_log_repo.search_mood_logs(user.id, q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "results": [MoodSearchResult.from_search_result(*result) for result in results],
+        "next_cursor": next_cursor
+    }
+
+# Import many mood logs for a user at once (JSON array, or NDJSON with Content-Type: application/x-ndjson)
+@router.post("/logs/bulk/{username}")
+async def bulk_create_mood_logs(
+    username: str,
+    request: Request,
+    user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
+    mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
+):
+    user = await get_cached_user(user_repo, username)
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Validate in one streaming pass; invalid rows are reported and skipped
+    entries = []
+    errors = []
+    row = 0
+    async for item in _iter_bulk_entries(request):
+        if row >= MOOD_BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {MOOD_BULK_MAX_ROWS} entries per request")
+
+        try:
+            if isinstance(item, bytes):
+                entry = MoodLogBulkEntry.model_validate_json(item)
+            else:
+                entry = MoodLogBulkEntry.model_validate(item)
+            entries.append(entry.model_dump())
+        except ValidationError as e:
+            errors.append({
+                "row": row,
+                "errors": [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+            })
+        row += 1
+
+    inserted = await mood_log_repo.bulk_create_mood_logs(user.id, entries)
+    if inserted is None:
+        raise HTTPException(status_code=409, detail="Could not import mood logs")
+
+    return {"inserted": inserted, "rejected": len(errors), "errors": errors}
 
 # Get average mood, energy level, and total logs for a user
 @router.get("/stats/{username}")
@@ -123,7 +304,7 @@ async def get_mood_stats(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -131,35 +312,82 @@ async def get_mood_stats(
     stats = await mood_log_repo.get_mood_stats(user.id)
     return {"mood_stats": stats}
 
+# Get stats, weekly stats, weather stats, running means and recent logs in one response
+# Optionally only some of them, e.g. ?sections=weekly_mood_stats,weather_mood_stats
+@router.get("/dashboard/{username}")
+async def get_dashboard(
+    username: str,
+    tz: Optional[str] = None,
+    log_limit: int = Query(10, ge=1, le=100),
+    running_limit: int = Query(20, ge=1, le=365),
+    sections: Optional[str] = None,
+    user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
+    mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
+):
+    user = await get_cached_user(user_repo, username)
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    requested = None
+    if sections is not None:
+        requested = [name.strip() for name in sections.split(",") if name.strip()]
+        unknown = set(requested) - set(DASHBOARD_SECTIONS)
+        if not requested or unknown:
+            raise HTTPException(status_code=400, detail=f"sections must be drawn from {', '.join(DASHBOARD_SECTIONS)}")
+
+    try:
+        dashboard = await mood_log_repo.get_dashboard(
+            user.id,
+            tz=tz,
+            log_limit=log_limit,
+            running_limit=running_limit,
+            sections=requested
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+
+    return dashboard
+
 # Get average mood, energy level, and total logs for all days of the week
+# Optionally bucket by the user's local weekday with an IANA time zone, e.g. ?tz=America/Vancouver
 @router.get("/weekly_stats/{username}")
 async def get_weekly_mood_stats(
     username: str,
+    tz: Optional[str] = None,
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # TODO: Implement get_weekly_mood_stats in MoodLogRepositoryV2
-    weekly_stats = await mood_log_repo.get_weekly_mood_stats(user.id)
+    try:
+        weekly_stats = await mood_log_repo.get_weekly_mood_stats(user.id, tz=tz)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+
     return {"weekly_mood_stats": weekly_stats}
 
-# Get average mood, energy level, and total logs for each weather condition
+# Get average mood, energy level, and total logs for each weather condition,
+# optionally per temperature band of `temperature_band` °C
 @router.get("/weather_stats/{username}")
 async def get_weather_mood_stats(
     username: str,
+    temperature_band: Optional[int] = None,
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    if temperature_band is not None and temperature_band <= 0:
+        raise HTTPException(status_code=400, detail="temperature_band must be positive")
     
-    weather_stats = await mood_log_repo.get_weather_mood_stats(user.id)
+    weather_stats = await mood_log_repo.get_weather_mood_stats(user.id, temperature_band=temperature_band)
     return {"weather_mood_stats": weather_stats}
 
 # Get running means for mood and energy levels for every day
@@ -170,7 +398,7 @@ async def get_running_means(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -185,7 +413,7 @@ async def clear_mood_logs(
     user_repo: UserRepositoryV2 = Depends(get_user_repository_v2),
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -203,22 +431,24 @@ async def test_mood_logs(
     mood_log_repo: MoodLogRepositoryV2 = Depends(get_mood_log_repository_v2)
 ):
     
-    user = await user_repo.get_by_name(username)
+    user = await get_cached_user(user_repo, username)
     randWeather = ['light rain', 'heavy rain', 'partly cloudy', 'sunny', 'overcast', 'rain of spiders', 'purple rain', 'chocolate rain', 'hurricane', 'tornado']
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     try:
-        for x in range(100):
-            await mood_log_repo.create_log_on_date(
-                user_id=user.id,
-                mood_value=random.randint(1,5),
-                energy_level=random.randint(1,5),
-                date=datetime.now() - timedelta(days=x),
-                notes= "Test log #" + str(x),
-                weather=str(x) + "°C – " + random.choice(randWeather)
-            )
+        inserted = await mood_log_repo.bulk_create_mood_logs(user.id, [{
+            "mood_value": random.randint(1,5),
+            "energy_level": random.randint(1,5),
+            "created_at": datetime.now() - timedelta(days=x),
+            "notes": "Test log #" + str(x),
+            "weather": str(x) + "°C – " + random.choice(randWeather)
+        } for x in range(100)])
+
+        if inserted is None:
+            response.status_code = 409
+            return {"detail": "Something went wrong"}
         
         return {"Job Done!", ":)"}
     except (IntegrityError, AttributeError):
@@ -1,8 +1,11 @@
 from fastapi import (
     APIRouter,
     Depends,
+    HTTPException,
+    Request,
     Response
 )
+from fastapi.responses import JSONResponse
 
 from user_service_v2.models.user import (
     UserRepositoryV2,
@@ -12,8 +15,18 @@ from user_service_v2.models.user import (
 
 from sqlalchemy.exc import IntegrityError
 
+from src.mindfuly.auth.jwt_utils import TokenClaims, require_admin
+from src.mindfuly.auth.passwords import PasswordPoolBusy, create_account, password_pool
+from src.shared import user_cache
+from src.shared.provisioning import USER_PROVISION_BATCH_SIZE, RowStream, UserProvisioner, get_user_provisioner, row_format
+
+import asyncio
+import os
+
 router = APIRouter(prefix="/users", tags=["Users"])
 
+USER_PROVISION_MAX_ROWS = int(os.getenv("USER_PROVISION_MAX_ROWS", "10000"))
+
 @router.get("/test")
 def test():
     return {"status": "ok"}
@@ -22,7 +35,7 @@ def test():
 async def create_user(user: UserSchema, response: Response, user_repo: UserRepositoryV2 = Depends(get_user_repository_v2)):
     try:
         tier = getattr(user, "tier", 1)
-        new_user = await user_repo.create(user.name, user.email, user.hashed_password, tier=tier)
+        new_user = await create_account(user_repo, user.name, user.email, user.hashed_password, tier=tier)
         if not new_user:
             response.status_code = 409
             return {"detail": "User already exists"}
@@ -31,6 +44,76 @@ async def create_user(user: UserSchema, response: Response, user_repo: UserRepos
         response.status_code = 409
         return {"detail": "Something went wrong"}
     
+async def _provision_batch(provisioner: UserProvisioner, batch: list) -> list[dict]:
+    # Hash a pool's worth at a time so sign-ins keep their share of the password pool
+    hashes = []
+    try:
+        for group in range(0, len(batch), password_pool.workers):
+            hashes.extend(await asyncio.gather(*(
+                password_pool.hash(entry.password) for _, entry in batch[group:group + password_pool.workers]
+            )))
+    except PasswordPoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Password hashing is saturated, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    return await provisioner.insert_batch([
+        (row, entry, hashed_password) for (row, entry), hashed_password in zip(batch, hashes)
+    ])
+
+async def _streamed_rows(request: Request):
+    rows = RowStream(row_format(request.headers.get("content-type", "")))
+    try:
+        async for chunk in request.stream():
+            for parsed in rows.feed(chunk):
+                yield parsed
+        for parsed in rows.close():
+            yield parsed
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
+
+# Admin only: create many users from a CSV (Content-Type: text/csv, with a header line)
+# or NDJSON body; every row gets a result and duplicates don't abort the import.
+# The body is read and inserted a batch at a time, so rows before USER_PROVISION_MAX_ROWS
+# are already created when a longer body gets its 413 (which carries their results).
+@router.post("/bulk_provision")
+async def bulk_provision_users(
+    request: Request,
+    admin: TokenClaims = Depends(require_admin),
+    provisioner: UserProvisioner = Depends(get_user_provisioner)
+):
+    results = []
+    pending = []
+    too_many = False
+    async for row, entry, errors in _streamed_rows(request):
+        if row >= USER_PROVISION_MAX_ROWS:
+            too_many = True
+            break
+        if errors:
+            results.append({"row": row, "status": "invalid", "errors": errors})
+            continue
+        pending.append((row, entry))
+        if len(pending) >= USER_PROVISION_BATCH_SIZE:
+            results.extend(await _provision_batch(provisioner, pending))
+            pending = []
+    if pending:
+        results.extend(await _provision_batch(provisioner, pending))
+
+    results.sort(key=lambda result: result["row"])
+    counts = {"created": 0, "duplicate_name": 0, "duplicate_email": 0, "invalid": 0}
+    for result in results:
+        counts[result["status"]] += 1
+
+    if too_many:
+        return JSONResponse(status_code=413, content={
+            "detail": f"At most {USER_PROVISION_MAX_ROWS} users per request; later rows were not read",
+            **counts,
+            "results": results,
+        })
+    return {**counts, "results": results}
+
 @router.get("/{username}")
 async def get_user(username: str, user_repo: UserRepositoryV2 = Depends(get_user_repository_v2)):
     user = await user_repo.get_by_name(username)
@@ -46,11 +129,11 @@ async def list_users(user_repo: UserRepositoryV2 = Depends(get_user_repository_v
 
 @router.delete("/{username}", status_code=204)
 async def delete_user(username: str, response: Response, user_repo: UserRepositoryV2 = Depends(get_user_repository_v2)):
-    user = await user_repo.get_by_name(username)
+    user = await user_cache.get_cached_user(user_repo, username)
 
     if not user:
         response.status_code = 404
         return {"detail": "User not found"}
     
-    result = await user_repo.delete(user.id)    
+    result = await user_cache.delete_user(user_repo, user.id)    
     return {"detail": "User deleted successfully"}
\ No newline at end of file
@@ -1,34 +1,51 @@
 from fastapi import APIRouter, HTTPException
 import httpx, os
 
+from src.shared.cache import StaleWhileRevalidateCache
+from src.shared.http_clients import upstream_get
+
 router = APIRouter(prefix="/weather", tags=["Weather"])
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+WEATHER_PATH = "/data/2.5/weather"
 
-@router.get("")
-async def get_weather(lat: float, lon: float):
+# Nearby users share one cached observation: coordinates are rounded to
+# WEATHER_CACHE_PRECISION decimal places (2 = ~1 km buckets). OpenWeatherMap refreshes
+# current conditions about every 10 minutes, which is the default freshness window.
+WEATHER_CACHE_PRECISION = int(os.getenv("WEATHER_CACHE_PRECISION", "2"))
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+WEATHER_CACHE_STALE_SECONDS = float(os.getenv("WEATHER_CACHE_STALE_SECONDS", "1800"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "5000"))
 
-    print("API KEY:", WEATHER_API_KEY)
-    print("LAT:", lat)
-    print("LON:", lon)
+weather_cache = StaleWhileRevalidateCache(WEATHER_CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL_SECONDS, WEATHER_CACHE_STALE_SECONDS)
+
+
+def weather_bucket(lat: float, lon: float) -> tuple[float, float]:
+    return round(lat, WEATHER_CACHE_PRECISION), round(lon, WEATHER_CACHE_PRECISION)
 
-    
-    if not WEATHER_API_KEY:
-        raise HTTPException(status_code=500, detail="Weather API Key not configured")
-    
-    url = "https://api.openweathermap.org/data/2.5/weather"
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, params={
+async def fetch_weather(lat: float, lon: float) -> dict:
+    try:
+        resp = await upstream_get("weather", WEATHER_PATH, params={
             "lat": lat,
             "lon": lon,
             "appid": WEATHER_API_KEY,
             "units": "metric"
         })
-
-    print("WEATHER RESPONSE:", resp.status_code, resp.text)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to connect to Weather API: {str(e)}")
 
     if resp.status_code != 200:
         raise HTTPException(status_code=resp.status_code, detail="Weather API error")
+
+    return resp.json()
+
+@router.get("")
+async def get_weather(lat: float, lon: float):
     
-    return resp.json()
\ No newline at end of file
+    if not WEATHER_API_KEY:
+        raise HTTPException(status_code=500, detail="Weather API Key not configured")
+
+    # Fetch for the bucket's centre so every cached value matches its key
+    bucket = weather_bucket(lat, lon)
+    return await weather_cache.get_or_load(bucket, lambda: fetch_weather(*bucket))
@@ -3,15 +3,60 @@ YouTube API integration for mood-based music playback
 """
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Callable, List, Optional
+from collections import defaultdict
+from itertools import zip_longest
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import asyncio
 import httpx
+import logging
 import os
 import random
+import re
+import time
+
+from src.shared.cache import TTLCache
+from src.shared.http_clients import upstream_get
 
 router = APIRouter(prefix="/youtube", tags=["youtube"])
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
-YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+YOUTUBE_SEARCH_PATH = "/youtube/v3/search"
+YOUTUBE_VIDEOS_PATH = "/youtube/v3/videos"
+
+# search.list costs 100 quota units per call. The mood reservoir refreshes its
+# queries within YOUTUBE_RESERVOIR_DAILY_BUDGET units a day (the default API quota
+# is 10,000), leaving the rest for free-text searches.
+YOUTUBE_SEARCH_COST = 100
+# videos.list costs 1 unit for up to 50 ids
+YOUTUBE_VIDEOS_COST = 1
+YOUTUBE_VIDEOS_BATCH_SIZE = 50
+YOUTUBE_RESERVOIR_ENABLED = os.getenv("YOUTUBE_RESERVOIR_ENABLED", "true").lower() in ("1", "true", "yes")
+YOUTUBE_RESERVOIR_DAILY_BUDGET = int(os.getenv("YOUTUBE_RESERVOIR_DAILY_BUDGET", "5000"))
+# Units in the bucket when a process starts: one search for each of the 8 moods. Every
+# worker and every restart gets a fresh bucket, so starting full would re-spend the whole
+# budget each time; the rest refills over the day.
+YOUTUBE_RESERVOIR_INITIAL_BUDGET = int(os.getenv("YOUTUBE_RESERVOIR_INITIAL_BUDGET", "800"))
+YOUTUBE_RESERVOIR_SIZE = int(os.getenv("YOUTUBE_RESERVOIR_SIZE", "50"))
+
+# Whole-project quota, tracked per API endpoint per (Pacific) day. Once fewer than
+# YOUTUBE_QUOTA_RESERVE units would remain, free-text search degrades to cached or
+# similar results instead of spending the last units (and then hitting 403s).
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_QUOTA_RESERVE = int(os.getenv("YOUTUBE_QUOTA_RESERVE", "500"))
+
+# Free-text search results, keyed by normalized query
+YOUTUBE_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("YOUTUBE_SEARCH_CACHE_MAX_ENTRIES", "1000"))
+YOUTUBE_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("YOUTUBE_SEARCH_CACHE_TTL_SECONDS", "21600"))
+
+# Duration/views/embeddability per video id; these rarely change
+YOUTUBE_DETAILS_CACHE_MAX_ENTRIES = int(os.getenv("YOUTUBE_DETAILS_CACHE_MAX_ENTRIES", "20000"))
+YOUTUBE_DETAILS_CACHE_TTL_SECONDS = float(os.getenv("YOUTUBE_DETAILS_CACHE_TTL_SECONDS", "86400"))
+
+ISO_DURATION_RE = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+logger = logging.getLogger('uvicorn.error')
 
 
 class VideoInfo(BaseModel):
@@ -19,10 +64,115 @@ class VideoInfo(BaseModel):
     title: str
     channel: str
     thumbnail: str
+    # From videos.list; None when details couldn't be fetched
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    embeddable: Optional[bool] = None
+    live: Optional[bool] = None
 
 
 class SearchResults(BaseModel):
     videos: List[VideoInfo]
+    # True when served from cached or similar results because the quota is nearly spent
+    degraded: bool = False
+
+
+class YouTubeQuotaLedger:
+    """
+    Quota units spent per API endpoint per day. YouTube resets quotas at midnight
+    Pacific time, so days are counted in that zone. Counts are per process.
+    """
+
+    RESET_ZONE = ZoneInfo("America/Los_Angeles")
+
+    def __init__(self, daily_quota: int = YOUTUBE_DAILY_QUOTA, reserve: int = YOUTUBE_QUOTA_RESERVE):
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self._spent: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.degraded = 0
+
+    def _today(self) -> str:
+        return datetime.now(self.RESET_ZONE).date().isoformat()
+
+    def spent(self) -> int:
+        return sum(self._spent[self._today()].values())
+
+    def remaining(self) -> int:
+        return max(self.daily_quota - self.spent(), 0)
+
+    def can_spend(self, units: int) -> bool:
+        return self.remaining() - units >= self.reserve
+
+    def charge(self, endpoint: str, units: int):
+        today = self._today()
+        # Only today's ledger is kept
+        for day in [day for day in self._spent if day != today]:
+            del self._spent[day]
+        self._spent[today][endpoint] += units
+
+    def mark_exhausted(self, endpoint: str):
+        # YouTube said the quota is gone; stop spending until the reset
+        self.charge(endpoint, self.remaining())
+
+    def stats(self) -> dict:
+        today = self._today()
+        return {
+            "day": today,
+            "daily_quota": self.daily_quota,
+            "reserve": self.reserve,
+            "spent": self.spent(),
+            "remaining": self.remaining(),
+            "by_endpoint": dict(self._spent[today]),
+            "degraded_responses": self.degraded,
+        }
+
+
+quota_ledger = YouTubeQuotaLedger()
+search_cache = TTLCache(YOUTUBE_SEARCH_CACHE_MAX_ENTRIES, YOUTUBE_SEARCH_CACHE_TTL_SECONDS)
+video_details_cache = TTLCache(YOUTUBE_DETAILS_CACHE_MAX_ENTRIES, YOUTUBE_DETAILS_CACHE_TTL_SECONDS)
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def parse_iso_duration(duration: str) -> Optional[int]:
+    match = ISO_DURATION_RE.fullmatch(duration or "")
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def video_filter(min_duration: Optional[int] = None,
+                 max_duration: Optional[int] = None,
+                 embeddable_only: bool = False) -> Optional[Callable[[VideoInfo], bool]]:
+    """
+    Predicate for the search filters. Videos without details are kept, so a failed
+    enrichment never empties the results; live streams never fit a max_duration.
+    """
+    if min_duration is None and max_duration is None and not embeddable_only:
+        return None
+
+    def keep(video: VideoInfo) -> bool:
+        if embeddable_only and video.embeddable is False:
+            return False
+        if max_duration is not None and (video.live or (video.duration_seconds or 0) > max_duration):
+            return False
+        if min_duration is not None and video.duration_seconds is not None and not video.live and video.duration_seconds < min_duration:
+            return False
+        return True
+    return keep
+
+
+def _sample(videos: List[VideoInfo], max_results: int, keep: Optional[Callable[[VideoInfo], bool]] = None) -> List[VideoInfo]:
+    if keep is not None:
+        videos = [video for video in videos if keep(video)]
+    return random.sample(videos, min(max_results, len(videos)))
 
 
 # Mood-based search queries - multiple options for variety
@@ -86,10 +236,238 @@ MOOD_QUERIES = {
 }
 
 
+async def _search_youtube(query: str, max_results: int) -> List[VideoInfo]:
+    quota_ledger.charge("search.list", YOUTUBE_SEARCH_COST)
+    response = await upstream_get(
+        "youtube",
+        YOUTUBE_SEARCH_PATH,
+        params={
+            "part": "snippet",
+            "q": query,
+            "type": "video",
+            "videoCategoryId": "10",  # Music category
+            "maxResults": min(max_results, 50),
+            "key": YOUTUBE_API_KEY,
+            "safeSearch": "moderate"
+        }
+    )
+    
+    if response.status_code != 200:
+        error_data = response.json()
+        reasons = {error.get("reason") for error in error_data.get("error", {}).get("errors", [])}
+        if response.status_code == 403 and reasons & {"quotaExceeded", "dailyLimitExceeded"}:
+            quota_ledger.mark_exhausted("search.list")
+            raise QuotaExhausted()
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"YouTube API error: {error_data.get('error', {}).get('message', 'Unknown error')}"
+        )
+    
+    data = response.json()
+    
+    videos = []
+    for item in data.get("items", []):
+        videos.append(VideoInfo(
+            video_id=item["id"]["videoId"],
+            title=item["snippet"]["title"],
+            channel=item["snippet"]["channelTitle"],
+            thumbnail=item["snippet"]["thumbnails"]["medium"]["url"]
+        ))
+    return await enrich_videos(videos)
+
+
+async def _fetch_video_details(video_ids: List[str]) -> dict[str, dict]:
+    quota_ledger.charge("videos.list", YOUTUBE_VIDEOS_COST)
+    response = await upstream_get(
+        "youtube",
+        YOUTUBE_VIDEOS_PATH,
+        params={
+            "part": "contentDetails,statistics,status",
+            "id": ",".join(video_ids),
+            "maxResults": YOUTUBE_VIDEOS_BATCH_SIZE,
+            "key": YOUTUBE_API_KEY
+        }
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="YouTube API error")
+
+    details = {}
+    for item in response.json().get("items", []):
+        duration = parse_iso_duration(item.get("contentDetails", {}).get("duration", ""))
+        view_count = item.get("statistics", {}).get("viewCount")
+        details[item["id"]] = {
+            # Live streams report a zero duration
+            "live": duration == 0,
+            "duration_seconds": duration or None,
+            "view_count": int(view_count) if view_count is not None else None,
+            "embeddable": item.get("status", {}).get("embeddable"),
+        }
+    return details
+
+
+async def enrich_videos(videos: List[VideoInfo]) -> List[VideoInfo]:
+    """
+    Attach duration, views and embeddability, fetching uncached ids with one
+    videos.list call per 50. Failures leave the videos as they are.
+    """
+    missing = list(dict.fromkeys(video.video_id for video in videos if video_details_cache.get(video.video_id) is None))
+    batches = [missing[i:i + YOUTUBE_VIDEOS_BATCH_SIZE] for i in range(0, len(missing), YOUTUBE_VIDEOS_BATCH_SIZE)]
+    for batch in batches:
+        if not quota_ledger.can_spend(YOUTUBE_VIDEOS_COST):
+            break
+        try:
+            details = await _fetch_video_details(batch)
+        except (HTTPException, httpx.RequestError) as e:
+            logger.warning(f"YouTube videos.list enrichment failed: {e}")
+            break
+        for video_id in batch:
+            # Ids YouTube didn't return (removed/private) are remembered as unembeddable
+            video_details_cache.set(video_id, details.get(video_id, {"embeddable": False}))
+
+    enriched = []
+    for video in videos:
+        details = video_details_cache.get(video.video_id)
+        enriched.append(video.model_copy(update=details) if details else video)
+    return enriched
+
+
+class MoodVideoReservoir:
+    """
+    Keeps search results for every MOOD_QUERIES query in memory so mood searches never
+    wait on YouTube. A process starts with budget for one query per mood, and the rest
+    are stocked as the token bucket refills, after which the stalest query is refreshed
+    whenever it has room for another search. Until a mood is stocked its searches go
+    live, and their results are stocked too.
+    """
+
+    def __init__(self,
+                 daily_budget: int = YOUTUBE_RESERVOIR_DAILY_BUDGET,
+                 size: int = YOUTUBE_RESERVOIR_SIZE,
+                 initial_budget: int = YOUTUBE_RESERVOIR_INITIAL_BUDGET):
+        self.daily_budget = daily_budget
+        self.size = size
+        self._videos: dict[str, List[VideoInfo]] = {}
+        self._fetched_at: dict[str, float] = {}
+        self._task = None
+
+        # Token bucket holding up to one day's budget, refilled continuously
+        self._tokens = float(min(initial_budget, daily_budget))
+        self._tokens_at = time.monotonic()
+
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _available_tokens(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.daily_budget, self._tokens + (now - self._tokens_at) * self.daily_budget / 86400)
+        self._tokens_at = now
+        return self._tokens
+
+    def _stalest_query(self) -> str:
+        # Moods take turns, so a small starting budget stocks as many moods as it can
+        queries = [query for turn in zip_longest(*MOOD_QUERIES.values()) for query in turn if query]
+        return min(queries, key=lambda query: self._fetched_at.get(query, float("-inf")))
+
+    async def refresh_one(self) -> bool:
+        """
+        Refresh the stalest query if the budget allows; returns False when out of budget
+        """
+        if self._available_tokens() < YOUTUBE_SEARCH_COST or not quota_ledger.can_spend(YOUTUBE_SEARCH_COST):
+            return False
+
+        query = self._stalest_query()
+        self._tokens -= YOUTUBE_SEARCH_COST
+        try:
+            videos = await _search_youtube(query, self.size)
+        except Exception as e:
+            # Keep serving the previous results; retry this query after the others. An
+            # unexpected failure (say a non-JSON error page) is logged with its traceback,
+            # but mustn't end the refresh loop.
+            self.refresh_errors += 1
+            self._fetched_at[query] = time.monotonic()
+            expected = isinstance(e, (HTTPException, httpx.RequestError, QuotaExhausted))
+            logger.warning(f"YouTube reservoir refresh for {query!r} failed: {e!r}", exc_info=not expected)
+            return True
+
+        if videos:
+            self._videos[query] = videos
+        self._fetched_at[query] = time.monotonic()
+        self.refreshes += 1
+        return True
+
+    def stock(self, query: str, videos: List[VideoInfo]):
+        """
+        Keep results searched outside the refresh loop (the live fallback) for a mood query
+        """
+        if videos and any(query in mood_queries for mood_queries in MOOD_QUERIES.values()):
+            self._videos[query] = videos
+            self._fetched_at[query] = time.monotonic()
+
+    async def _run(self):
+        while True:
+            if not await self.refresh_one():
+                # Sleep until the bucket refills enough for one more search
+                wait = (YOUTUBE_SEARCH_COST - self._available_tokens()) * 86400 / max(self.daily_budget, 1)
+                await asyncio.sleep(max(wait, 1))
+
+    def start(self):
+        if self._task is None and YOUTUBE_API_KEY and YOUTUBE_RESERVOIR_ENABLED and self.daily_budget > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def sample(self, mood: str, max_results: int, keep: Optional[Callable[[VideoInfo], bool]] = None) -> Optional[List[VideoInfo]]:
+        """
+        Random videos for a known mood from one of its stocked queries, or None if none is stocked yet
+        """
+        stocked = [query for query in MOOD_QUERIES.get(mood, []) if self._videos.get(query)]
+        if not stocked:
+            return None
+        if keep is not None:
+            stocked = [query for query in stocked if any(keep(video) for video in self._videos[query])] or stocked
+        return _sample(self._videos[random.choice(stocked)], max_results, keep)
+
+    def sample_any(self, max_results: int, keep: Optional[Callable[[VideoInfo], bool]] = None) -> Optional[List[VideoInfo]]:
+        stocked = [videos for videos in self._videos.values() if videos]
+        if not stocked:
+            return None
+        return _sample(random.choice(stocked), max_results, keep)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        ages = [now - fetched_at for query, fetched_at in self._fetched_at.items() if query in self._videos]
+        return {
+            "running": self._task is not None,
+            "queries_stocked": len(self._videos),
+            "queries_total": sum(len(mood_queries) for mood_queries in MOOD_QUERIES.values()),
+            "videos": sum(len(videos) for videos in self._videos.values()),
+            "oldest_age_seconds": round(max(ages), 1) if ages else None,
+            "daily_budget": self.daily_budget,
+            "budget_available": int(self._available_tokens()),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+mood_reservoir = MoodVideoReservoir()
+
+
 @router.get("/search/by-mood/{mood}", response_model=SearchResults)
-async def search_by_mood(mood: str, max_results: int = 10):
+async def search_by_mood(mood: str,
+                         max_results: int = 10,
+                         min_duration: Optional[int] = None,
+                         max_duration: Optional[int] = None,
+                         embeddable_only: bool = False):
     """
-    Search for music videos based on mood - randomly selects from multiple query options
+    Search for music videos based on mood - randomly sampled from the prefetched reservoir.
+    Optionally filtered by duration in seconds and embeddability.
     """
     if not YOUTUBE_API_KEY:
         raise HTTPException(
@@ -97,7 +475,12 @@ async def search_by_mood(mood: str, max_results: int = 10):
             detail="YouTube API key not configured"
         )
     
-    # Get the search queries for this mood
+    keep = video_filter(min_duration, max_duration, embeddable_only)
+    videos = mood_reservoir.sample(mood.lower(), max_results, keep)
+    if videos is not None:
+        return SearchResults(videos=videos)
+
+    # Unknown mood, or the reservoir hasn't stocked this mood yet: search live
     mood_queries = MOOD_QUERIES.get(mood.lower())
     
     if mood_queries:
@@ -108,45 +491,21 @@ async def search_by_mood(mood: str, max_results: int = 10):
         query = f"{mood} music playlist"
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Request more results to give us room to shuffle
-            response = await client.get(
-                YOUTUBE_SEARCH_URL,
-                params={
-                    "part": "snippet",
-                    "q": query,
-                    "type": "video",
-                    "videoCategoryId": "10",  # Music category
-                    "maxResults": min(max_results * 2, 50),  # Get 2x results for better variety
-                    "key": YOUTUBE_API_KEY,
-                    "safeSearch": "moderate"
-                }
-            )
-            
-            if response.status_code != 200:
-                error_data = response.json()
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"YouTube API error: {error_data.get('error', {}).get('message', 'Unknown error')}"
-                )
-            
-            data = response.json()
-            
-            videos = []
-            for item in data.get("items", []):
-                videos.append(VideoInfo(
-                    video_id=item["id"]["videoId"],
-                    title=item["snippet"]["title"],
-                    channel=item["snippet"]["channelTitle"],
-                    thumbnail=item["snippet"]["thumbnails"]["medium"]["url"]
-                ))
-            
-            # Shuffle the videos for random playback order
-            random.shuffle(videos)
-            
-            # Return only the requested number of videos
-            return SearchResults(videos=videos[:max_results])
+        # Request more results to give us room to shuffle
+        if not quota_ledger.can_spend(YOUTUBE_SEARCH_COST):
+            raise QuotaExhausted()
+        if mood_queries:
+            # A full reservoir's worth costs the same, and serves this mood from memory next time
+            videos = await _search_youtube(query, max(max_results * 2, mood_reservoir.size))
+            mood_reservoir.stock(query, videos)
+        else:
+            videos = await _search_youtube(query, max_results * 2)
+        
+        # Shuffle the videos for random playback order and return only the requested number
+        return SearchResults(videos=_sample(videos, max_results, keep))
     
+    except QuotaExhausted:
+        return _degraded_results(query, max_results, keep)
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=500,
@@ -154,61 +513,78 @@ async def search_by_mood(mood: str, max_results: int = 10):
         )
 
 
+def _similar_cached_results(query: str) -> Optional[List[VideoInfo]]:
+    """
+    Cached results for the cached query sharing the most words with `query`
+    """
+    words = set(normalize_query(query).split())
+    best, best_overlap = None, 0.0
+    for cached_query, videos in search_cache.items():
+        cached_words = set(cached_query.split())
+        overlap = len(words & cached_words) / len(words | cached_words) if words | cached_words else 0.0
+        if overlap > best_overlap:
+            best, best_overlap = videos, overlap
+    return best
+
+
+def _degraded_results(query: str, max_results: int, keep: Optional[Callable[[VideoInfo], bool]] = None) -> SearchResults:
+    """
+    Out of quota: serve the most similar cached search, else any reservoir results
+    """
+    quota_ledger.degraded += 1
+    videos = _similar_cached_results(query)
+    if videos:
+        videos = _sample(videos, max_results, keep)
+    else:
+        videos = mood_reservoir.sample_any(max_results, keep)
+
+    if not videos:
+        raise HTTPException(
+            status_code=503,
+            detail="YouTube quota exhausted for today, please retry later",
+            headers={"Retry-After": "3600"},
+        )
+    return SearchResults(videos=videos, degraded=True)
+
+
 @router.get("/search", response_model=SearchResults)
-async def search_videos(query: str, max_results: int = 10):
+async def search_videos(query: str,
+                        max_results: int = 10,
+                        min_duration: Optional[int] = None,
+                        max_duration: Optional[int] = None,
+                        embeddable_only: bool = False):
     """
-    Search for music videos by query - results are randomized
+    Search for music videos by query - results are randomized.
+    Optionally filtered by duration in seconds and embeddability.
     """
     if not YOUTUBE_API_KEY:
         raise HTTPException(
             status_code=500,
             detail="YouTube API key not configured"
         )
+
+    normalized = normalize_query(query)
+    keep = video_filter(min_duration, max_duration, embeddable_only)
+
+    async def load() -> List[VideoInfo]:
+        if not quota_ledger.can_spend(YOUTUBE_SEARCH_COST):
+            raise QuotaExhausted()
+        # A search costs the same whatever maxResults is, so cache a full page
+        return await _search_youtube(f"{normalized} music", 50)
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                YOUTUBE_SEARCH_URL,
-                params={
-                    "part": "snippet",
-                    "q": f"{query} music",
-                    "type": "video",
-                    "videoCategoryId": "10",  # Music category
-                    "maxResults": min(max_results * 2, 50),  # Get more for variety
-                    "key": YOUTUBE_API_KEY,
-                    "safeSearch": "moderate"
-                }
-            )
-            
-            if response.status_code != 200:
-                error_data = response.json()
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"YouTube API error: {error_data.get('error', {}).get('message', 'Unknown error')}"
-                )
-            
-            data = response.json()
-            
-            videos = []
-            for item in data.get("items", []):
-                videos.append(VideoInfo(
-                    video_id=item["id"]["videoId"],
-                    title=item["snippet"]["title"],
-                    channel=item["snippet"]["channelTitle"],
-                    thumbnail=item["snippet"]["thumbnails"]["medium"]["url"]
-                ))
-            
-            # Shuffle for random playback
-            random.shuffle(videos)
-            
-            return SearchResults(videos=videos[:max_results])
-    
+        videos = await search_cache.get_or_load(normalized, load)
+    except QuotaExhausted:
+        return _degraded_results(normalized, max_results, keep)
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to connect to YouTube API: {str(e)}"
         )
 
+    # Sample for random playback without disturbing the cached order
+    return SearchResults(videos=_sample(videos, max_results, keep))
+
 
 @router.get("/moods")
 async def get_available_moods():
@@ -1,25 +1,226 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+from typing import Optional
 
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
+logger = logging.getLogger('uvicorn.error')
+
+# Pool tuning, overridable per deployment so the pool can be sized for the worker count
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# The synchronous (psycopg2) pool behind get_db, e.g. user lookups, is separate from the
+# async one, so a worker can hold up to the sum of both pools' connections
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "3"))
+
+
+def _database_url(driver: str) -> str:
+    host = os.environ['DATABASE_HOST']
+    username = os.environ['DATABASE_USER']
+    password = os.environ['DATABASE_PASSWORD']
+
+    return f"postgresql+{driver}://{username}:{password}@{host}:5432/"
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> dict:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+class PoolWaitStats:
+    """
+    Counts async pool checkouts and how long they waited for a connection to be returned
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.waits += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class _WaitTimedQueue(AsyncAdaptedQueue):
+    """
+    The async pool's queue of idle connections. The pool only blocks on it once every
+    connection is checked out, so timing those gets measures queueing alone, without
+    the connects and pre-pings that are part of a checkout.
+    """
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        if not block:
+            return super().get(block, timeout)
+
+        start = time.perf_counter()
+        try:
+            connection = super().get(block, timeout)
+        except Empty:
+            pool_wait_stats.timeouts += 1
+            raise
+        pool_wait_stats.record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class _WaitTimedPool(AsyncAdaptedQueuePool):
+    _queue_class = _WaitTimedQueue
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_wait_stats.checkouts += 1
+
+
 engine = None
-def get_db():
-    global engine
-    if not engine:
-        host = os.environ['DATABASE_HOST']
-        username = os.environ['DATABASE_USER']
-        password = os.environ['DATABASE_PASSWORD']
+async_engine = None
+SessionLocal = None
+AsyncSessionLocal = None
 
-        DATABASE_URL = f"postgresql+psycopg2://{username}:{password}@{host}:5432/"
 
-        engine = create_engine(DATABASE_URL)
+def init_db(sync_url: Optional[str] = None, async_url: Optional[str] = None):
+    """
+    Create the engines and session factories once; called from the app lifespan.
+    The URLs default to the Postgres database named by the DATABASE_* variables.
+    """
+    global engine, async_engine, SessionLocal, AsyncSessionLocal
+    if async_engine is not None:
+        return
+
+    sync_connect_args = {}
+    async_connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        sync_connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        async_connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
+    engine = create_engine(
+        sync_url or _database_url("psycopg2"),
+        connect_args=sync_connect_args,
+        **_pool_options(DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW)
+    )
+    async_engine = create_async_engine(
+        async_url or _database_url("asyncpg"),
+        connect_args=async_connect_args,
+        poolclass=_WaitTimedPool,
+        **_pool_options(DB_POOL_SIZE, DB_MAX_OVERFLOW)
+    )
+    event.listen(async_engine.sync_engine.pool, "checkout", _count_checkout)
 
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # expire_on_commit=False: returned ORM objects are read after commit, and an
+    # async session can't lazily refresh them outside of an await
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def warm_up_pool(connections: int = DB_POOL_WARMUP):
+    """
+    Open `connections` pooled connections up front so the first requests don't pay for connects
+    """
+    if async_engine is None or connections <= 0:
+        return
+
+    # Every connection that did open goes back to the pool, even if others failed
+    results = await asyncio.gather(*(async_engine.connect() for _ in range(connections)), return_exceptions=True)
+    opened = [conn for conn in results if not isinstance(conn, BaseException)]
+    failed = [error for error in results if isinstance(error, BaseException)]
+    try:
+        for conn in opened:
+            await conn.execute(text("SELECT 1"))
+    except (OSError, SQLAlchemyError) as e:
+        failed.append(e)
+    finally:
+        for conn in opened:
+            await conn.close()
+
+    if failed:
+        logger.warning(f"Database pool warm-up opened {len(opened)} of {connections} connections: {failed[0]}")
+
+
+async def dispose_db():
+    global engine, async_engine, SessionLocal, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
+    engine = async_engine = SessionLocal = AsyncSessionLocal = None
+
+
+def _occupancy(pool, max_overflow: int) -> dict:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+def pool_stats() -> dict:
+    """
+    Current state of the async connection pool plus checkout wait times, and of the sync pool
+    """
+    if async_engine is None:
+        return {"initialized": False}
+
+    return {
+        "initialized": True,
+        **_occupancy(async_engine.pool, DB_MAX_OVERFLOW),
+        "wait": pool_wait_stats.snapshot(),
+        "sync": _occupancy(engine.pool, DB_SYNC_MAX_OVERFLOW),
+    }
+
+
+def get_db():
+    if SessionLocal is None:
+        init_db()
 
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """
+    Yields an AsyncSession backed by asyncpg so queries don't block the event loop
+    """
+    if AsyncSessionLocal is None:
+        init_db()
+
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class ContentAddressedCache:
+    """
+    On-disk blob store: each blob is written once under its sha256 and looked up
+    through a small key -> digest ref file, so identical content is stored once and
+    the digest doubles as a strong ETag. Once the blobs exceed max_bytes the least
+    recently used ones are deleted together with the refs pointing at them.
+
+    Recency is tracked per process and seeded from file mtimes on first use. Workers
+    sharing a directory pick up each other's blobs, and a blob another worker deleted
+    simply reads as a miss and is written again.
+
+    get/put do file I/O; from async code use get_async/put_async.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._blobs: OrderedDict[str, int] = OrderedDict() # digest -> size, least recently used first
+        self._blob_refs: dict[str, set[str]] = {} # digest -> names of ref files that pointed at it
+        self._total_bytes = 0
+        self._loaded = False
+        # get/put run on worker threads
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.directory / "blobs" / digest[:2] / digest
+
+    def _ref_path(self, key: str) -> Path:
+        return self.directory / "refs" / hashlib.sha256(key.encode()).hexdigest()
+
+    def _load(self):
+        if self._loaded:
+            return
+        blobs = []
+        for path in (self.directory / "blobs").glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, path.name, stat.st_size))
+        for _, digest, size in sorted(blobs):
+            self._blobs[digest] = size
+            self._total_bytes += size
+
+        for path in (self.directory / "refs").glob("*"):
+            try:
+                digest = path.read_text()
+            except FileNotFoundError:
+                continue
+            if digest in self._blobs:
+                self._blob_refs.setdefault(digest, set()).add(path.name)
+            else:
+                path.unlink(missing_ok=True)
+        self._loaded = True
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, key: str) -> Optional[tuple[str, bytes]]:
+        """
+        (digest, content) for a key, or None
+        """
+        with self._lock:
+            self._load()
+            ref = self._ref_path(key)
+            try:
+                digest = ref.read_text()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+
+            try:
+                data = self._blob_path(digest).read_bytes()
+            except FileNotFoundError:
+                # Evicted by another worker
+                self._drop(digest)
+                ref.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+
+            if digest not in self._blobs:
+                # Written by another worker
+                self._blobs[digest] = len(data)
+                self._total_bytes += len(data)
+            self._blob_refs.setdefault(digest, set()).add(ref.name)
+            self._blobs.move_to_end(digest)
+            self.hits += 1
+            self._evict()
+            return digest, data
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        Store content under its digest, point the key at it, and return the digest
+        """
+        with self._lock:
+            self._load()
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._blob_path(digest)
+            if digest not in self._blobs or not path.exists():
+                self._write_atomic(path, data)
+                if digest not in self._blobs:
+                    self._blobs[digest] = len(data)
+                    self._total_bytes += len(data)
+                self.writes += 1
+            self._blobs.move_to_end(digest)
+
+            ref = self._ref_path(key)
+            self._write_atomic(ref, digest.encode())
+            self._blob_refs.setdefault(digest, set()).add(ref.name)
+            self._evict()
+            return digest
+
+    async def get_async(self, key: str) -> Optional[tuple[str, bytes]]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, data: bytes) -> str:
+        return await asyncio.to_thread(self.put, key, data)
+
+    def _drop(self, digest: str):
+        """
+        Forget a blob, delete it and every ref still pointing at it
+        """
+        size = self._blobs.pop(digest, None)
+        if size is not None:
+            self._total_bytes -= size
+        self._blob_path(digest).unlink(missing_ok=True)
+
+        for name in self._blob_refs.pop(digest, ()):
+            ref = self.directory / "refs" / name
+            try:
+                # The key may have been pointed at other content since
+                if ref.read_text() == digest:
+                    ref.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        # Never evict the most recently used blob, even if it alone exceeds the limit
+        while self._total_bytes > self.max_bytes and len(self._blobs) > 1:
+            self._drop(next(iter(self._blobs)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "blobs": len(self._blobs),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,132 @@
+import httpx
+import importlib.util
+import logging
+import os
+import time
+
+from src.shared.histogram import LatencyHistogram
+
+logger = logging.getLogger('uvicorn.error')
+
+# One long-lived client per upstream so DNS, TCP and TLS setup are paid once per
+# connection instead of once per request
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "10"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+UPSTREAMS = {
+    "weather": "https://api.openweathermap.org",
+    "youtube": "https://www.googleapis.com",
+    "ytimg": "https://i.ytimg.com",
+}
+
+
+class UpstreamStats:
+    """
+    Request latency and how often a pooled connection was reused for one upstream
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": self.requests - self.errors - self.new_connections,
+            "latency": self.latency.snapshot(),
+        }
+
+
+_clients: dict[str, httpx.AsyncClient] = {}
+upstream_stats = {name: UpstreamStats() for name in UPSTREAMS}
+
+
+def _http2_enabled() -> bool:
+    if UPSTREAM_HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("UPSTREAM_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return UPSTREAM_HTTP2
+
+
+def _create_client(base_url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=UPSTREAM_CONNECT_TIMEOUT,
+            read=UPSTREAM_READ_TIMEOUT,
+            write=UPSTREAM_READ_TIMEOUT,
+            pool=UPSTREAM_POOL_TIMEOUT,
+        ),
+    )
+
+
+def start_clients():
+    """
+    Create the per-upstream clients; called from the app lifespan
+    """
+    for name, base_url in UPSTREAMS.items():
+        if name not in _clients:
+            _clients[name] = _create_client(base_url)
+
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    # Lazily created when used outside the lifespan (scripts, tests)
+    if upstream not in _clients:
+        _clients[upstream] = _create_client(UPSTREAMS[upstream])
+    return _clients[upstream]
+
+
+async def upstream_get(upstream: str, path: str, **kwargs) -> httpx.Response:
+    """
+    GET `path` on an upstream through its pooled client, recording latency and
+    whether the request had to open a new connection
+    """
+    stats = upstream_stats[upstream]
+    connected = False
+
+    async def trace(event: str, info: dict):
+        nonlocal connected
+        if event == "connection.connect_tcp.started":
+            connected = True
+
+    stats.requests += 1
+    start = time.perf_counter()
+    try:
+        response = await get_client(upstream).get(path, extensions={"trace": trace}, **kwargs)
+    except httpx.HTTPError:
+        stats.errors += 1
+        raise
+    finally:
+        stats.latency.observe((time.perf_counter() - start) * 1000)
+
+    if connected:
+        stats.new_connections += 1
+    return response
+
+
+def upstream_stats_snapshot() -> dict:
+    return {
+        name: {"client_open": name in _clients, **stats.snapshot()}
+        for name, stats in upstream_stats.items()
+    }
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from typing import Awaitable, Callable, Hashable, Optional
+
+from src.shared.cache import TTLCache
+
+# Responses remembered per Idempotency-Key so retries and double submits replay the
+# first response instead of writing again. Per process, like the other caches: a retry
+# routed to another worker is not deduplicated.
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Keys and request fingerprints are stored as 16-byte digests and bodies as compact JSON
+idempotency_cache = TTLCache(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
+
+
+class _Unremembered(Exception):
+    """
+    Carries a non-2xx result out of the cache loader, so it is returned but not stored
+    """
+
+    def __init__(self, status_code: int, body: dict):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.body = body
+
+
+def _digest(*parts) -> bytes:
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+async def run_idempotent(scope: Hashable,
+                         key: Optional[str],
+                         payload: dict,
+                         handler: Callable[[], Awaitable[tuple[int, dict]]]) -> tuple[int, dict, bool]:
+    """
+    Run `handler` (returning status code and JSON body) at most once per scope and key.
+    Returns (status_code, body, replayed). Concurrent requests with the same key wait for
+    the first. Only 2xx results are remembered: after an error or exception the same key
+    runs the handler again. Reusing a key with a different payload is a 422.
+    """
+    if key is None:
+        status_code, body = await handler()
+        return status_code, body, False
+
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+    fingerprint = _digest(payload)
+    ran = False
+
+    async def load() -> tuple[bytes, int, bytes]:
+        nonlocal ran
+        ran = True
+        status_code, body = await handler()
+        if status_code >= 300:
+            raise _Unremembered(status_code, body)
+        return fingerprint, status_code, json.dumps(jsonable_encoder(body), separators=(",", ":")).encode()
+
+    try:
+        stored_fingerprint, status_code, body = await idempotency_cache.get_or_load(_digest(scope, key), load)
+    except _Unremembered as e:
+        return e.status_code, e.body, not ran
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return status_code, json.loads(body), not ran
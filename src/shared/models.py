@@ -1,35 +1,370 @@
 from fastapi import Depends, HTTPException
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, insert, select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, DateTime, ForeignKey, Text, Float, Index, insert, update, delete, select, extract, func, and_, or_, case, cast, bindparam
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import Iterable, Optional
+from datetime import date, datetime, timedelta, timezone
 from collections import defaultdict
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import asyncio
+import asyncpg
+import base64
 import calendar
+import html
+import itertools
+import json
+import os
+import re
+import weakref
 
-from src.shared.database import get_db
+from src.shared.cache import TTLCache
+from src.shared.database import get_async_db
 
 from user_service_v2.models.user import Base, get_user_repository_v2, UserRepositoryV2
 
 class MoodLog(Base):
     __tablename__ = "mood_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     mood_value = Column(Integer, nullable=False)
     energy_level = Column(Integer, nullable=False)
     notes = Column(Text, nullable=True)
     weather = Column(String(100), nullable=True)
+    # Parsed from `weather` on write; stats group on condition_id instead of the free text
+    temperature_c = Column(Float, nullable=True)
+    condition_id = Column(SmallInteger, ForeignKey("weather_conditions.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Every per-user query filters on user_id and orders by created_at; mood/energy are
+        # included so the stats queries can be answered by an index-only scan on Postgres
+        Index(
+            "ix_mood_logs_user_id_created_at",
+            user_id,
+            created_at.desc(),
+            postgresql_include=["mood_value", "energy_level"],
+        ),
+    )
+
+class WeatherCondition(Base):
+    """
+    Small lookup table of weather descriptions ("light rain", "clear sky", ...)
+    """
+    __tablename__ = "weather_conditions"
+
+    # SMALLSERIAL on Postgres; SQLite only autoincrements an INTEGER primary key
+    id = Column(SmallInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+# "12°C – light rain" as shown by the weather widget; a bare description is also accepted
+WEATHER_TEXT_RE = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*°\s*C\s*(?:[–-]\s*(.*))?", re.IGNORECASE)
+
+# Widget placeholders that used to be saved as if they were weather
+NOT_WEATHER = {"loading weather...", "location denied", "geolocation not supported", "unknown"}
+
+# The descriptions OpenWeather reports (what the weather widget shows). The weather text is
+# client input, so anything else is filed under OTHER_WEATHER_CONDITION rather than becoming
+# a new weather_conditions row; the table never holds more than these plus "other".
+WEATHER_CONDITIONS = frozenset({
+    "thunderstorm with light rain", "thunderstorm with rain", "thunderstorm with heavy rain",
+    "light thunderstorm", "thunderstorm", "heavy thunderstorm", "ragged thunderstorm",
+    "thunderstorm with light drizzle", "thunderstorm with drizzle", "thunderstorm with heavy drizzle",
+    "light intensity drizzle", "drizzle", "heavy intensity drizzle", "light intensity drizzle rain",
+    "drizzle rain", "heavy intensity drizzle rain", "shower rain and drizzle",
+    "heavy shower rain and drizzle", "shower drizzle",
+    "light rain", "moderate rain", "heavy intensity rain", "very heavy rain", "extreme rain",
+    "freezing rain", "light intensity shower rain", "shower rain", "heavy intensity shower rain",
+    "ragged shower rain",
+    "light snow", "snow", "heavy snow", "sleet", "light shower sleet", "shower sleet",
+    "light rain and snow", "rain and snow", "light shower snow", "shower snow", "heavy shower snow",
+    "mist", "smoke", "haze", "sand/dust whirls", "fog", "sand", "dust", "volcanic ash", "squalls", "tornado",
+    "clear sky", "few clouds", "scattered clouds", "broken clouds", "overcast clouds",
+})
+OTHER_WEATHER_CONDITION = "other"
+
+def parse_weather(weather: Optional[str]) -> tuple[Optional[float], Optional[str]]:
+    """
+    Split a weather string into (temperature in °C, condition name), the name being one
+    of WEATHER_CONDITIONS or OTHER_WEATHER_CONDITION
+    """
+    if not weather or weather.strip().lower() in NOT_WEATHER:
+        return None, None
+    match = WEATHER_TEXT_RE.fullmatch(weather)
+    if match:
+        temperature, condition = float(match.group(1)), match.group(2)
+    else:
+        temperature, condition = None, weather
+    condition = " ".join((condition or "").split()).lower()
+    if not condition:
+        return temperature, None
+    return temperature, condition if condition in WEATHER_CONDITIONS else OTHER_WEATHER_CONDITION
+
+# Condition name -> id for each database (keyed by engine, so a second database or a fresh
+# engine on a reseeded one looks them up again). Names never change id once created; at most
+# len(WEATHER_CONDITIONS) + 1 entries per engine
+_weather_condition_ids: weakref.WeakKeyDictionary[Engine, dict[str, int]] = weakref.WeakKeyDictionary()
+
+class MoodDailyRollup(Base):
+    """
+    Per-user, per-day aggregates of mood_logs so stats read O(days) rows instead of O(logs).
+    Kept in step with mood_logs by every write path in MoodLogRepositoryV2.
+    """
+    __tablename__ = "mood_daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    log_count = Column(Integer, nullable=False)
+    mood_sum = Column(Integer, nullable=False)
+    mood_min = Column(Integer, nullable=False)
+    mood_max = Column(Integer, nullable=False)
+    energy_sum = Column(Integer, nullable=False)
+    energy_min = Column(Integer, nullable=False)
+    energy_max = Column(Integer, nullable=False)
+
+def encode_cursor(created_at: datetime, log_id: int, rank: Optional[float] = None) -> str:
+    """
+    Opaque keyset cursor pointing just past the (created_at, id) of the last row on a page,
+    or past its (rank, created_at, id) for ranked search results
+    """
+    fields = {"c": created_at.isoformat(), "i": log_id}
+    if rank is not None:
+        fields["r"] = rank
+    payload = json.dumps(fields, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Raises ValueError if the cursor wasn't produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def decode_search_cursor(cursor: str) -> tuple[float, datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(payload["r"]), datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+# Text search configuration of the generated mood_logs.notes_tsv column (see its migration)
+MOOD_SEARCH_CONFIG = "english"
+# Not a mapped attribute: the column only exists on Postgres and is never loaded with a MoodLog
+notes_tsv = literal_column("mood_logs.notes_tsv")
+
+# Highlight markers that can't appear in typed notes; replaced by <mark> after HTML-escaping
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+SEARCH_HEADLINE_OPTIONS = f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxWords=30, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "'
+SEARCH_SNIPPET_CHARS = 160
+
+def render_highlight(snippet: Optional[str]) -> Optional[str]:
+    """
+    HTML-safe snippet with matches wrapped in <mark>
+    """
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+def search_terms(query: str) -> list[str]:
+    return list(dict.fromkeys(re.findall(r"\w+", query.lower())))
+
+def like_headline(notes: str, terms: list[str]) -> str:
+    """
+    Python stand-in for ts_headline on SQLite: a window around the first match with every term marked
+    """
+    lowered = notes.lower()
+    first = min((lowered.find(term) for term in terms if term in lowered), default=0)
+    start = max(0, first - SEARCH_SNIPPET_CHARS // 3)
+    end = min(len(notes), start + SEARCH_SNIPPET_CHARS)
+    snippet = notes[start:end]
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    snippet = pattern.sub(lambda match: f"{HIGHLIGHT_START}{match.group(0)}{HIGHLIGHT_STOP}", snippet)
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(notes) else "")
+
+# Per-user analytics results, shared by the REST routes and the NiceGUI pages of this process.
+# Other workers only see a write once their entry's TTL runs out.
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "10000"))
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "300"))
+
+analytics_cache = TTLCache(max_entries=ANALYTICS_CACHE_MAX_ENTRIES, ttl_seconds=ANALYTICS_CACHE_TTL_SECONDS)
+
+# Current generation per user, bounded like the cache itself. Generations are drawn from one
+# process-wide counter, so a user whose entry was evicted gets a value no old key carries.
+_analytics_generations = TTLCache(max_entries=ANALYTICS_CACHE_MAX_ENTRIES, ttl_seconds=ANALYTICS_CACHE_TTL_SECONDS)
+_next_generation = itertools.count()
+
+def _analytics_generation(user_id: int) -> int:
+    generation = _analytics_generations.get(user_id)
+    if generation is None:
+        generation = next(_next_generation)
+        _analytics_generations.set(user_id, generation)
+    return generation
+
+def invalidate_user_analytics(user_id: int):
+    _analytics_generations.set(user_id, next(_next_generation))
+
+DASHBOARD_SECTIONS = ("mood_stats", "weekly_mood_stats", "weather_mood_stats", "running_means", "mood_logs")
+
+# First key of the (namespace, user_id) advisory lock taken around rollup refreshes
+ROLLUP_LOCK_NAMESPACE = 0x6D6F6F64
+
+# Rows per multi-row INSERT statement; keeps SQLite under its bound-parameter limit
+BULK_INSERT_CHUNK_SIZE = 500
+
 class MoodLogRepositoryV2():
     """
     Controls manipulation of the mood_logs table
     """
 
     def __init__(self, session):
+        # Either an AsyncSession (production, asyncpg) or a plain Session (SQLite test fixtures)
         self.session = session
+
+    async def _execute(self, statement, params=None):
+        if isinstance(self.session, AsyncSession):
+            return await self.session.execute(statement, params)
+        return self.session.execute(statement, params)
+
+    async def _commit(self):
+        if isinstance(self.session, AsyncSession):
+            await self.session.commit()
+        else:
+            self.session.commit()
+
+    async def _rollback(self):
+        if isinstance(self.session, AsyncSession):
+            await self.session.rollback()
+        else:
+            self.session.rollback()
+
+    async def _flush(self):
+        if isinstance(self.session, AsyncSession):
+            await self.session.flush()
+        else:
+            self.session.flush()
+
+    def _dialect_name(self) -> str:
+        return self.session.bind.dialect.name
+
+    def _engine(self) -> Engine:
+        # The session may be bound to an AsyncEngine, an Engine or a Connection (test fixtures)
+        bind = getattr(self.session.bind, "sync_engine", self.session.bind)
+        return bind.engine
+
+    async def _condition_ids(self, names: set[str]) -> dict[str, int]:
+        """
+        Ids for condition names from parse_weather, inserting the ones seen for the first time
+        """
+        known = _weather_condition_ids.setdefault(self._engine(), {})
+        ids = {name: known[name] for name in names if name in known}
+        missing = names - ids.keys()
+        if missing:
+            select_ids = select(WeatherCondition.id, WeatherCondition.name).where(WeatherCondition.name.in_(missing))
+            existing = {name: condition_id for condition_id, name in (await self._execute(select_ids)).all()}
+            # Only committed names are shared with other requests; a new name's row may still be rolled back
+            known.update(existing)
+            ids.update(existing)
+
+            if missing - existing.keys():
+                dialect_insert = postgresql_insert if self._dialect_name() == "postgresql" else sqlite_insert
+                await self._execute(
+                    dialect_insert(WeatherCondition)
+                    .values([{"name": name} for name in sorted(missing - existing.keys())])
+                    .on_conflict_do_nothing(index_elements=[WeatherCondition.name])
+                )
+                ids.update({name: condition_id for condition_id, name in (await self._execute(select_ids)).all()})
+        return ids
+
+    async def _with_weather_columns(self, rows: list[dict]) -> list[dict]:
+        """
+        Fill temperature_c/condition_id on rows from their `weather` text
+        """
+        parsed = [parse_weather(row.get("weather")) for row in rows]
+        condition_ids = await self._condition_ids({condition for _, condition in parsed if condition})
+        for row, (temperature, condition) in zip(rows, parsed):
+            row["temperature_c"] = temperature
+            row["condition_id"] = condition_ids.get(condition)
+        return rows
+
+    # Read-through analytics cache: keys carry the user's generation, so a write makes
+    # every older entry for that user unreachable (it then ages out of the LRU)
+    async def _cached(self, user_id: int, query: str, params: tuple, loader):
+        key = (user_id, _analytics_generation(user_id), query, params)
+        return await analytics_cache.get_or_load(key, loader)
+
+    # Rollup maintenance: the affected days are recomputed from mood_logs inside the
+    # caller's transaction, so they can never drift from the rows they summarize
+    async def _lock_rollups(self, user_id: int):
+        """
+        Serialize rollup refreshes per user until the transaction ends. Without it two
+        READ COMMITTED writers for the same day each recompute from a snapshot missing the
+        other's log. SQLite already serializes writers.
+        """
+        if self._dialect_name() == "postgresql":
+            await self._execute(select(func.pg_advisory_xact_lock(ROLLUP_LOCK_NAMESPACE, user_id)))
+
+    async def _delete_rollups(self, user_id: int, days: Optional[set[date]] = None):
+        statement = delete(MoodDailyRollup).where(MoodDailyRollup.user_id == user_id)
+        if days is not None:
+            statement = statement.where(MoodDailyRollup.day.in_(days))
+        await self._execute(statement)
+
+    async def _insert_rollups(self, user_id: int, days: Optional[set[date]] = None):
+        log_day = func.date(MoodLog.created_at, type_=Date)
+        source = select(
+            MoodLog.user_id,
+            log_day,
+            func.count(),
+            func.sum(MoodLog.mood_value),
+            func.min(MoodLog.mood_value),
+            func.max(MoodLog.mood_value),
+            func.sum(MoodLog.energy_level),
+            func.min(MoodLog.energy_level),
+            func.max(MoodLog.energy_level)
+        ).where(MoodLog.user_id == user_id)
+
+        if days is not None:
+            # The range keeps this on the (user_id, created_at) index
+            source = source.where(
+                MoodLog.created_at >= datetime.combine(min(days), datetime.min.time()),
+                MoodLog.created_at < datetime.combine(max(days) + timedelta(days=1), datetime.min.time()),
+                log_day.in_(days)
+            )
+
+        columns = ["user_id", "day", "log_count", "mood_sum", "mood_min", "mood_max", "energy_sum", "energy_min", "energy_max"]
+        dialect_insert = postgresql_insert if self._dialect_name() == "postgresql" else sqlite_insert
+        statement = dialect_insert(MoodDailyRollup).from_select(columns, source.group_by(MoodLog.user_id, log_day))
+        await self._execute(
+            statement.on_conflict_do_update(
+                index_elements=[MoodDailyRollup.user_id, MoodDailyRollup.day],
+                set_={column: statement.excluded[column] for column in columns[2:]}
+            )
+        )
+
+    async def _refresh_rollups(self, user_id: int, days: Optional[set[date]] = None):
+        if days is not None and not days:
+            return
+        await self._lock_rollups(user_id)
+        if days is None:
+            # A full rebuild also drops days that no longer have logs
+            await self._delete_rollups(user_id)
+        await self._insert_rollups(user_id, days)
+
+    # Recompute every rollup for a user from scratch (used by the backfill command)
+    async def rebuild_rollups(self, user_id: int):
+        await self._refresh_rollups(user_id)
+        await self._commit()
+        invalidate_user_analytics(user_id)
     
     # Create a new mood log entry
     async def create_mood_log(self,
@@ -37,50 +372,89 @@ class MoodLogRepositoryV2():
                                 mood_value: int,
                                 energy_level: int,
                                 notes: Optional[str] = None,
-                                weather: Optional[str] = None) -> MoodLog:
+                                weather: Optional[str] = None) -> Optional[MoodLog]:
+        return await self._insert_mood_log(user_id, mood_value, energy_level, datetime.utcnow(), notes, weather)
 
+    async def _insert_mood_log(self,
+                               user_id: int,
+                               mood_value: int,
+                               energy_level: int,
+                               created_at: datetime,
+                               notes: Optional[str] = None,
+                               weather: Optional[str] = None) -> Optional[MoodLog]:
+        """
+        INSERT ... RETURNING, so the caller gets the persisted row (id and created_at included)
+        without a second query. None if the insert was rejected.
+        """
         try:
-            self.session.execute(insert(MoodLog), [{
+            row, = await self._with_weather_columns([{
                 "user_id": user_id,
                 "mood_value": mood_value,
                 "energy_level": energy_level,
                 "notes": notes,
-                "weather": weather
+                "weather": weather,
+                "created_at": created_at
             }])
-            self.session.commit()
-            return MoodLog(
-                user_id=user_id,
-                mood_value=mood_value,
-                energy_level=energy_level,
-                notes=notes,
-                weather=weather
-            )
+            mood_log = (await self._execute(insert(MoodLog).values(row).returning(MoodLog))).scalar_one()
+            await self._refresh_rollups(user_id, {mood_log.created_at.date()})
+            await self._commit()
         except IntegrityError:
-            self.session.rollback()
+            await self._rollback()
             return None
+
+        invalidate_user_analytics(user_id)
+        return mood_log
         
     # Edit latest mood log entry for a user (can only edit mood_value, energy_level, notes)
     async def edit_latest_mood_log(self,
                                     user_id: int,
                                     mood_value: Optional[int] = None,
                                     energy_level: Optional[int] = None,
-                                    notes: Optional[str] = None):
-        latest_log = await self.get_latest_mood_log(user_id)
-        if not latest_log:
-            return None
-        
-        if mood_value is not None:
-            latest_log.mood_value = mood_value
-        if energy_level is not None:
-            latest_log.energy_level = energy_level
-        if notes is not None:
-            latest_log.notes = notes
-        self.session.commit()
+                                    notes: Optional[str] = None) -> Optional[MoodLog]:
+        """
+        One UPDATE ... WHERE id = (latest id) RETURNING statement; None if the user has no logs
+        """
+        changes = {
+            key: value
+            for key, value in {"mood_value": mood_value, "energy_level": energy_level, "notes": notes}.items()
+            if value is not None
+        }
+        if not changes:
+            return await self.get_latest_mood_log(user_id)
+
+        latest_id = (
+            select(MoodLog.id)
+            .where(MoodLog.user_id == user_id)
+            .order_by(MoodLog.created_at.desc(), MoodLog.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        try:
+            result = await self._execute(
+                update(MoodLog)
+                .where(MoodLog.id == latest_id)
+                .values(**changes)
+                .returning(MoodLog)
+                # The latest row may already be in the session; overwrite it with the returned values
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            latest_log = result.scalar_one_or_none()
+            if latest_log is None:
+                await self._rollback()
+                return None
+
+            await self._refresh_rollups(user_id, {latest_log.created_at.date()})
+            await self._commit()
+        except IntegrityError:
+            await self._rollback()
+            raise
+
+        invalidate_user_analytics(user_id)
         return latest_log
         
     # Get the date of the most recent mood log for a user
     async def get_most_recent_log_date(self, user_id: int) -> Optional[datetime]:
-        result = self.session.execute(
+        result = await self._execute(
             select(MoodLog.created_at).where(MoodLog.user_id == user_id).order_by(MoodLog.created_at.desc()).limit(1)
         )
         
@@ -89,135 +463,334 @@ class MoodLogRepositoryV2():
     
     # Get the latest mood log for a user
     async def get_latest_mood_log(self, user_id: int) -> Optional[MoodLog]:
-        result = self.session.execute(
-            select(MoodLog).where(MoodLog.user_id == user_id).order_by(MoodLog.created_at.desc()).limit(1)
+        result = await self._execute(
+            select(MoodLog).where(MoodLog.user_id == user_id).order_by(MoodLog.created_at.desc(), MoodLog.id.desc()).limit(1)
         )
         mood_log = result.scalar_one_or_none()
         return mood_log
     
-    # Get all mood logs for a user, limited by 'limit'
-    async def get_mood_logs(self, user_id: int, limit: int = 10) -> list[MoodLog]:
-        result = self.session.execute(
+    # Get all mood logs for a user, limited by 'limit'. Cached as response models rather
+    # than ORM rows, which belong to the session that loaded them.
+    async def get_mood_logs(self, user_id: int, limit: int = 10) -> list["MoodLogResponse"]:
+        return await self._cached(user_id, "mood_logs", (limit,), lambda: self._query_mood_logs(user_id, limit))
+
+    async def _query_mood_logs(self, user_id: int, limit: int) -> list["MoodLogResponse"]:
+        result = await self._execute(
             select(MoodLog).where(MoodLog.user_id == user_id).order_by(MoodLog.created_at.desc()).limit(limit)
         )
         mood_logs = result.scalars().all()
 
-        return sorted(mood_logs, key=lambda log: log.created_at, reverse=True)
+        return [MoodLogResponse.from_db_model(log) for log in sorted(mood_logs, key=lambda log: log.created_at, reverse=True)]
+
+    # Get a page of mood logs for a user, newest first, resuming after 'cursor'
+    async def get_mood_logs_page(self,
+                                    user_id: int,
+                                    limit: int = 20,
+                                    cursor: Optional[str] = None,
+                                    start: Optional[datetime] = None,
+                                    end: Optional[datetime] = None) -> tuple[list[MoodLog], Optional[str]]:
+        """
+        Keyset pagination on (created_at, id), so every page costs O(limit) no matter how deep.
+        'start' is inclusive and 'end' exclusive. Returns the page and the cursor for the next
+        one (None on the last page).
+        """
+
+        query = select(MoodLog).where(MoodLog.user_id == user_id)
+
+        if start is not None:
+            query = query.where(MoodLog.created_at >= start)
+        if end is not None:
+            query = query.where(MoodLog.created_at < end)
+        if cursor is not None:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            query = query.where(or_(
+                MoodLog.created_at < cursor_created_at,
+                and_(MoodLog.created_at == cursor_created_at, MoodLog.id < cursor_id)
+            ))
+
+        # Fetch one extra row to learn whether another page exists
+        result = await self._execute(
+            query.order_by(MoodLog.created_at.desc(), MoodLog.id.desc()).limit(limit + 1)
+        )
+        mood_logs = list(result.scalars().all())
+
+        next_cursor = None
+        if len(mood_logs) > limit:
+            mood_logs = mood_logs[:limit]
+            last = mood_logs[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return mood_logs, next_cursor
+
+    # Full-text search over a user's notes, best matches first, resuming after 'cursor'
+    async def search_mood_logs(self,
+                                user_id: int,
+                                query: str,
+                                limit: int = 20,
+                                cursor: Optional[str] = None) -> tuple[list[tuple[MoodLog, float, str]], Optional[str]]:
+        """
+        Returns (log, rank, highlighted HTML snippet) tuples and the cursor for the next page.
+        Postgres matches websearch syntax against the GIN-indexed notes_tsv column and ranks
+        with ts_rank_cd; SQLite falls back to a case-insensitive LIKE per word, newest first.
+        """
+        if self._dialect_name() == "postgresql":
+            results = await self._search_fulltext(user_id, query, limit + 1, cursor)
+        else:
+            results = await self._search_like(user_id, query, limit + 1, cursor)
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last, rank, _ = results[-1]
+            next_cursor = encode_cursor(last.created_at, last.id, rank)
+
+        return [(log, rank, render_highlight(snippet)) for log, rank, snippet in results], next_cursor
+
+    def _after_search_cursor(self, rank_expression, cursor: str):
+        cursor_rank, cursor_created_at, cursor_id = decode_search_cursor(cursor)
+        return or_(
+            rank_expression < cursor_rank,
+            and_(rank_expression == cursor_rank, or_(
+                MoodLog.created_at < cursor_created_at,
+                and_(MoodLog.created_at == cursor_created_at, MoodLog.id < cursor_id)
+            ))
+        )
+
+    async def _search_fulltext(self, user_id: int, query: str, limit: int, cursor: Optional[str]) -> list[tuple[MoodLog, float, str]]:
+        config = cast(MOOD_SEARCH_CONFIG, REGCONFIG)
+        tsquery = func.websearch_to_tsquery(config, query)
+        rank = func.ts_rank_cd(notes_tsv, tsquery)
+
+        # Rank every match on the (user_id, notes_tsv) GIN index, but only build headlines for the page
+        page = select(MoodLog.id, rank.label("rank")).where(MoodLog.user_id == user_id, notes_tsv.op("@@")(tsquery))
+        if cursor is not None:
+            page = page.where(self._after_search_cursor(rank, cursor))
+        page = page.order_by(rank.desc(), MoodLog.created_at.desc(), MoodLog.id.desc()).limit(limit).subquery()
+
+        result = await self._execute(
+            select(MoodLog, page.c.rank, func.ts_headline(config, MoodLog.notes, tsquery, SEARCH_HEADLINE_OPTIONS))
+            .join(page, page.c.id == MoodLog.id)
+            .order_by(page.c.rank.desc(), MoodLog.created_at.desc(), MoodLog.id.desc())
+        )
+        return [(log, float(rank), snippet) for log, rank, snippet in result.all()]
+
+    async def _search_like(self, user_id: int, query: str, limit: int, cursor: Optional[str]) -> list[tuple[MoodLog, float, str]]:
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        statement = select(MoodLog).where(MoodLog.user_id == user_id, MoodLog.notes.isnot(None))
+        for term in terms:
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            statement = statement.where(MoodLog.notes.ilike(f"%{escaped}%", escape="\\"))
+        if cursor is not None:
+            # Every LIKE match ranks equally, so this is plain recency order
+            statement = statement.where(self._after_search_cursor(literal_column("0.0"), cursor))
+
+        result = await self._execute(statement.order_by(MoodLog.created_at.desc(), MoodLog.id.desc()).limit(limit))
+        return [(log, 0.0, like_headline(log.notes, terms)) for log in result.scalars().all()]
 
     # Get average mood, energy level, and total logs for a user
     async def get_mood_stats(self, user_id: int) -> dict:
-        result = self.session.execute(
+        return await self._cached(user_id, "mood_stats", (), lambda: self._query_mood_stats(user_id))
+
+    async def _query_mood_stats(self, user_id: int) -> dict:
+        result = await self._execute(
             select(
-                func.avg(MoodLog.mood_value).label("avg_mood"),
-                func.avg(MoodLog.energy_level).label("avg_energy"),
-                func.count(MoodLog.id).label("total_logs")
-            ).where(MoodLog.user_id == user_id)
+                func.sum(MoodDailyRollup.mood_sum).label("mood_sum"),
+                func.sum(MoodDailyRollup.energy_sum).label("energy_sum"),
+                func.sum(MoodDailyRollup.log_count).label("total_logs")
+            ).where(MoodDailyRollup.user_id == user_id)
         )
 
         stats = result.first()
+        total_logs = int(stats.total_logs or 0)
 
         return {
-            "avg_mood": round(float(stats.avg_mood or 0), 2),
-            "avg_energy": round(float(stats.avg_energy or 0), 2),
-            "total_logs": stats.total_logs or 0
+            "avg_mood": round(float(stats.mood_sum) / total_logs, 2) if total_logs else 0.0,
+            "avg_energy": round(float(stats.energy_sum) / total_logs, 2) if total_logs else 0.0,
+            "total_logs": total_logs
         }
     
     # Get average mood, energy level, and total logs for all days of a week
-    async def get_weekly_mood_stats(self, user_id: int) -> list[dict]:
+    async def get_weekly_mood_stats(self, user_id: int, tz: Optional[str] = None) -> list[dict]:
+        return await self._cached(user_id, "weekly_mood_stats", (tz,), lambda: self._query_weekly_mood_stats(user_id, tz))
+
+    async def _query_weekly_mood_stats(self, user_id: int, tz: Optional[str]) -> list[dict]:
         """
-        Get stats based on the days of the week
+        Get stats based on the days of the week, in calendar order (Monday first)
 
         Example:
         Monday: avg_mood, avg_energy, total_logs
         Tuesday: avg_mood, avg_energy, total_logs
         ...
-        """
 
-        result = self.session.execute(
-            select(MoodLog).where(MoodLog.user_id == user_id)
-        )
-        logs = result.scalars().all()
+        Aggregated in one GROUP BY over the daily rollups (UTC days). When 'tz' (an IANA name)
+        is given, logs are bucketed by their local weekday instead, straight from mood_logs.
+        Raises ValueError for an unknown time zone.
+        """
 
-        weekday_groups = defaultdict(list)
+        if tz is None:
+            day_of_week = extract("dow", MoodDailyRollup.day)
+            query = select(
+                day_of_week.label("dow"),
+                func.sum(MoodDailyRollup.log_count).label("total_logs"),
+                func.sum(MoodDailyRollup.mood_sum).label("mood_sum"),
+                func.sum(MoodDailyRollup.energy_sum).label("energy_sum")
+            ).where(MoodDailyRollup.user_id == user_id)
+        else:
+            day_of_week = extract("dow", self._local_time(MoodLog.created_at, tz))
+            query = select(
+                day_of_week.label("dow"),
+                func.count().label("total_logs"),
+                func.sum(MoodLog.mood_value).label("mood_sum"),
+                func.sum(MoodLog.energy_level).label("energy_sum")
+            ).where(MoodLog.user_id == user_id)
 
-        for log in logs:
-            weekday_number = log.created_at.weekday()
-            weekday_name = calendar.day_name[weekday_number]
-            weekday_groups[weekday_name].append(log)
+        # Group by the output label so Postgres doesn't have to match the bound time zone twice
+        result = await self._execute(query.group_by("dow"))
 
         weekly_stats = []
 
-        for day, logs_for_day in weekday_groups.items():
-            if len(logs_for_day) == 0:
+        # extract('dow') counts from Sunday = 0; calendar.day_name starts at Monday
+        for entry in sorted(result.all(), key=lambda entry: (int(entry.dow) + 6) % 7):
+            total_logs = int(entry.total_logs or 0)
+            if total_logs == 0:
                 continue
 
-            avg_mood = sum(log.mood_value for log in logs_for_day) / len(logs_for_day)
-            avg_energy = sum(log.energy_level for log in logs_for_day) / len(logs_for_day)
-            total_logs = len(logs_for_day)
-
             weekly_stats.append({
-                "day": day,
-                "avg_mood": avg_mood,
-                "avg_energy": avg_energy,
+                "day": calendar.day_name[(int(entry.dow) + 6) % 7],
+                "avg_mood": float(entry.mood_sum) / total_logs,
+                "avg_energy": float(entry.energy_sum) / total_logs,
                 "total_logs": total_logs,
             })
 
         return weekly_stats
+
+    def _local_time(self, utc_column, tz: str):
+        """
+        Convert a naive-UTC timestamp column to wall-clock time in 'tz'
+        """
+        try:
+            zone = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise ValueError(f"Unknown time zone: {tz}") from e
+
+        if self._dialect_name() == "postgresql":
+            return func.timezone(tz, func.timezone("UTC", utc_column))
+
+        # SQLite has no time zone support: fall back to the zone's current UTC offset
+        offset_minutes = int(datetime.now(zone).utcoffset().total_seconds() // 60)
+        return func.datetime(utc_column, f"{offset_minutes:+d} minutes")
     
     # Get average mood, energy level, and total logs for each weather condition
-    async def get_weather_mood_stats(self, user_id: int) -> list[dict]:
+    async def get_weather_mood_stats(self, user_id: int, temperature_band: Optional[int] = None) -> list[dict]:
+        return await self._cached(user_id, "weather_mood_stats", (temperature_band,),
+                                  lambda: self._query_weather_mood_stats(user_id, temperature_band))
+
+    async def _query_weather_mood_stats(self, user_id: int, temperature_band: Optional[int] = None) -> list[dict]:
         """
-        Get stats based on weather conditions
+        Get stats based on weather conditions, optionally split into temperature bands
+        of `temperature_band` °C (logs without a temperature form their own band)
 
         Example:
-        Sunny: avg_mood, avg_energy, total_logs
-        Rainy: avg_mood, avg_energy, total_logs
+        clear sky: avg_mood, avg_energy, total_logs
+        light rain: avg_mood, avg_energy, total_logs
         ...
         """
+        group_by = [MoodLog.condition_id]
+        columns = [MoodLog.condition_id]
+        if temperature_band:
+            # Portable floor(): SQLite's CAST truncates toward zero
+            scaled = MoodLog.temperature_c / temperature_band
+            truncated = cast(scaled, Integer)
+            band = truncated - case((scaled < truncated, 1), else_=0)
+            group_by.append(band)
+            columns.append(band.label("band"))
 
-        result = self.session.execute(
+        stats = (
             select(
-                MoodLog.weather,
+                *columns,
                 func.avg(MoodLog.mood_value).label("avg_mood"),
                 func.avg(MoodLog.energy_level).label("avg_energy"),
                 func.count(MoodLog.id).label("total_logs")
-            ).where(
-                (MoodLog.user_id == user_id) &
-                (MoodLog.weather.isnot(None)) &
-                (MoodLog.weather != "")
             )
-            .group_by(MoodLog.weather)
-            .order_by(MoodLog.weather)
+            .where((MoodLog.user_id == user_id) & MoodLog.condition_id.isnot(None))
+            .group_by(*group_by)
+            .subquery()
+        )
+        result = await self._execute(
+            select(stats, WeatherCondition.name)
+            .join(WeatherCondition, WeatherCondition.id == stats.c.condition_id)
+            .order_by(WeatherCondition.name, *([stats.c.band] if temperature_band else []))
         )
 
         weather_stats = []
 
         for entry in result.all():
-            weather_stats.append({
-                "weather": entry.weather,
+            row = {
+                "weather": entry.name,
+                "condition_id": entry.condition_id,
                 "avg_mood": round(float(entry.avg_mood or 0), 2),
                 "avg_energy": round(float(entry.avg_energy or 0), 2),
                 "total_logs": entry.total_logs or 0
-            })
+            }
+            if temperature_band:
+                row["temperature_min_c"] = entry.band * temperature_band if entry.band is not None else None
+                row["temperature_max_c"] = (entry.band + 1) * temperature_band if entry.band is not None else None
+            weather_stats.append(row)
 
         return weather_stats
+
+    # Fill temperature_c/condition_id for rows written before those columns existed
+    async def backfill_weather_columns(self, after_id: int = 0, batch_size: int = 1000) -> Optional[int]:
+        """
+        Parse and update one batch of rows with id > after_id; returns the last id
+        processed, or None once there is nothing left
+        """
+        result = await self._execute(
+            select(MoodLog.id, MoodLog.user_id, MoodLog.weather)
+            .where(MoodLog.id > after_id, MoodLog.condition_id.is_(None), MoodLog.weather.isnot(None))
+            .order_by(MoodLog.id)
+            .limit(batch_size)
+        )
+        rows = [{"log_id": log_id, "user_id": user_id, "weather": weather} for log_id, user_id, weather in result.all()]
+        if not rows:
+            return None
+
+        await self._with_weather_columns(rows)
+        parsed = [row for row in rows if row["condition_id"] is not None or row["temperature_c"] is not None]
+        if parsed:
+            await self._execute(
+                update(MoodLog.__table__)
+                .where(MoodLog.__table__.c.id == bindparam("log_id"))
+                .values(temperature_c=bindparam("temperature_c"), condition_id=bindparam("condition_id")),
+                [{key: row[key] for key in ("log_id", "temperature_c", "condition_id")} for row in parsed]
+            )
+        await self._commit()
+
+        for user_id in {row["user_id"] for row in parsed}:
+            invalidate_user_analytics(user_id)
+        return rows[-1]["log_id"]
     
     # Calculate running means for mood and energy levels for each day
     async def get_running_means(self, user_id: int, limit: int = 20) -> list[dict]:
+        return await self._cached(user_id, "running_means", (limit,), lambda: self._query_running_means(user_id, limit))
+
+    async def _query_running_means(self, user_id: int, limit: int) -> list[dict]:
         """
         Average mood and energy aggregated by day, ordered by most recent date.
         For example, the average on 2024-10-01 would be the mean of all mood and energy logs
         created on and before 2024-10-01.
         """
 
-        result = self.session.execute(
+        result = await self._execute(
             select(
-                func.date(MoodLog.created_at).label("log_date"),
-                func.avg(MoodLog.mood_value).label("avg_mood"),
-                func.avg(MoodLog.energy_level).label("avg_energy")
-            ).where(MoodLog.user_id == user_id)
-            .group_by(func.date(MoodLog.created_at))
-            .order_by(func.date(MoodLog.created_at).desc())
+                MoodDailyRollup.day.label("log_date"),
+                (MoodDailyRollup.mood_sum * 1.0 / MoodDailyRollup.log_count).label("avg_mood"),
+                (MoodDailyRollup.energy_sum * 1.0 / MoodDailyRollup.log_count).label("avg_energy")
+            ).where(MoodDailyRollup.user_id == user_id)
+            .order_by(MoodDailyRollup.day.desc())
             .limit(limit)
         )
 
@@ -243,14 +816,54 @@ class MoodLogRepositoryV2():
             })
 
         return running_means
+
+    async def get_dashboard(self,
+                            user_id: int,
+                            tz: Optional[str] = None,
+                            log_limit: int = 10,
+                            running_limit: int = 20,
+                            sections: Optional[Iterable[str]] = None) -> dict:
+        """
+        Analytics views for one user in a single call: every one of DASHBOARD_SECTIONS,
+        or just `sections`. On an async engine the sections run concurrently, so the call
+        costs as much as the slowest query rather than their sum; a sync session runs
+        them in turn. Ask only for the sections a page shows: each one that misses the
+        analytics cache holds a pooled connection while it runs.
+        """
+        loaders = {
+            "mood_stats": lambda repo: repo.get_mood_stats(user_id),
+            "weekly_mood_stats": lambda repo: repo.get_weekly_mood_stats(user_id, tz=tz),
+            "weather_mood_stats": lambda repo: repo.get_weather_mood_stats(user_id),
+            "running_means": lambda repo: repo.get_running_means(user_id, limit=running_limit),
+            "mood_logs": lambda repo: repo.get_mood_logs(user_id, limit=log_limit),
+        }
+        names = DASHBOARD_SECTIONS if sections is None else [name for name in DASHBOARD_SECTIONS if name in set(sections)]
+        if not names:
+            return {}
+
+        if not isinstance(self.session, AsyncSession):
+            return {name: await loaders[name](self) for name in names}
+
+        # An AsyncSession can't run statements concurrently, so the other sections get
+        # sessions of their own; those only check out a connection on a cache miss
+        async def load_isolated(load):
+            async with AsyncSession(self.session.bind, autoflush=False, expire_on_commit=False) as session:
+                return await load(MoodLogRepositoryV2(session))
+
+        first, *rest = names
+        results = await asyncio.gather(loaders[first](self), *(load_isolated(loaders[name]) for name in rest))
+        return dict(zip(names, results))
     
     # Clear all mood logs for a user (for testing purposes)
     async def clear_mood_logs(self, user_id: int):
-        self.session.execute(
+        await self._lock_rollups(user_id)
+        await self._execute(
             MoodLog.__table__.delete().where(MoodLog.user_id == user_id)
         )
+        await self._delete_rollups(user_id)
 
-        self.session.commit()
+        await self._commit()
+        invalidate_user_analytics(user_id)
     
     async def create_log_on_date(self,
                                 user_id: int,
@@ -258,41 +871,125 @@ class MoodLogRepositoryV2():
                                 energy_level: int,
                                 date: datetime,
                                 notes: Optional[str] = None,
-                                weather: Optional[str] = None):
+                                weather: Optional[str] = None) -> Optional[MoodLog]:
+        return await self._insert_mood_log(user_id, mood_value, energy_level, date, notes, weather)
+
+    # Insert many mood logs for a user in a single transaction
+    async def bulk_create_mood_logs(self, user_id: int, entries: list[dict]) -> Optional[int]:
+        """
+        Uses COPY on Postgres (asyncpg) and chunked multi-row INSERTs elsewhere (SQLite).
+        Entries missing 'created_at' are stamped with the current time.
+        Returns the number of rows written, or None if the batch was rolled back.
+        """
+
+        now = datetime.utcnow()
+        rows = [{
+            "user_id": user_id,
+            "mood_value": entry["mood_value"],
+            "energy_level": entry["energy_level"],
+            "notes": entry.get("notes"),
+            "weather": entry.get("weather"),
+            "created_at": entry.get("created_at") or now
+        } for entry in entries]
+
+        if not rows:
+            return 0
+
+        days = {row["created_at"].date() for row in rows}
+
         try:
-            self.session.execute(insert(MoodLog), [{
-                "user_id": user_id,
-                "mood_value": mood_value,
-                "energy_level": energy_level,
-                "notes": notes,
-                "weather": weather,
-                "created_at": date
-            }])
-            self.session.commit()
-            return MoodLog(
-                user_id=user_id,
-                mood_value=mood_value,
-                energy_level=energy_level,
-                notes=notes,
-                weather=weather,
-                created_at=date
-            )
-        except IntegrityError:
-            self.session.rollback()
+            # Taking the rollup lock first also opens the transaction the COPY joins
+            await self._lock_rollups(user_id)
+            await self._with_weather_columns(rows)
+            if isinstance(self.session, AsyncSession) and self._dialect_name() == "postgresql":
+                await self._copy_mood_logs(rows)
+            else:
+                for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                    await self._execute(insert(MoodLog).values(rows[start:start + BULK_INSERT_CHUNK_SIZE]))
+            await self._insert_rollups(user_id, days)
+            await self._commit()
+            invalidate_user_analytics(user_id)
+            return len(rows)
+        # COPY raises asyncpg's own errors (e.g. ForeignKeyViolationError); SQLAlchemy doesn't wrap them
+        except (IntegrityError, asyncpg.PostgresError):
+            await self._rollback()
             return None
 
+    # Insert mood logs for many users in one transaction (used by the write-behind queue)
+    async def create_mood_logs_batch(self, rows: list[dict]) -> int:
+        """
+        Rows carry user_id, mood_value, energy_level, notes, weather and created_at.
+        Multi-row INSERTs plus one rollup refresh per user, committed together.
+        Raises on failure after rolling back.
+        """
+        if not rows:
+            return 0
+
+        days_by_user = defaultdict(set)
+        for row in rows:
+            days_by_user[row["user_id"]].add(row["created_at"].date())
+
+        try:
+            await self._with_weather_columns(rows)
+            for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                await self._execute(insert(MoodLog).values(rows[start:start + BULK_INSERT_CHUNK_SIZE]))
+            # Users in id order, so concurrent batches take their rollup locks in the same order
+            for user_id in sorted(days_by_user):
+                await self._refresh_rollups(user_id, days_by_user[user_id])
+            await self._commit()
+        except Exception:
+            await self._rollback()
+            raise
+
+        for user_id in days_by_user:
+            invalidate_user_analytics(user_id)
+        return len(rows)
+
+    async def _copy_mood_logs(self, rows: list[dict]):
+        columns = list(rows[0].keys())
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        # Runs as a savepoint if the session's transaction is already open on this connection
+        async with driver_connection.transaction():
+            await driver_connection.copy_records_to_table(
+                MoodLog.__tablename__,
+                records=[tuple(row[column] for column in columns) for row in rows],
+                columns=columns
+            )
+
 
-def get_mood_log_repository_v2(db: Session = Depends(get_db)) -> MoodLogRepositoryV2:
+def get_mood_log_repository_v2(db: AsyncSession = Depends(get_async_db)) -> MoodLogRepositoryV2:
     return MoodLogRepositoryV2(db)
 
-class MoodLogCreate(BaseModel):
-    username: str
+class MoodLogEntry(BaseModel):
     mood_value: int
     energy_level: int
     notes: Optional[str] = None
     weather: Optional[str] = None
 
+class MoodLogCreate(MoodLogEntry):
+    username: str
+
+class MoodLogBulkEntry(BaseModel):
+    mood_value: int = Field(ge=1, le=5)
+    energy_level: int = Field(ge=1, le=5)
+    notes: Optional[str] = None
+    weather: Optional[str] = Field(None, max_length=100)
+    created_at: Optional[datetime] = None
+
+    # created_at is stored as naive UTC
+    @field_validator("created_at")
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class MoodLogResponse(BaseModel):
+    # None while a write-behind submission is still queued
+    id: Optional[int] = None
     user_id: int
     mood_value: int
     energy_level: int
@@ -302,14 +999,42 @@ class MoodLogResponse(BaseModel):
 
     class Config:
         from_attributes = True
+        # Shared by every reader of the analytics cache
+        frozen = True
 
     @classmethod
     def from_db_model(cls, mood_log: MoodLog) -> "MoodLogResponse":
         return cls(
+            id=mood_log.id,
             user_id=mood_log.user_id,
             mood_value=mood_log.mood_value,
             energy_level=mood_log.energy_level,
             notes=mood_log.notes,
             weather=mood_log.weather,
-            created_at=datetime.utcnow()  # or mood_log.created_at if you want the original timestamp
-        )
\ No newline at end of file
+            created_at=mood_log.created_at
+        )
+
+
+class MoodSearchResult(BaseModel):
+    id: int
+    mood_value: int
+    energy_level: int
+    notes: Optional[str]
+    weather: Optional[str]
+    created_at: datetime
+    rank: float
+    # HTML-escaped notes excerpt with matches wrapped in <mark>
+    highlight: Optional[str]
+
+    @classmethod
+    def from_search_result(cls, mood_log: MoodLog, rank: float, highlight: Optional[str]) -> "MoodSearchResult":
+        return cls(
+            id=mood_log.id,
+            mood_value=mood_log.mood_value,
+            energy_level=mood_log.energy_level,
+            notes=mood_log.notes,
+            weather=mood_log.weather,
+            created_at=mood_log.created_at,
+            rank=rank,
+            highlight=highlight
+        )
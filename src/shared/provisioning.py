@@ -0,0 +1,220 @@
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field, ValidationError
+from collections import deque
+from typing import Iterable, Iterator, Optional
+import codecs
+import csv
+import json
+import os
+
+from src.shared.database import get_async_db
+
+from user_service_v2.models.user import User
+
+# Rows per INSERT ... ON CONFLICT statement
+USER_PROVISION_BATCH_SIZE = int(os.getenv("USER_PROVISION_BATCH_SIZE", "1000"))
+
+
+class ProvisionRow(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+    email: str = Field(min_length=3, max_length=255)
+    password: str = Field(min_length=1)
+    tier: int = 1
+
+
+def parse_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, Optional[ProvisionRow], Optional[list[dict]]]]:
+    """
+    Yield (row, ProvisionRow, None) or (row, None, errors) for a CSV (with a header line)
+    or NDJSON stream of users; rows are numbered from 0 in input order
+    """
+    if fmt == "csv":
+        items = csv.DictReader(lines)
+    else:
+        items = (line for line in lines if line.strip())
+
+    for row, item in enumerate(items):
+        yield _validate(row, item)
+
+
+def _validate(row: int, item) -> tuple[int, Optional[ProvisionRow], Optional[list[dict]]]:
+    try:
+        if isinstance(item, str):
+            return row, ProvisionRow.model_validate_json(item), None
+        return row, ProvisionRow.model_validate({key: value for key, value in item.items() if value not in (None, "")}), None
+    except ValidationError as e:
+        return row, None, [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+
+
+class _Drain:
+    """
+    Iterator that empties a deque; it can be refilled and iterated again, which lets
+    a csv reader be fed as more lines arrive
+    """
+
+    def __init__(self, lines: deque):
+        self.lines = lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+class RowStream:
+    """
+    parse_rows for a body that arrives in chunks: feed() returns the rows completed by
+    each chunk of UTF-8 bytes and close() the rest. A CSV record with a quoted newline
+    only reaches the reader once all of its lines have arrived.
+    """
+
+    def __init__(self, fmt: str):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._tail = "" # text after the last newline
+        self._record = [] # lines of a CSV record whose quoted field is still open
+        self._lines = deque()
+        self._items = csv.DictReader(_Drain(self._lines)) if fmt == "csv" else None
+        self._row = 0
+
+    def feed(self, chunk: bytes) -> list[tuple[int, Optional[ProvisionRow], Optional[list[dict]]]]:
+        *lines, self._tail = (self._tail + self._decoder.decode(chunk)).split("\n")
+        return self._parse([line + "\n" for line in lines])
+
+    def close(self) -> list[tuple[int, Optional[ProvisionRow], Optional[list[dict]]]]:
+        tail = self._tail + self._decoder.decode(b"", final=True)
+        self._tail = ""
+        parsed = self._parse([tail] if tail else [])
+        if self._record:
+            # Unterminated quote: let the reader make what it can of it
+            self._lines.extend(self._record)
+            self._record = []
+            parsed.extend(self._read())
+        return parsed
+
+    def _parse(self, lines: list[str]) -> list[tuple[int, Optional[ProvisionRow], Optional[list[dict]]]]:
+        if self._items is None:
+            parsed = []
+            for line in lines:
+                if line.strip():
+                    parsed.append(_validate(self._row, line))
+                    self._row += 1
+            return parsed
+
+        for line in lines:
+            self._record.append(line)
+            if sum(part.count('"') for part in self._record) % 2 == 0:
+                self._lines.extend(self._record)
+                self._record = []
+        return self._read()
+
+    def _read(self) -> list[tuple[int, Optional[ProvisionRow], Optional[list[dict]]]]:
+        parsed = []
+        for item in self._items:
+            parsed.append(_validate(self._row, item))
+            self._row += 1
+        return parsed
+
+
+def row_format(filename_or_content_type: str) -> str:
+    return "csv" if "csv" in filename_or_content_type.lower() else "ndjson"
+
+
+class UserProvisioner():
+    """
+    Inserts pre-hashed users in large batches, reporting duplicates per row instead of
+    aborting the batch
+    """
+
+    def __init__(self, session):
+        # Either an AsyncSession (production, asyncpg) or a plain Session (CLI, SQLite test fixtures)
+        self.session = session
+
+    async def _execute(self, statement, params=None):
+        if isinstance(self.session, AsyncSession):
+            return await self.session.execute(statement, params)
+        return self.session.execute(statement, params)
+
+    async def _commit(self):
+        if isinstance(self.session, AsyncSession):
+            await self.session.commit()
+        else:
+            self.session.commit()
+
+    def _insert(self):
+        if self.session.bind.dialect.name == "postgresql":
+            return postgresql_insert(User)
+        return sqlite_insert(User)
+
+    async def _taken_names(self, names: set[str]) -> set[str]:
+        return set((await self._execute(select(User.name).where(User.name.in_(names)))).scalars())
+
+    async def insert_batch(self, rows: list[tuple[int, ProvisionRow, str]]) -> list[dict]:
+        """
+        Insert (row, ProvisionRow, hashed_password) tuples in one statement and commit.
+        Names and emails already registered, or taken by an earlier row of the input, are
+        skipped up front; ON CONFLICT DO NOTHING covers users created concurrently.
+        """
+        results = {}
+        taken_names = await self._taken_names({entry.name for _, entry, _ in rows})
+        taken_emails = set((await self._execute(
+            select(User.email).where(User.email.in_({entry.email for _, entry, _ in rows}))
+        )).scalars())
+
+        values = []
+        for row, entry, hashed_password in rows:
+            if entry.name in taken_names:
+                results[row] = {"row": row, "name": entry.name, "status": "duplicate_name"}
+                continue
+            if entry.email in taken_emails:
+                results[row] = {"row": row, "name": entry.name, "status": "duplicate_email"}
+                continue
+            # Only rows that are inserted claim their name and email
+            taken_names.add(entry.name)
+            taken_emails.add(entry.email)
+            values.append({"name": entry.name, "email": entry.email, "hashed_password": hashed_password, "tier": entry.tier})
+
+        created = {}
+        if values:
+            # No conflict target: a concurrent insert may clash on the name or the email
+            statement = self._insert().values(values).on_conflict_do_nothing().returning(User.id, User.name)
+            created = {name: user_id for user_id, name in (await self._execute(statement)).all()}
+
+        lost = {value["name"] for value in values} - created.keys()
+        lost_names = await self._taken_names(lost) if lost else set()
+        await self._commit()
+
+        for row, entry, _ in rows:
+            if row in results:
+                continue
+            if entry.name in created:
+                results[row] = {"row": row, "name": entry.name, "status": "created", "id": created[entry.name]}
+            else:
+                status = "duplicate_name" if entry.name in lost_names else "duplicate_email"
+                results[row] = {"row": row, "name": entry.name, "status": status}
+
+        return [results[row] for row, _, _ in rows]
+
+
+def get_user_provisioner(db: AsyncSession = Depends(get_async_db)) -> UserProvisioner:
+    return UserProvisioner(db)
+
+
+def write_results(results: Iterable[dict], path: str):
+    """
+    Per-row result file: CSV when the path ends in .csv, NDJSON otherwise
+    """
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=["row", "name", "status", "id", "errors"], extrasaction="ignore")
+            writer.writeheader()
+            for result in results:
+                writer.writerow({**result, "errors": json.dumps(result["errors"]) if "errors" in result else ""})
+        else:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
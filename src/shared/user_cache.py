@@ -0,0 +1,94 @@
+from pydantic import BaseModel
+from typing import Optional
+import os
+
+from src.shared.cache import TTLCache
+
+from user_service_v2.models.user import UserRepositoryV2
+
+# Name/id lookups are cached per process; the TTL bounds how long another worker
+# can keep serving a renamed or deleted user after this one invalidates it
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# Keys are ("name", username) -> user id and ("id", user id) -> UserProfile
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+
+class UserProfile(BaseModel):
+    """
+    The non-secret fields of a user that routes and pages read; never holds the password hash
+    """
+    id: int
+    name: str
+    email: str
+    tier: int
+
+    model_config = {"frozen": True}
+
+    @classmethod
+    def from_db_model(cls, user) -> "UserProfile":
+        return cls(id=user.id, name=user.name, email=user.email, tier=user.tier)
+
+
+def _remember(profile: UserProfile) -> UserProfile:
+    user_cache.set(("name", profile.name), profile.id)
+    user_cache.set(("id", profile.id), profile)
+    return profile
+
+
+async def get_cached_user(user_repo: UserRepositoryV2, username: str) -> Optional[UserProfile]:
+    """
+    Resolve a username to its profile, only hitting the database on a miss.
+    Unknown names are not cached, so a fresh signup is visible immediately.
+    """
+    user_id = user_cache.get(("name", username))
+    if user_id is not None:
+        profile = user_cache.get(("id", user_id))
+        if profile is not None and profile.name == username:
+            return profile
+
+    user = await user_repo.get_by_name(username)
+    if not user:
+        return None
+    return _remember(UserProfile.from_db_model(user))
+
+
+async def get_cached_user_by_id(user_repo: UserRepositoryV2, user_id: int) -> Optional[UserProfile]:
+    profile = user_cache.get(("id", user_id))
+    if profile is not None:
+        return profile
+
+    user = await user_repo.get_by_id(user_id)
+    if not user:
+        return None
+    return _remember(UserProfile.from_db_model(user))
+
+
+def invalidate_user(user_id: Optional[int] = None, username: Optional[str] = None):
+    if user_id is not None:
+        profile = user_cache.get(("id", user_id))
+        if profile is not None:
+            user_cache.delete(("name", profile.name))
+        user_cache.delete(("id", user_id))
+    if username is not None:
+        user_cache.delete(("name", username))
+
+
+async def update_user(user_repo: UserRepositoryV2, user, name: Optional[str] = None, email: Optional[str] = None):
+    """
+    UserRepositoryV2.update_user that also drops the user's cached old name and profile
+    """
+    old_name = user.name
+    updated_user = await user_repo.update_user(user, name, email)
+    invalidate_user(user.id, old_name)
+    return updated_user
+
+
+async def delete_user(user_repo: UserRepositoryV2, user_id: int):
+    """
+    UserRepositoryV2.delete that also drops the user's cached name and profile
+    """
+    result = await user_repo.delete(user_id)
+    invalidate_user(user_id)
+    return result
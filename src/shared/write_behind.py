@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from src.shared import database
+from src.shared.histogram import LatencyHistogram
+from src.shared.models import MoodLog, MoodLogRepositoryV2
+
+logger = logging.getLogger('uvicorn.error')
+
+# Optional write-behind for mood log submissions: requests are acknowledged once
+# validated and queued, and one background task writes them in multi-row batches,
+# so the evening peak costs one commit per batch instead of one per submission.
+# Queued rows are lost if the process dies before they are flushed.
+MOOD_WRITE_BEHIND_ENABLED = os.getenv("MOOD_WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+MOOD_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("MOOD_WRITE_BEHIND_BATCH_SIZE", "200"))
+MOOD_WRITE_BEHIND_FLUSH_MS = float(os.getenv("MOOD_WRITE_BEHIND_FLUSH_MS", "50"))
+MOOD_WRITE_BEHIND_MAX_QUEUE = int(os.getenv("MOOD_WRITE_BEHIND_MAX_QUEUE", "5000"))
+# How long a submission may wait for queue space before it is refused
+MOOD_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS = float(os.getenv("MOOD_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS", "1000"))
+MOOD_WRITE_BEHIND_RETRY_AFTER_SECONDS = int(os.getenv("MOOD_WRITE_BEHIND_RETRY_AFTER_SECONDS", "1"))
+# Attempts after the first for a write that fails on a lost connection or unavailable database,
+# waiting MOOD_WRITE_BEHIND_RETRY_BACKOFF_MS and doubling before each one
+MOOD_WRITE_BEHIND_MAX_RETRIES = int(os.getenv("MOOD_WRITE_BEHIND_MAX_RETRIES", "3"))
+MOOD_WRITE_BEHIND_RETRY_BACKOFF_MS = float(os.getenv("MOOD_WRITE_BEHIND_RETRY_BACKOFF_MS", "200"))
+
+_STOP = object()
+
+
+def _is_transient(error: Exception) -> bool:
+    # Worth retrying as is; anything else is a problem with the rows themselves
+    if isinstance(error, (OperationalError, InterfaceError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class WriteBehindFull(Exception):
+    """
+    Raised when the queue stayed full for MOOD_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Mood log queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class MoodLogWriteBehind:
+    """
+    Bounded asyncio queue of mood log rows drained by a single flusher task that writes
+    up to batch_size rows at a time, or whatever arrived within flush_ms of the first one
+    """
+
+    def __init__(self,
+                 enabled: bool = MOOD_WRITE_BEHIND_ENABLED,
+                 batch_size: int = MOOD_WRITE_BEHIND_BATCH_SIZE,
+                 flush_ms: float = MOOD_WRITE_BEHIND_FLUSH_MS,
+                 max_queue: int = MOOD_WRITE_BEHIND_MAX_QUEUE,
+                 enqueue_timeout_ms: float = MOOD_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS,
+                 max_retries: int = MOOD_WRITE_BEHIND_MAX_RETRIES,
+                 retry_backoff_ms: float = MOOD_WRITE_BEHIND_RETRY_BACKOFF_MS,
+                 session_factory=None):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_queue = max_queue
+        self.enqueue_timeout_ms = enqueue_timeout_ms
+        self.max_retries = max_retries
+        self.retry_backoff_ms = retry_backoff_ms
+        # Defaults to a session from the app's async pool, resolved at flush time
+        self._session_factory = session_factory or (lambda: database.AsyncSessionLocal())
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_rows = 0
+        self.retries = 0
+        self.max_batch_size = 0
+        self.flush_latency = LatencyHistogram()
+
+    @property
+    def running(self) -> bool:
+        # False as soon as shutdown begins, so nothing is queued behind the stop marker
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self):
+        if self.enabled and not self.running:
+            self._stopping = False
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flush everything still queued, then end the flusher task
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue(self,
+                      user_id: int,
+                      mood_value: int,
+                      energy_level: int,
+                      notes: Optional[str] = None,
+                      weather: Optional[str] = None) -> MoodLog:
+        """
+        Queue a row, waiting up to enqueue_timeout_ms for space, and return the unsaved log
+        """
+        row = {
+            "user_id": user_id,
+            "mood_value": mood_value,
+            "energy_level": energy_level,
+            "notes": notes,
+            "weather": weather,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            await asyncio.wait_for(self._queue.put(row), self.enqueue_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise WriteBehindFull(MOOD_WRITE_BEHIND_RETRY_AFTER_SECONDS)
+        self.enqueued += 1
+        return MoodLog(**row)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_ms / 1000
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]):
+        started = time.perf_counter()
+        await self._write(batch)
+
+        self.batches += 1
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.flush_latency.observe((time.perf_counter() - started) * 1000)
+
+    async def _write(self, rows: list[dict]):
+        """
+        Write rows in one transaction, retrying transient failures with backoff. If the rows
+        themselves are rejected (e.g. a user deleted while their log was queued), the batch is
+        split in halves until only the offending rows are left out.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.rows_written += await self._write_once(rows)
+                return
+            except Exception as e:
+                error = e
+                if not _is_transient(e) or attempt == self.max_retries:
+                    break
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff_ms / 1000 * 2 ** attempt)
+
+        if len(rows) > 1 and not _is_transient(error):
+            middle = len(rows) // 2
+            await self._write(rows[:middle])
+            await self._write(rows[middle:])
+            return
+
+        # Acknowledged rows can't be handed back to their requests; keep the flusher alive
+        self.failed_rows += len(rows)
+        logger.error(f"Write-behind dropped {len(rows)} mood logs: {error}")
+
+    async def _write_once(self, rows: list[dict]) -> int:
+        session = self._session_factory()
+        try:
+            return await MoodLogRepositoryV2(session).create_mood_logs_batch(rows)
+        finally:
+            if isinstance(session, AsyncSession):
+                await session.close()
+            else:
+                session.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_ms,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failed_rows": self.failed_rows,
+            "retries": self.retries,
+            "avg_batch_size": round((self.rows_written + self.failed_rows) / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "flush_latency": self.flush_latency.snapshot(),
+        }
+
+
+mood_write_behind = MoodLogWriteBehind()
+
+
+async def create_mood_log(mood_log_repo: MoodLogRepositoryV2,
+                          user_id: int,
+                          mood_value: int,
+                          energy_level: int,
+                          notes: Optional[str] = None,
+                          weather: Optional[str] = None) -> tuple[Optional[MoodLog], bool]:
+    """
+    Queue the log when write-behind is running, else insert it now.
+    Returns (log, queued); raises WriteBehindFull under backpressure.
+    """
+    if mood_write_behind.running:
+        return await mood_write_behind.enqueue(user_id, mood_value, energy_level, notes, weather), True
+    return await mood_log_repo.create_mood_log(
+        user_id=user_id,
+        mood_value=mood_value,
+        energy_level=energy_level,
+        notes=notes,
+        weather=weather
+    ), False
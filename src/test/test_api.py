@@ -1,7 +1,9 @@
 import pytest
 import asyncio
+import time
 
 from pwdlib import PasswordHash
+from fastapi import HTTPException
 
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
@@ -14,12 +16,25 @@ from user_service_v2.models.user import (
     get_user_repository_v2
 )
 
+from datetime import timedelta
+
 from mindfuly.api import app
+from src.mindfuly.auth import jwt_utils
+from src.mindfuly.auth.passwords import PasswordHashPool, PasswordPoolBusy, configured_password_hash
+from src.shared import user_cache
+from src.shared.provisioning import UserProvisioner, get_user_provisioner, write_results
 
 """
 FIXTURES AND HELPERS
 """
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # The cache is process-wide and every test reuses the same user
+    user_cache.user_cache.clear()
+    yield
+    user_cache.user_cache.clear()
+
 @pytest.fixture(scope='function')
 def engine():
     engine = create_engine("sqlite:///:memory:?check_same_thread=False")
@@ -126,4 +141,473 @@ def test_delete_nonexistent_user(client):
         "/users/fakey"
     )
     assert response.status_code == 404 # Response should be 404
-    assert response.json() == {"detail": "User not found"} # Error detail should match
\ No newline at end of file
+    assert response.json() == {"detail": "User not found"} # Error detail should match
+
+# Ensure username lookups are served from the cache and dropped when the user is renamed or deleted
+def test_user_cache_invalidation(repo_v2, session, created_user):
+    lookups = 0
+    get_by_name = repo_v2.get_by_name
+
+    async def counting_get_by_name(name):
+        nonlocal lookups
+        lookups += 1
+        return await get_by_name(name)
+
+    repo_v2.get_by_name = counting_get_by_name
+
+    first = asyncio.run(user_cache.get_cached_user(repo_v2, "foo"))
+    second = asyncio.run(user_cache.get_cached_user(repo_v2, "foo"))
+    assert first == second and first.id == created_user["id"]
+    assert lookups == 1 # Second lookup should be a cache hit
+    assert not hasattr(first, "hashed_password") # Password hashes should never be cached
+
+    user = session.get(User, created_user["id"])
+    asyncio.run(user_cache.update_user(repo_v2, user, name="bar"))
+    assert asyncio.run(user_cache.get_cached_user(repo_v2, "foo")) is None # Old name should no longer resolve
+    assert asyncio.run(user_cache.get_cached_user(repo_v2, "bar")).id == created_user["id"]
+
+    asyncio.run(user_cache.delete_user(repo_v2, created_user["id"]))
+    assert asyncio.run(user_cache.get_cached_user(repo_v2, "bar")) is None # Deleted user should no longer resolve
+
+# Ensure minted tokens carry uid/tier claims and verified tokens are served from the cache until they expire
+def test_token_claims_and_verified_token_cache(repo_v2, created_user):
+    user = asyncio.run(repo_v2.get_by_name(created_user["name"]))
+    token = jwt_utils.create_access_token(jwt_utils.token_claims(user))
+    jwt_utils.verified_token_cache.clear()
+
+    claims = jwt_utils.verify_token_claims(token)
+    assert (claims.username, claims.user_id, claims.tier) == ("foo", 5, 1) # Claims should carry the identity
+    hits = jwt_utils.verified_token_cache.hits
+    assert jwt_utils.verify_token(token) == "foo"
+    assert jwt_utils.verified_token_cache.hits == hits + 1 # Second verification should be a cache hit
+
+    expired = jwt_utils.create_access_token(jwt_utils.token_claims(user), expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        jwt_utils.verify_token_claims(expired) # Expired tokens should be rejected
+    with pytest.raises(HTTPException):
+        jwt_utils.verify_token_claims(token[:-2] + "xx") # Tampered tokens should never match a cached digest
+
+# Ensure password hashing runs off the loop, records its histograms, and sheds load once the queue is full
+def test_password_pool_admission_control():
+    pool = PasswordHashPool(workers=1, max_queue=1)
+    hashed = asyncio.run(pool.hash("bass"))
+    assert asyncio.run(pool.verify("bass", hashed)) is True
+    assert asyncio.run(pool.verify("wrong", hashed)) is False
+
+    async def burst():
+        return await asyncio.gather(*(pool._run(time.sleep, 0.05) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    pool.shutdown()
+
+    assert sum(isinstance(result, PasswordPoolBusy) for result in results) == 1 # One worker + one queued slot, third is shed
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["hash_time"]["count"] == 5 # hash, two verifies and two sleeps
+    assert stats["queue_wait"]["buckets_ms"]["+Inf"] == 5
+
+# Ensure a login that is shed by the password pool gets 503 with Retry-After
+def test_login_shed_returns_503(client, created_user, monkeypatch):
+    from src.mindfuly.auth import passwords
+    response = client.post("/authorization/login", json={"username": "foo", "password": "bass"})
+    assert response.status_code == 200 # Login should succeed through the pool
+
+    monkeypatch.setattr(passwords, "password_pool", PasswordHashPool(workers=0, max_queue=0))
+
+    response = client.post("/authorization/login", json={"username": "foo", "password": "bass"})
+    assert response.status_code == 503 # Response should be 503
+    assert response.headers["Retry-After"] == str(passwords.PASSWORD_HASH_RETRY_AFTER_SECONDS)
+
+# Ensure sign-ups hash on the password pool rather than the event loop, and are shed with 503 when it is full
+def test_signup_runs_on_password_pool(client, repo_v2, monkeypatch):
+    import threading
+    from src.mindfuly.auth import passwords
+    pool = PasswordHashPool(workers=1, max_queue=0)
+    monkeypatch.setattr(passwords, "password_pool", pool)
+    threads = []
+    original_create = repo_v2.create
+
+    async def create(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return await original_create(*args, **kwargs)
+
+    monkeypatch.setattr(repo_v2, "create", create)
+    response = client.post("/users/create_user", json={"name": "name1", "email": "email2", "hashed_password": "pass3"})
+    pool.shutdown()
+    assert response.status_code == 201 # Response should be 201
+    assert threads[0].startswith("argon2") # The repository call (and its hashing) ran on a pool worker
+    assert pool.stats()["hash_time"]["count"] == 1
+
+    monkeypatch.setattr(passwords, "password_pool", PasswordHashPool(workers=0, max_queue=0))
+    response = client.post("/users/create_user", json={"name": "name2", "email": "email3", "hashed_password": "pass3"})
+    assert response.status_code == 503 # Response should be 503
+    assert response.headers["Retry-After"] == str(passwords.PASSWORD_HASH_RETRY_AFTER_SECONDS)
+
+# Ensure a login transparently upgrades a hash made with different Argon2 parameters, exactly once
+def test_login_rehashes_outdated_password(client, session, created_user, monkeypatch):
+    from src.mindfuly.auth import passwords
+    pool = PasswordHashPool(password_hash=configured_password_hash(time_cost=1, memory_cost=8192, parallelism=1))
+    monkeypatch.setattr(passwords, "password_pool", pool)
+
+    response = client.post("/authorization/login", json={"username": "foo", "password": "bass"})
+    assert response.status_code == 200 # Response should be 200
+
+    stored = session.get(User, created_user["id"]).hashed_password
+    assert stored != created_user["hashed_password"] and "m=8192,t=1,p=1" in stored # Hash should use the new parameters
+    assert pool.rehashed == 1
+
+    response = client.post("/authorization/login", json={"username": "foo", "password": "bass"})
+    assert response.status_code == 200 # The upgraded hash should still verify
+    assert pool.rehashed == 1 # An up-to-date hash should not be rewritten
+
+# Ensure bulk provisioning creates users in batches and reports every row, including duplicates and invalid rows
+def test_bulk_provision_users(client, session, created_user, monkeypatch, tmp_path):
+    monkeypatch.setattr(jwt_utils, "ADMIN_USER_IDS", {99})
+    monkeypatch.setattr("src.mindfuly.routes.users.USER_PROVISION_BATCH_SIZE", 2)
+    monkeypatch.setitem(app.dependency_overrides, get_user_provisioner, lambda: UserProvisioner(session))
+    body = "\n".join([
+        "name,email,password,tier",
+        "alice,alice@example.org,pw1,1",
+        "foo,new@example.org,pw2,1", # Name already taken
+        "bob,fee,pw3,", # Email already registered
+        "carol,carol@example.org,,1", # Missing password
+        "dave,dave@example.org,pw5,2",
+        "alice,alice2@example.org,pw6,1", # Name repeated in the file
+    ])
+
+    headers = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'foo', 'uid': created_user['id']})}", "Content-Type": "text/csv"}
+    assert client.post("/users/bulk_provision", content=body, headers=headers).status_code == 403 # Admins only
+
+    headers["Authorization"] = f"Bearer {jwt_utils.create_access_token({'sub': 'admin'})}"
+    assert client.post("/users/bulk_provision", content=body, headers=headers).status_code == 403 # The username alone grants nothing
+
+    headers["Authorization"] = f"Bearer {jwt_utils.create_access_token({'sub': 'foo', 'uid': 99})}"
+    response = client.post("/users/bulk_provision", content=body, headers=headers)
+
+    assert response.status_code == 200 # Response should be 200
+    data = response.json()
+    assert [result["status"] for result in data["results"]] == [
+        "created", "duplicate_name", "duplicate_email", "invalid", "created", "duplicate_name"
+    ]
+    assert (data["created"], data["duplicate_name"], data["duplicate_email"], data["invalid"]) == (2, 2, 1, 1)
+
+    dave = session.get(User, data["results"][4]["id"])
+    assert dave.name == "dave" and dave.tier == 2
+    assert PasswordHash.recommended().verify("pw5", dave.hashed_password) # Passwords should be stored hashed
+
+    write_results(data["results"], str(tmp_path / "results.csv"))
+    assert (tmp_path / "results.csv").read_text().splitlines()[0] == "row,name,status,id,errors" # Result file should have one line per row
+    assert len((tmp_path / "results.csv").read_text().splitlines()) == 7
+
+# Ensure a streamed import skips only rows that clash, survives a concurrent insert, and stops at the row limit
+def test_bulk_provision_conflicts(client, session, created_user, monkeypatch):
+    monkeypatch.setattr(jwt_utils, "ADMIN_USER_IDS", {99})
+    monkeypatch.setattr("src.mindfuly.routes.users.USER_PROVISION_BATCH_SIZE", 3)
+    session.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+
+    provisioner = UserProvisioner(session)
+    original_execute = provisioner._execute
+    calls = []
+
+    async def racing_execute(statement, params=None):
+        result = await original_execute(statement, params)
+        calls.append(1)
+        if len(calls) == 2:
+            # Another request registers erin's email between the pre-check and the INSERT
+            session.execute(text("INSERT INTO users (name, email, hashed_password, tier) VALUES ('other', 'erin@example.org', 'hash', 1)"))
+        return result
+
+    monkeypatch.setattr(provisioner, "_execute", racing_execute)
+    monkeypatch.setitem(app.dependency_overrides, get_user_provisioner, lambda: provisioner)
+    lines = [
+        "name,email,password,tier",
+        "foo,zed@example.org,pw1,1", # Name already taken, so its email stays free
+        "zed,zed@example.org,pw2,1",
+        "erin,erin@example.org,pw3,1", # Email registered concurrently
+        "fay,fay@example.org,pw4,1",
+    ]
+    # Chunks that split rows mid-line
+    body = "\n".join(lines).encode()
+    chunks = iter([body[i:i + 7] for i in range(0, len(body), 7)])
+    headers = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'foo', 'uid': 99})}", "Content-Type": "text/csv"}
+    response = client.post("/users/bulk_provision", content=chunks, headers=headers)
+
+    assert response.status_code == 200 # A concurrent duplicate shouldn't fail the batch
+    assert [result["status"] for result in response.json()["results"]] == ["duplicate_name", "created", "duplicate_email", "created"]
+
+    monkeypatch.setattr("src.mindfuly.routes.users.USER_PROVISION_MAX_ROWS", 2)
+    body = "\n".join(["name,email,password", "gus,gus@example.org,pw", "hal,hal@example.org,pw", "ivy,ivy@example.org,pw"])
+    response = client.post("/users/bulk_provision", content=body, headers=headers)
+    assert response.status_code == 413 # Too many rows
+    assert [result["name"] for result in response.json()["results"]] == ["gus", "hal"] # Rows before the limit were created and reported
+    assert response.json()["created"] == 2
+
+# Ensure thumbnails are fetched once, resized per variant, and served with a strong ETag
+def test_thumbnail_proxy(client, monkeypatch, tmp_path):
+    import io
+    from PIL import Image
+    from src.mindfuly.routes import media
+    from src.shared.disk_cache import ContentAddressedCache
+    fetched = []
+
+    source = io.BytesIO()
+    Image.new("RGB", (320, 180), "red").save(source, "JPEG")
+
+    class FakeResponse:
+        status_code = 200
+        content = source.getvalue()
+
+    async def fake_upstream_get(upstream, path):
+        fetched.append(path)
+        return FakeResponse()
+
+    monkeypatch.setattr(media, "upstream_get", fake_upstream_get)
+    monkeypatch.setattr(media, "thumbnail_cache", ContentAddressedCache(str(tmp_path), 1024 * 1024))
+
+    webp = client.get("/media/thumb/dQw4w9WgXcQ?w=120", headers={"Accept": "image/webp,*/*"})
+    assert webp.status_code == 200 # Response should be 200
+    assert webp.headers["content-type"] == "image/webp"
+    assert "immutable" in webp.headers["cache-control"]
+    assert Image.open(io.BytesIO(webp.content)).size == (120, 68)
+
+    jpeg = client.get("/media/thumb/dQw4w9WgXcQ?w=120&format=jpeg")
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert jpeg.headers["etag"] != webp.headers["etag"]
+    assert fetched == ["/vi/dQw4w9WgXcQ/mqdefault.jpg"] # Source fetched once for every variant
+
+    revalidated = client.get("/media/thumb/dQw4w9WgXcQ?w=120", headers={"Accept": "image/webp", "If-None-Match": webp.headers["etag"]})
+    assert revalidated.status_code == 304 # Unchanged variant should not be resent
+
+    assert client.get("/media/thumb/dQw4w9WgXcQ?w=500").status_code == 400 # Unsupported width
+    assert client.get("/media/thumb/..%2Fetc").status_code == 404 # Not a video id
+
+# Ensure nearby coordinates share one cached upstream weather call, fetched for the bucket centre
+def test_weather_cache_buckets(client, monkeypatch):
+    from src.mindfuly.routes import weather
+    calls = []
+
+    class FakeResponse:
+        status_code = 200
+        def __init__(self, params):
+            self.params = params
+        def json(self):
+            return {"coord": {"lat": self.params["lat"], "lon": self.params["lon"]}}
+
+    async def fake_upstream_get(upstream, path, params):
+        calls.append(params)
+        return FakeResponse(params)
+
+    monkeypatch.setattr(weather, "WEATHER_API_KEY", "key")
+    monkeypatch.setattr(weather, "upstream_get", fake_upstream_get)
+    weather.weather_cache.clear()
+
+    first = client.get("/weather?lat=49.2827&lon=-123.1207")
+    second = client.get("/weather?lat=49.2791&lon=-123.1169")
+    other = client.get("/weather?lat=43.6532&lon=-79.3832")
+    weather.weather_cache.clear()
+
+    assert first.json() == second.json() == {"coord": {"lat": 49.28, "lon": -123.12}} # Same bucket, same observation
+    assert other.json() == {"coord": {"lat": 43.65, "lon": -79.38}}
+    assert len(calls) == 2 # One upstream call per bucket
+
+# Ensure the mood reservoir stocks every query within its budget and mood searches are then served from memory
+def test_youtube_mood_reservoir(client, monkeypatch):
+    from src.mindfuly.routes import youtube
+    searched = []
+
+    async def fake_search(query, max_results):
+        searched.append(query)
+        return [youtube.VideoInfo(video_id=f"{query}-{i}", title=query, channel="c", thumbnail="t") for i in range(max_results)]
+
+    monkeypatch.setattr(youtube, "YOUTUBE_API_KEY", "key")
+    monkeypatch.setattr(youtube, "_search_youtube", fake_search)
+    total_queries = sum(len(queries) for queries in youtube.MOOD_QUERIES.values())
+    budget = (total_queries + 1) * youtube.YOUTUBE_SEARCH_COST
+
+    async def warm(reservoir):
+        while await reservoir.refresh_one():
+            pass
+
+    partial = youtube.MoodVideoReservoir(daily_budget=budget, size=20, initial_budget=len(youtube.MOOD_QUERIES) * youtube.YOUTUBE_SEARCH_COST)
+    asyncio.run(warm(partial))
+    assert len(searched) == len(youtube.MOOD_QUERIES) # A restart only spends its starting budget
+    assert all(partial.sample(mood, 1) for mood in youtube.MOOD_QUERIES) # One query per mood before any second query
+    assert youtube.YOUTUBE_RESERVOIR_INITIAL_BUDGET >= len(youtube.MOOD_QUERIES) * youtube.YOUTUBE_SEARCH_COST # The default does the same
+    searched.clear()
+
+    empty = youtube.MoodVideoReservoir(daily_budget=0, size=20)
+    monkeypatch.setattr(youtube, "mood_reservoir", empty)
+    assert client.get("/youtube/search/by-mood/sad?max_results=5").status_code == 200
+    assert len(searched) == 1 and empty.sample("sad", 5) # The live fallback stocks what it fetched
+    client.get("/youtube/search/by-mood/sad?max_results=5")
+    assert len(searched) == 1 # So the next request is served from memory
+    searched.clear()
+
+    reservoir = youtube.MoodVideoReservoir(daily_budget=budget, size=20, initial_budget=budget)
+    monkeypatch.setattr(youtube, "mood_reservoir", reservoir)
+    asyncio.run(warm(reservoir))
+
+    assert len(searched) == total_queries + 1 # Budget should allow every query once, plus one refresh
+    assert len(set(searched)) == total_queries # Each query should be stocked before any is refreshed
+    assert reservoir.stats()["queries_stocked"] == total_queries
+
+    searched.clear()
+    response = client.get("/youtube/search/by-mood/happy?max_results=5")
+    assert response.status_code == 200 # Response should be 200
+    videos = response.json()["videos"]
+    assert len(videos) == 5
+    assert videos[0]["title"] in youtube.MOOD_QUERIES["happy"] # Should be sampled from a happy query
+    assert searched == [] # No upstream call on the request path
+
+    async def malformed_search(query, max_results):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+    monkeypatch.setattr(youtube, "_search_youtube", malformed_search)
+    broken = youtube.MoodVideoReservoir(daily_budget=budget, size=20, initial_budget=2 * youtube.YOUTUBE_SEARCH_COST)
+    asyncio.run(warm(broken))
+    assert broken.stats()["refresh_errors"] == 2 # A malformed response is counted, and the loop carries on
+
+def fake_videos_response(params, durations=None):
+    """
+    videos.list stand-in: ids ending in an odd digit are not embeddable, durations default to 3 minutes
+    """
+    durations = durations or {}
+
+    class FakeResponse:
+        status_code = 200
+        def json(self):
+            return {"items": [{
+                "id": video_id,
+                "contentDetails": {"duration": durations.get(video_id, "PT3M")},
+                "statistics": {"viewCount": "42"},
+                "status": {"embeddable": int(video_id[-1]) % 2 == 0}
+            } for video_id in params["id"].split(",")]}
+    return FakeResponse()
+
+# Ensure free-text searches are cached per normalized query, charged to the ledger, and degrade near quota exhaustion
+def test_youtube_search_cache_and_quota(client, monkeypatch):
+    from src.mindfuly.routes import youtube
+    searched = []
+
+    async def fake_upstream_get(upstream, path, params):
+        if path == youtube.YOUTUBE_VIDEOS_PATH:
+            return fake_videos_response(params)
+        searched.append(params["q"])
+
+        class FakeResponse:
+            status_code = 200
+            def json(self):
+                return {"items": [{
+                    "id": {"videoId": f"{params['q']}-{i}"},
+                    "snippet": {"title": params["q"], "channelTitle": "c", "thumbnails": {"medium": {"url": "t"}}}
+                } for i in range(20)]}
+        return FakeResponse()
+
+    ledger = youtube.YouTubeQuotaLedger(daily_quota=1000, reserve=750)
+    monkeypatch.setattr(youtube, "YOUTUBE_API_KEY", "key")
+    monkeypatch.setattr(youtube, "upstream_get", fake_upstream_get)
+    monkeypatch.setattr(youtube, "quota_ledger", ledger)
+    monkeypatch.setattr(youtube, "search_cache", youtube.TTLCache(10, 60))
+    monkeypatch.setattr(youtube, "video_details_cache", youtube.TTLCache(100, 60))
+    monkeypatch.setattr(youtube, "mood_reservoir", youtube.MoodVideoReservoir(daily_budget=0))
+
+    first = client.get("/youtube/search?query=Happy  Songs!&max_results=5")
+    second = client.get("/youtube/search?query=happy songs&max_results=5")
+    assert first.status_code == second.status_code == 200 # Responses should be 200
+    assert searched == ["happy songs music"] # Normalized repeats should be served from the cache
+    assert ledger.stats()["by_endpoint"] == {"search.list": 100, "videos.list": 1}
+
+    client.get("/youtube/search?query=sad songs") # Spends down to the reserve
+    degraded = client.get("/youtube/search?query=happy upbeat songs&max_results=3")
+    assert degraded.status_code == 200 # Near exhaustion should degrade, not fail
+    assert degraded.json()["degraded"] is True
+    assert {video["title"] for video in degraded.json()["videos"]} == {"happy songs music"} # Most similar cached query
+    assert len(searched) == 2 # No upstream call once the reserve is reached
+
+    monkeypatch.setattr(youtube, "search_cache", youtube.TTLCache(10, 60))
+    assert client.get("/youtube/search?query=jazz").status_code == 503 # Nothing cached or stocked to fall back on
+
+# Ensure search results are enriched in batches of up to 50 ids, cached per id, and filterable
+def test_youtube_video_details_enrichment(client, monkeypatch):
+    from src.mindfuly.routes import youtube
+    detail_batches = []
+
+    async def fake_upstream_get(upstream, path, params):
+        if path == youtube.YOUTUBE_VIDEOS_PATH:
+            detail_batches.append(params["id"].split(","))
+            return fake_videos_response(params, durations={"q-0": "PT1H30M", "q-2": "P0D", "q-4": "PT45S"})
+
+        class FakeResponse:
+            status_code = 200
+            def json(self):
+                return {"items": [{
+                    "id": {"videoId": f"q-{i}"},
+                    "snippet": {"title": "t", "channelTitle": "c", "thumbnails": {"medium": {"url": "t"}}}
+                } for i in range(params["maxResults"])]}
+        return FakeResponse()
+
+    monkeypatch.setattr(youtube, "upstream_get", fake_upstream_get)
+    monkeypatch.setattr(youtube, "quota_ledger", youtube.YouTubeQuotaLedger(daily_quota=10000, reserve=0))
+    monkeypatch.setattr(youtube, "video_details_cache", youtube.TTLCache(1000, 60))
+
+    videos = [youtube.VideoInfo(video_id=f"q-{i}", title="t", channel="c", thumbnail="t") for i in range(120)]
+    videos = asyncio.run(youtube.enrich_videos(videos))
+    assert [len(batch) for batch in detail_batches] == [50, 50, 20] # At most 50 ids per videos.list call
+    assert videos[0].duration_seconds == 5400 and videos[0].view_count == 42
+    assert videos[2].live is True # P0D is a live stream
+    assert videos[1].embeddable is False
+
+    asyncio.run(youtube._search_youtube("q", 50))
+    assert len(detail_batches) == 3 # Details are cached per video id
+
+    monkeypatch.setattr(youtube, "YOUTUBE_API_KEY", "key")
+    monkeypatch.setattr(youtube, "search_cache", youtube.TTLCache(10, 60))
+    response = client.get("/youtube/search?query=q&max_results=50&embeddable_only=true&min_duration=60&max_duration=3600")
+    assert response.status_code == 200 # Response should be 200
+    ids = {video["video_id"] for video in response.json()["videos"]}
+    assert ids and all(int(video_id.split("-")[1]) % 2 == 0 for video_id in ids) # Only embeddable videos
+    assert not ids & {"q-0", "q-2", "q-4"} # Too long, live, or too short
+
+    assert youtube.parse_iso_duration("P1DT2H3M4S") == 93784
+    assert youtube.parse_iso_duration("bogus") is None
+
+# Ensure that pool telemetry is exposed via the metrics endpoint
+def test_db_pool_metrics(client):
+    response = client.get("/metrics/db_pool")
+    assert response.status_code == 200 # Response should be 200
+    assert "db_pool" in response.json() # Pool stats should be present
+
+# Ensure a real pool is warmed up without leaking connections when some fail, and its checkouts are reported
+def test_db_pool_warm_up_and_stats(client, tmp_path, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import event
+    from src.shared import database
+    monkeypatch.setattr(database, "pool_wait_stats", database.PoolWaitStats())
+
+    async def run():
+        await database.dispose_db() # Replace the app's (unreachable) Postgres engines
+        database.init_db(f"sqlite:///{tmp_path / 'pool.db'}", f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+        try:
+            connects = []
+
+            @event.listens_for(database.async_engine.sync_engine, "do_connect")
+            def refuse_one(dialect, conn_rec, cargs, cparams):
+                connects.append(1)
+                if len(connects) == 2:
+                    raise OSError("connection refused")
+
+            await database.warm_up_pool(3)
+            pool = database.async_engine.pool
+            assert (pool.checkedout(), pool.checkedin()) == (0, 2) # The connections that opened went back to the pool
+
+            async with database.AsyncSessionLocal() as db:
+                await db.execute(text("SELECT 1"))
+            return client.get("/metrics/db_pool").json()["db_pool"]
+        finally:
+            await database.dispose_db()
+
+    stats = asyncio.run(run())
+    assert stats["initialized"] is True
+    assert (stats["sync"]["pool_size"], stats["sync"]["max_overflow"]) == (database.DB_SYNC_POOL_SIZE, database.DB_SYNC_MAX_OVERFLOW) # The sync pool is sized and reported separately
+    assert stats["wait"]["checkouts"] == 3 # Two warm-up connections and one session
+    assert (stats["wait"]["waits"], stats["wait"]["timeouts"]) == (0, 0) # Connects aren't counted as waiting
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from src.shared.cache import StaleWhileRevalidateCache, TTLCache
+from src.shared.disk_cache import ContentAddressedCache
+
+"""
+CACHE TESTS
+"""
+
+# Ensure the least recently used entry is evicted once the cache is full
+def test_lru_eviction():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1 # Touch "a" so "b" becomes least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None # "b" should have been evicted
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+# Ensure entries stop being served once their TTL runs out
+def test_ttl_expiry():
+    cache = TTLCache(max_entries=10, ttl_seconds=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+
+    assert cache.get("a") is None # Entry should have expired
+    assert cache.stats()["expirations"] == 1
+
+# Ensure concurrent misses for the same key share a single load
+def test_concurrent_misses_are_collapsed():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(20)))
+
+    assert asyncio.run(run()) == ["value"] * 20
+    assert calls == 1 # Loader should only run once
+    assert cache.stats()["coalesced"] == 19
+
+# Ensure a failed load is raised to every waiter and not cached
+def test_failed_load_is_not_cached():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results) # Every waiter should see the error
+    assert cache.get("key") is None # Nothing should be cached
+
+# Ensure a stale entry is served immediately while exactly one background refresh replaces it
+def test_stale_while_revalidate():
+    cache = StaleWhileRevalidateCache(max_entries=10, fresh_seconds=0.05, stale_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+        await asyncio.sleep(0.06) # Let the entry go stale
+        stale = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+        await asyncio.sleep(0.03) # Let the background refresh finish
+        refreshed = await cache.get_or_load("key", loader)
+        return first, stale, refreshed
+
+    first, stale, refreshed = asyncio.run(run())
+    assert first == [1] * 5 # Concurrent misses should share one load
+    assert stale == [1] * 5 # Stale value should be served without waiting
+    assert refreshed == 2 # Background refresh should have replaced it
+    assert calls == 2 # Only one refresh despite five stale reads
+    assert cache.stats()["stale_hits"] == 5
+
+# Ensure identical content is stored once and the least recently used blobs are evicted past max_bytes
+def test_content_addressed_cache(tmp_path):
+    cache = ContentAddressedCache(str(tmp_path), max_bytes=25)
+    digest = cache.put("a", b"x" * 10)
+    assert cache.put("b", b"x" * 10) == digest # Same content, same blob
+    assert cache.stats()["blobs"] == 1
+
+    cache.put("c", b"y" * 10)
+    assert cache.get("a") == (digest, b"x" * 10) # Touch "a" so "c" becomes least recently used
+    cache.put("d", b"z" * 10)
+
+    assert cache.get("c") is None # Evicted blob reads as a miss
+    assert cache.get("b")[1] == b"x" * 10
+    assert cache.stats()["evictions"] == 1
+
+    reopened = ContentAddressedCache(str(tmp_path), max_bytes=25)
+    assert reopened.get("d")[1] == b"z" * 10 # Survives a restart
+    assert reopened.stats()["bytes"] == 20
+    assert len(list((tmp_path / "refs").iterdir())) == 3 # The evicted blob's ref went with it
+
+# Ensure a blob another worker evicted is written again instead of missing forever
+def test_content_addressed_cache_shared_directory(tmp_path):
+    first = ContentAddressedCache(str(tmp_path), max_bytes=15)
+    second = ContentAddressedCache(str(tmp_path), max_bytes=15)
+    digest = first.put("a", b"x" * 10)
+    assert second.get("a") == (digest, b"x" * 10) # Blobs written by another worker are picked up
+
+    second.put("b", b"y" * 10) # Over the limit: second evicts "a"
+    assert first.get("a") is None
+    assert asyncio.run(first.put_async("a", b"x" * 10)) == digest
+    assert asyncio.run(first.get_async("a")) == (digest, b"x" * 10) # Rewritten rather than a permanent miss
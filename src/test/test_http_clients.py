@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+import httpx
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.shared import http_clients
+
+"""
+FIXTURES AND HELPERS
+"""
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(scope='function')
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setitem(http_clients.UPSTREAMS, "test", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setitem(http_clients.upstream_stats, "test", http_clients.UpstreamStats())
+    yield "test"
+
+    server.shutdown()
+    server.server_close()
+
+"""
+UPSTREAM CLIENT TESTS
+"""
+
+# Ensure requests to an upstream share one pooled keep-alive connection and are counted as reuses
+def test_upstream_connection_reuse(upstream):
+    async def run():
+        try:
+            return [(await http_clients.upstream_get(upstream, "/ping")).json() for _ in range(3)]
+        finally:
+            await http_clients.close_clients()
+
+    assert asyncio.run(run()) == [{"ok": True}] * 3
+
+    stats = http_clients.upstream_stats_snapshot()[upstream]
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 1 # Only the first request should connect
+    assert stats["reused_connections"] == 2
+    assert stats["latency"]["count"] == 3
+
+# Ensure connection failures are counted as errors and surface as httpx errors
+def test_upstream_connection_error(monkeypatch):
+    monkeypatch.setitem(http_clients.UPSTREAMS, "closed", "http://127.0.0.1:9")
+    monkeypatch.setitem(http_clients.upstream_stats, "closed", http_clients.UpstreamStats())
+
+    async def run():
+        try:
+            await http_clients.upstream_get("closed", "/")
+        finally:
+            await http_clients.close_clients()
+
+    with pytest.raises(httpx.RequestError):
+        asyncio.run(run())
+    assert http_clients.upstream_stats["closed"].errors == 1
@@ -0,0 +1,614 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, event, text
+
+from user_service_v2.models.user import (
+    Base,
+    UserRepositoryV2,
+    get_user_repository_v2
+)
+
+from mindfuly.api import app
+from src.shared.models import MoodLog, MoodLogRepositoryV2, analytics_cache, get_mood_log_repository_v2, parse_weather
+from src.shared.idempotency import idempotency_cache, run_idempotent
+from src.shared.user_cache import user_cache
+from src.shared.write_behind import MoodLogWriteBehind, WriteBehindFull
+from src.mindfuly.auth.jwt_utils import create_access_token
+
+"""
+FIXTURES AND HELPERS
+"""
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # The caches are process-wide and every test reuses the same user id (and a fresh database)
+    analytics_cache.clear()
+    user_cache.clear()
+    idempotency_cache.clear()
+    yield
+    analytics_cache.clear()
+    user_cache.clear()
+    idempotency_cache.clear()
+
+@pytest.fixture(scope='function')
+def engine():
+    engine = create_engine("sqlite:///:memory:?check_same_thread=False")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+
+@pytest.fixture(scope='function')
+def session(engine):
+    conn = engine.connect()
+    conn.begin()
+    db = Session(bind=conn)
+    yield db
+    db.rollback()
+    conn.close()
+
+@pytest.fixture(scope='function')
+def mood_repo(session):
+    yield MoodLogRepositoryV2(session)
+
+@pytest.fixture(scope='function')
+def client(session, mood_repo):
+    app.dependency_overrides[get_user_repository_v2] = lambda: UserRepositoryV2(session)
+    app.dependency_overrides[get_mood_log_repository_v2] = lambda: mood_repo
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+@pytest.fixture(scope='function')
+def created_user(session):
+    user_data = {"name": "foo", "id": 5, "email": "fee", "hashed_password": "hash", "tier": 1}
+    session.execute(text("INSERT INTO users (name, id, email, hashed_password, tier) VALUES (:name, :id, :email, :hashed_password, :tier)"), user_data)
+    session.commit()
+    return user_data
+
+@pytest.fixture(scope='function')
+def captured_queries(engine):
+    # Record every SELECT the repository sends so its real SQL can be EXPLAINed
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield queries
+    event.remove(engine, "before_cursor_execute", capture)
+
+def query_plans(session, queries):
+    return [
+        [row[-1] for row in session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()]
+        for statement, parameters in queries
+    ]
+
+"""
+REPOSITORY TESTS
+"""
+
+# Ensure the repository still works on a plain (sync) Session, as used by the SQLite fixtures
+def test_sync_session_fallback(mood_repo, created_user):
+    asyncio.run(mood_repo.create_mood_log(created_user["id"], mood_value=4, energy_level=2, notes="hi"))
+    asyncio.run(mood_repo.create_mood_log(created_user["id"], mood_value=2, energy_level=4))
+
+    stats = asyncio.run(mood_repo.get_mood_stats(created_user["id"]))
+    assert stats == {"avg_mood": 3.0, "avg_energy": 3.0, "total_logs": 2}
+
+    latest = asyncio.run(mood_repo.get_latest_mood_log(created_user["id"]))
+    assert isinstance(latest, MoodLog)
+
+# Ensure keyset pages walk the whole history newest-first without gaps or repeats, even across timestamp ties
+def test_mood_logs_cursor_pagination(mood_repo, created_user):
+    start = datetime(2024, 1, 1)
+    for day in range(5):
+        for _ in range(2): # Two logs share each timestamp
+            asyncio.run(mood_repo.create_log_on_date(created_user["id"], mood_value=3, energy_level=3, date=start + timedelta(days=day)))
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = asyncio.run(mood_repo.get_mood_logs_page(created_user["id"], limit=3, cursor=cursor))
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 10 # Every log should be returned
+    assert len({log.id for log in seen}) == 10 # No log should be repeated
+    assert [log.created_at for log in seen] == sorted((log.created_at for log in seen), reverse=True) # Newest first
+
+    bounded, _ = asyncio.run(mood_repo.get_mood_logs_page(created_user["id"], start=start + timedelta(days=1), end=start + timedelta(days=3)))
+    assert len(bounded) == 4 # 'from' is inclusive, 'to' is exclusive
+
+# Ensure that tampered cursors are rejected
+def test_mood_logs_invalid_cursor(mood_repo, created_user):
+    with pytest.raises(ValueError):
+        asyncio.run(mood_repo.get_mood_logs_page(created_user["id"], cursor="not-a-cursor"))
+
+# Ensure bulk ingestion writes every row (across several INSERT chunks) in one call
+def test_bulk_create_mood_logs(mood_repo, created_user):
+    entries = [{"mood_value": 1 + i % 5, "energy_level": 3, "notes": f"log {i}", "created_at": datetime(2024, 1, 1) + timedelta(hours=i)} for i in range(1200)]
+    entries.append({"mood_value": 5, "energy_level": 5}) # created_at defaults to now
+
+    inserted = asyncio.run(mood_repo.bulk_create_mood_logs(created_user["id"], entries))
+    assert inserted == 1201 # Every entry should be written
+
+    stats = asyncio.run(mood_repo.get_mood_stats(created_user["id"]))
+    assert stats["total_logs"] == 1201 # All rows should be visible
+
+# Ensure the daily rollups always match an aggregate over the raw logs, through every write path
+def test_rollups_follow_every_write_path(mood_repo, session, created_user):
+    user_id = created_user["id"]
+
+    def raw_daily():
+        return session.execute(text(
+            "SELECT date(created_at), count(*), sum(mood_value), min(mood_value), max(mood_value), "
+            "sum(energy_level), min(energy_level), max(energy_level) FROM mood_logs WHERE user_id = :u GROUP BY 1 ORDER BY 1"
+        ), {"u": user_id}).all()
+
+    def rollups():
+        return session.execute(text(
+            "SELECT day, log_count, mood_sum, mood_min, mood_max, energy_sum, energy_min, energy_max "
+            "FROM mood_daily_rollups WHERE user_id = :u ORDER BY day"
+        ), {"u": user_id}).all()
+
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=2, energy_level=5, date=datetime(2024, 3, 4, 9)))
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=4, energy_level=1, date=datetime(2024, 3, 4, 18)))
+    asyncio.run(mood_repo.bulk_create_mood_logs(user_id, [{"mood_value": 5, "energy_level": 5, "created_at": datetime(2024, 3, 5)}, {"mood_value": 1, "energy_level": 2, "created_at": datetime(2024, 3, 4, 20)}]))
+    asyncio.run(mood_repo.create_mood_log(user_id, mood_value=3, energy_level=3))
+    assert rollups() == raw_daily() # Rollups should match after inserts
+
+    asyncio.run(mood_repo.edit_latest_mood_log(user_id, mood_value=1, energy_level=1))
+    assert rollups() == raw_daily() # Rollups should match after an edit
+
+    stats = asyncio.run(mood_repo.get_mood_stats(user_id))
+    assert stats == {"avg_mood": 2.6, "avg_energy": 2.8, "total_logs": 5} # Stats are computed from the rollups
+
+    asyncio.run(mood_repo.clear_mood_logs(user_id))
+    assert rollups() == [] # Rollups should be cleared with the logs
+
+# Ensure weekday stats come back in calendar order and respect the requested time zone
+def test_weekly_mood_stats(mood_repo, created_user):
+    user_id = created_user["id"]
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=5, energy_level=1, date=datetime(2024, 3, 4, 3))) # Monday 03:00 UTC
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=1, energy_level=5, date=datetime(2024, 3, 3, 12))) # Sunday
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=3, energy_level=3, date=datetime(2024, 3, 3, 14))) # Sunday
+
+    weekly = asyncio.run(mood_repo.get_weekly_mood_stats(user_id))
+    assert weekly == [
+        {"day": "Monday", "avg_mood": 5.0, "avg_energy": 1.0, "total_logs": 1},
+        {"day": "Sunday", "avg_mood": 2.0, "avg_energy": 4.0, "total_logs": 2},
+    ]
+
+    # 03:00 UTC Monday is still Sunday evening in Vancouver
+    local = asyncio.run(mood_repo.get_weekly_mood_stats(user_id, tz="America/Vancouver"))
+    assert local == [{"day": "Sunday", "avg_mood": 3.0, "avg_energy": 3.0, "total_logs": 3}]
+
+    with pytest.raises(ValueError):
+        asyncio.run(mood_repo.get_weekly_mood_stats(user_id, tz="Mars/Olympus_Mons"))
+
+# Ensure cached analytics are served from memory and dropped by every write path
+def test_analytics_cache_invalidated_on_write(mood_repo, created_user, captured_queries):
+    user_id = created_user["id"]
+    asyncio.run(mood_repo.create_mood_log(user_id, mood_value=2, energy_level=2))
+
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 1
+    captured_queries.clear()
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 1
+    assert captured_queries == [] # Second read should be a cache hit
+
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=4, energy_level=4, date=datetime(2024, 1, 1)))
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 2 # Insert should invalidate
+
+    asyncio.run(mood_repo.edit_latest_mood_log(user_id, mood_value=5))
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["avg_mood"] == 4.5 # Edit should invalidate
+
+    asyncio.run(mood_repo.bulk_create_mood_logs(user_id, [{"mood_value": 1, "energy_level": 1}]))
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 3 # Bulk insert should invalidate
+
+    asyncio.run(mood_repo.clear_mood_logs(user_id))
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 0 # Clear should invalidate
+
+# Ensure cached recent logs are detached copies and a user's generation is dropped on eviction, not kept forever
+def test_analytics_cache_holds_no_orm_rows(mood_repo, created_user, monkeypatch):
+    from src.shared import models
+    user_id = created_user["id"]
+    asyncio.run(mood_repo.create_mood_log(user_id, mood_value=2, energy_level=2))
+
+    logs = asyncio.run(mood_repo.get_mood_logs(user_id))
+    assert not isinstance(logs[0], MoodLog) and logs[0].mood_value == 2
+    with pytest.raises(ValueError):
+        logs[0].mood_value = 5 # Shared entries can't be changed by one reader
+
+    generations = models.TTLCache(max_entries=1, ttl_seconds=60)
+    monkeypatch.setattr(models, "_analytics_generations", generations)
+    for other_user in range(100, 110):
+        asyncio.run(mood_repo.get_mood_stats(other_user))
+    assert len(generations.items()) == 1 # Bounded however many users are read
+    asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=4, energy_level=4, date=datetime(2024, 1, 1)))
+    assert asyncio.run(mood_repo.get_mood_stats(user_id))["total_logs"] == 2 # An evicted generation never revives old entries
+
+# Ensure weather text is split into temperature and a shared condition, and stats group on the condition
+def test_weather_conditions(mood_repo, session, created_user):
+    user_id = created_user["id"]
+    assert parse_weather("12°C – Light  Rain") == (12.0, "light rain")
+    assert parse_weather("-3°C") == (-3.0, None)
+    assert parse_weather("Location denied") == (None, None)
+    assert parse_weather("20°C – raining frogs") == (20.0, "other") # Unknown descriptions never become new conditions
+
+    for weather, mood in [("12°C – light rain", 2), ("14°C – Light Rain", 4), ("-3°C – clear sky", 5), ("Location denied", 1)]:
+        asyncio.run(mood_repo.create_log_on_date(user_id, mood_value=mood, energy_level=3, weather=weather, date=datetime(2024, 1, 1)))
+
+    stats = asyncio.run(mood_repo.get_weather_mood_stats(user_id))
+    assert [(row["weather"], row["avg_mood"], row["total_logs"]) for row in stats] == [("clear sky", 5.0, 1), ("light rain", 3.0, 2)]
+
+    banded = asyncio.run(mood_repo.get_weather_mood_stats(user_id, temperature_band=10))
+    assert [(row["weather"], row["temperature_min_c"], row["temperature_max_c"]) for row in banded] == [
+        ("clear sky", -10, 0), # Negative temperatures floor into the band below zero
+        ("light rain", 10, 20),
+    ]
+
+    # Rows written before the columns existed
+    session.execute(text("INSERT INTO mood_logs (user_id, mood_value, energy_level, weather, created_at) VALUES (5, 1, 1, '21°C – clear sky', '2024-01-02')"))
+    session.commit()
+    assert asyncio.run(mood_repo.backfill_weather_columns(batch_size=10)) is not None
+    assert asyncio.run(mood_repo.backfill_weather_columns(after_id=10**6)) is None
+    stats = asyncio.run(mood_repo.get_weather_mood_stats(user_id))
+    assert stats[0] == {"weather": "clear sky", "condition_id": stats[0]["condition_id"], "avg_mood": 3.0, "avg_energy": 2.0, "total_logs": 2}
+
+    for weather in ("spam 1", "spam 2", "18°C – spam 3"):
+        asyncio.run(mood_repo.create_mood_log(user_id, mood_value=3, energy_level=3, weather=weather))
+    names = session.execute(text("SELECT name FROM weather_conditions ORDER BY name")).scalars().all()
+    assert names == ["clear sky", "light rain", "other"] # Free text shares one bucket
+
+    other_engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=other_engine)
+    with Session(other_engine) as other_session:
+        other_session.execute(text("INSERT INTO weather_conditions (id, name) VALUES (1, 'fog'), (2, 'mist'), (3, 'haze')"))
+        other_session.commit()
+        asyncio.run(MoodLogRepositoryV2(other_session).create_mood_log(user_id, mood_value=3, energy_level=3, weather="light rain"))
+        stored = other_session.execute(text("SELECT weather_conditions.name FROM mood_logs JOIN weather_conditions ON weather_conditions.id = mood_logs.condition_id")).scalars().all()
+    assert stored == ["light rain"] # Ids looked up in the first database aren't reused for another
+    other_engine.dispose()
+
+# Ensure write-behind submissions are written in batches, flushed on stop, and refused when the queue stays full
+def test_write_behind_batches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'write_behind.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.execute(text("INSERT INTO users (name, id, email, hashed_password, tier) VALUES ('foo', 5, 'fee', 'hash', 1)"))
+        db.commit()
+
+    batcher = MoodLogWriteBehind(enabled=True, batch_size=2, flush_ms=1000, max_queue=10, session_factory=lambda: Session(engine))
+
+    async def run():
+        batcher.start()
+        queued = [await batcher.enqueue(5, mood_value=mood, energy_level=3, weather="10°C – clear sky") for mood in range(1, 6)]
+        await batcher.stop() # The fifth row is still waiting for a batch partner
+        return queued
+
+    queued = asyncio.run(run())
+    assert queued[0].id is None and queued[0].user_id == 5 # Acknowledged before it is written
+    stats = batcher.stats()
+    assert (stats["batches"], stats["rows_written"], stats["max_batch_size"]) == (3, 5, 2)
+
+    with Session(engine) as db:
+        repo = MoodLogRepositoryV2(db)
+        assert asyncio.run(repo.get_mood_stats(5)) == {"avg_mood": 3.0, "avg_energy": 3.0, "total_logs": 5} # Rollups kept in step
+    engine.dispose()
+
+    full = MoodLogWriteBehind(enabled=True, max_queue=1, enqueue_timeout_ms=10)
+
+    async def overflow():
+        full._queue = asyncio.Queue(maxsize=1) # No flusher draining it
+        await full.enqueue(5, mood_value=3, energy_level=3)
+        await full.enqueue(5, mood_value=3, energy_level=3)
+
+    with pytest.raises(WriteBehindFull):
+        asyncio.run(overflow())
+    assert full.stats()["rejected"] == 1
+
+# Ensure a rejected row only drops itself and a transient failure is retried instead of dropping the batch
+def test_write_behind_isolates_failures(tmp_path):
+    from sqlalchemy.exc import OperationalError
+    engine = create_engine(f"sqlite:///{tmp_path / 'write_behind.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.execute(text("INSERT INTO users (name, id, email, hashed_password, tier) VALUES ('foo', 5, 'fee', 'hash', 1)"))
+        db.commit()
+
+    outages = [OperationalError("INSERT", {}, Exception("connection refused"))]
+
+    def session_factory():
+        if outages:
+            raise outages.pop()
+        return Session(engine)
+
+    batcher = MoodLogWriteBehind(enabled=True, batch_size=4, flush_ms=1000, max_queue=10, retry_backoff_ms=1, session_factory=session_factory)
+
+    async def run():
+        batcher.start()
+        for mood in (1, 2, None, 4): # The NOT NULL violation stands in for a row the database refuses
+            await batcher.enqueue(5, mood_value=mood, energy_level=3)
+        await batcher.stop()
+
+    asyncio.run(run())
+    stats = batcher.stats()
+    assert (stats["rows_written"], stats["failed_rows"], stats["retries"]) == (3, 1, 1)
+
+    with Session(engine) as db:
+        assert asyncio.run(MoodLogRepositoryV2(db).get_mood_stats(5))["total_logs"] == 3 # The other rows were kept
+    engine.dispose()
+
+# Ensure the dashboard on an async engine, with its sections on separate sessions, matches the individual calls
+def test_dashboard_async_engine(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'dashboard.db'}")
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("INSERT INTO users (name, id, email, hashed_password, tier) VALUES ('foo', 5, 'fee', 'hash', 1)"))
+
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                repo = MoodLogRepositoryV2(db)
+                await repo.create_log_on_date(5, mood_value=4, energy_level=2, weather="Clear", date=datetime(2024, 1, 1))
+                await repo.create_log_on_date(5, mood_value=2, energy_level=4, weather="Rain", date=datetime(2024, 1, 2))
+
+                dashboard = await repo.get_dashboard(5, log_limit=5)
+                analytics_cache.clear()
+                expected = {
+                    "mood_stats": await repo.get_mood_stats(5),
+                    "weekly_mood_stats": await repo.get_weekly_mood_stats(5),
+                    "weather_mood_stats": await repo.get_weather_mood_stats(5),
+                    "running_means": await repo.get_running_means(5),
+                }
+        finally:
+            await async_engine.dispose()
+        return dashboard, expected
+
+    dashboard, expected = asyncio.run(run())
+    assert {key: dashboard[key] for key in expected} == expected # Every section should match its standalone query
+    assert [log.mood_value for log in dashboard["mood_logs"]] == [2, 4] # Recent logs should be newest first
+
+# Ensure "Load older entries" and journal search read on their own session and give the connection back every time
+def test_journal_pages_release_connections(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from index.main import fetch_journal_page
+    from src.shared import database
+
+    async def run():
+        await database.dispose_db()
+        database.init_db(f"sqlite:///{tmp_path / 'journal.db'}", f"sqlite+aiosqlite:///{tmp_path / 'journal.db'}")
+        try:
+            async with database.async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with database.AsyncSessionLocal() as db:
+                repo = MoodLogRepositoryV2(db)
+                for day in range(45):
+                    await repo.create_log_on_date(5, mood_value=3, energy_level=3, notes="exam" if day % 2 else "walk", date=datetime(2024, 1, 1) + timedelta(days=day))
+
+            pool = database.async_engine.pool
+            seen, cursor = [], None
+            for _ in range(3):
+                logs, highlights, cursor = await fetch_journal_page(5, cursor=cursor)
+                seen.extend(log.id for log in logs)
+                assert pool.checkedout() == 0 # Nothing left open in a transaction between clicks
+
+            found, cursor = [], None
+            for _ in range(2):
+                logs, highlights, cursor = await fetch_journal_page(5, "exam", cursor)
+                found.extend(log.notes for log in logs)
+                assert pool.checkedout() == 0
+            return seen, found, cursor
+        finally:
+            await database.dispose_db()
+
+    seen, found, cursor = asyncio.run(run())
+    assert len(set(seen)) == 45 # Every entry once
+    assert found == ["exam"] * 22 and cursor is None # Searches page through the matches alone
+
+"""
+API TESTS
+"""
+
+# Ensure the token-identified endpoint logs for the token's uid claim, with no username in the body
+def test_create_own_mood_log(client, mood_repo, created_user):
+    token = create_access_token({"sub": "renamed-since", "uid": created_user["id"], "tier": 1})
+    response = client.post(
+        "/mood/me/log",
+        json={"mood_value": 4, "energy_level": 3},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 201 # Response should be 201
+    assert response.json()["mood_log"]["user_id"] == created_user["id"] # Identity should come from the uid claim
+    assert asyncio.run(mood_repo.get_mood_stats(created_user["id"]))["total_logs"] == 1
+
+    legacy_token = create_access_token({"sub": created_user["name"]})
+    response = client.post(
+        "/mood/me/log",
+        json={"mood_value": 2, "energy_level": 2},
+        headers={"Authorization": f"Bearer {legacy_token}"},
+    )
+    assert response.status_code == 201 # Tokens without a uid claim should fall back to the username
+
+    assert client.post("/mood/me/log", json={"mood_value": 2, "energy_level": 2}).status_code == 401 # A token is required
+
+# Ensure create and edit return the persisted row, and edit finds the latest log without a separate SELECT
+def test_create_and_edit_return_persisted_row(client, mood_repo, created_user, captured_queries):
+    assert client.put("/mood/edit_log", json={"username": created_user["name"], "mood_value": 1, "energy_level": 1}).status_code == 404 # Nothing to edit yet
+
+    asyncio.run(mood_repo.create_log_on_date(created_user["id"], mood_value=2, energy_level=2, date=datetime(2024, 1, 1)))
+    created = client.post("/mood/log", json={"username": created_user["name"], "mood_value": 4, "energy_level": 3}).json()["mood_log"]
+    assert created["id"] is not None # The id comes back from INSERT ... RETURNING
+    stored = asyncio.run(mood_repo.get_latest_mood_log(created_user["id"]))
+    assert (created["id"], datetime.fromisoformat(created["created_at"])) == (stored.id, stored.created_at) # Not a fresh timestamp
+
+    captured_queries.clear()
+    edited = asyncio.run(mood_repo.edit_latest_mood_log(created_user["id"], mood_value=5, notes="better"))
+    assert not [statement for statement, _ in captured_queries if "FROM mood_logs" in statement and "mood_daily_rollups" not in statement] # Latest row chosen by the UPDATE's subselect
+    assert (edited.id, edited.mood_value, edited.energy_level, edited.notes) == (created["id"], 5, 3, "better")
+
+    response = client.put("/mood/edit_log", json={"username": created_user["name"], "mood_value": 3, "energy_level": 2})
+    assert response.status_code == 200 # Response should be 200
+    assert response.json()["mood_log"]["id"] == created["id"]
+    assert asyncio.run(mood_repo.get_mood_stats(created_user["id"]))["avg_mood"] == 2.5 # Rollups follow the edit
+
+# Ensure edit returns the new values even when the latest row is already loaded in a session that keeps objects across commits
+def test_edit_refreshes_loaded_row(mood_repo, session, created_user):
+    session.expire_on_commit = False # Like the app's async sessions
+    asyncio.run(mood_repo.create_mood_log(created_user["id"], mood_value=2, energy_level=2))
+    loaded = asyncio.run(mood_repo.get_latest_mood_log(created_user["id"]))
+
+    edited = asyncio.run(mood_repo.edit_latest_mood_log(created_user["id"], mood_value=5, notes="better"))
+    assert edited is loaded # Same identity...
+    assert (edited.mood_value, edited.notes) == (5, "better") # ...with the updated values
+
+# Ensure a retried request with the same Idempotency-Key replays the first response without a second insert
+def test_create_mood_log_idempotency_key(client, mood_repo, created_user):
+    payload = {"username": created_user["name"], "mood_value": 4, "energy_level": 3, "notes": "once"}
+    first = client.post("/mood/log", json=payload, headers={"Idempotency-Key": "retry-1"})
+    replay = client.post("/mood/log", json=payload, headers={"Idempotency-Key": "retry-1"})
+
+    assert first.status_code == replay.status_code == 201 # Replays keep the original status
+    assert replay.json() == first.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert asyncio.run(mood_repo.get_mood_stats(created_user["id"]))["total_logs"] == 1 # Written once
+
+    conflict = client.post("/mood/log", json={**payload, "mood_value": 1}, headers={"Idempotency-Key": "retry-1"})
+    assert conflict.status_code == 422 # Same key, different request
+
+    assert client.post("/mood/log", json=payload).status_code == 201 # No key, no deduplication
+    assert asyncio.run(mood_repo.get_mood_stats(created_user["id"]))["total_logs"] == 2
+
+# Ensure a failed attempt isn't replayed, so retrying with the same key can still succeed
+def test_idempotency_key_failures_not_remembered():
+    results = [(409, {"detail": "Something went wrong"}), (201, {"ok": True})]
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return results[len(calls) - 1]
+
+    async def run():
+        return [await run_idempotent("scope", "key-1", {"mood_value": 3}, handler) for _ in range(3)]
+
+    assert asyncio.run(run()) == [
+        (409, {"detail": "Something went wrong"}, False),
+        (201, {"ok": True}, False), # The failure ran again rather than replaying the 409
+        (201, {"ok": True}, True),
+    ]
+    assert len(calls) == 2
+
+# Ensure the dashboard endpoint returns every analytics section for the user in one response
+def test_dashboard_endpoint(client, mood_repo, created_user):
+    asyncio.run(mood_repo.create_log_on_date(created_user["id"], mood_value=4, energy_level=2, weather="Clear", date=datetime(2024, 1, 1)))
+    asyncio.run(mood_repo.create_log_on_date(created_user["id"], mood_value=2, energy_level=4, weather="Rain", date=datetime(2024, 1, 2)))
+
+    response = client.get(f"/mood/dashboard/{created_user['name']}?log_limit=1")
+
+    assert response.status_code == 200 # Response should be 200
+    body = response.json()
+    assert set(body) == {"mood_stats", "weekly_mood_stats", "weather_mood_stats", "running_means", "mood_logs"}
+    assert body["mood_stats"] == {"avg_mood": 3.0, "avg_energy": 3.0, "total_logs": 2}
+    assert len(body["mood_logs"]) == 1 # log_limit should cap the recent logs
+    assert len(body["running_means"]) == 2
+
+    response = client.get(f"/mood/dashboard/{created_user['name']}?sections=weather_mood_stats,mood_stats")
+    assert set(response.json()) == {"mood_stats", "weather_mood_stats"} # Only the requested sections are loaded
+    assert client.get(f"/mood/dashboard/{created_user['name']}?sections=everything").status_code == 400 # Unknown sections should 400
+
+    assert client.get("/mood/dashboard/nobody").status_code == 404 # Unknown users should 404
+    assert client.get(f"/mood/dashboard/{created_user['name']}?tz=Not/AZone").status_code == 400 # Unknown zones should 400
+
+# Ensure note search matches every word, highlights safely, and pages with the cursor
+def test_search_endpoint(client, mood_repo, created_user):
+    notes = ["Studied for my <b>exam</b> all day", "Nice walk", "Exam went well, feeling relieved", "exam prep again", None]
+    for day, note in enumerate(notes, start=1):
+        asyncio.run(mood_repo.create_log_on_date(created_user["id"], mood_value=3, energy_level=3, notes=note, date=datetime(2024, 1, day)))
+
+    first = client.get(f"/mood/search/{created_user['name']}?q=EXAM&limit=2")
+    assert first.status_code == 200 # Response should be 200
+    body = first.json()
+    assert [result["notes"] for result in body["results"]] == ["exam prep again", "Exam went well, feeling relieved"] # Newest first on SQLite
+    assert body["results"][1]["highlight"] == "<mark>Exam</mark> went well, feeling relieved"
+
+    second = client.get(f"/mood/search/{created_user['name']}?q=exam&limit=2&cursor={body['next_cursor']}").json()
+    assert second["next_cursor"] is None
+    assert second["results"][0]["highlight"] == "Studied for my &lt;b&gt;<mark>exam</mark>&lt;/b&gt; all day" # Notes are HTML-escaped
+
+    assert client.get(f"/mood/search/{created_user['name']}?q=exam relieved").json()["results"][0]["id"] == body["results"][1]["id"] # Every word must match
+    assert client.get(f"/mood/search/{created_user['name']}?q=exam&cursor=bogus").status_code == 400 # Bad cursors should 400
+    assert client.get(f"/mood/search/{created_user['name']}?q=").status_code == 422 # A query is required
+
+# Ensure the bulk endpoint accepts NDJSON, writes the valid rows and reports the invalid ones
+def test_bulk_endpoint_ndjson(client, created_user):
+    body = "\n".join([
+        '{"mood_value": 3, "energy_level": 4, "notes": "ok"}',
+        '{"mood_value": 9, "energy_level": 4}',
+        'not json',
+        '{"mood_value": 2, "energy_level": 2, "created_at": "2024-05-01T08:00:00Z"}',
+    ])
+    response = client.post(
+        f"/mood/logs/bulk/{created_user['name']}",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200 # Response should be 200
+    assert response.json()["inserted"] == 2 # Only the valid rows should be written
+    assert [error["row"] for error in response.json()["errors"]] == [1, 2] # Invalid rows should be reported by index
+
+# Ensure the bulk endpoint also accepts a plain JSON array
+def test_bulk_endpoint_json_array(client, created_user):
+    response = client.post(
+        f"/mood/logs/bulk/{created_user['name']}",
+        json=[{"mood_value": 3, "energy_level": 4}, {"mood_value": 4, "energy_level": 5}],
+    )
+
+    assert response.status_code == 200 # Response should be 200
+    assert response.json() == {"inserted": 2, "rejected": 0, "errors": []}
+
+    response = client.post(f"/mood/logs/bulk/{created_user['name']}", content=b'[{"notes": "\xff"}]', headers={"Content-Type": "application/json"})
+    assert response.status_code == 400 # A body that isn't UTF-8 should 400
+
+"""
+INDEX USAGE TESTS
+"""
+
+# Ensure the hot per-user queries are answered through the (user_id, created_at) index rather than a table scan
+@pytest.mark.parametrize("method, kwargs", [
+    ("get_latest_mood_log", {}),
+    ("get_mood_logs", {"limit": 20}),
+    ("get_mood_logs_page", {"limit": 20}),
+    ("get_most_recent_log_date", {}),
+])
+def test_hot_queries_use_user_created_at_index(mood_repo, session, created_user, captured_queries, method, kwargs):
+    asyncio.run(getattr(mood_repo, method)(created_user["id"], **kwargs))
+    assert captured_queries # The repository should have issued a query
+
+    for plan in query_plans(session, captured_queries):
+        assert any("ix_mood_logs_user_id_created_at" in step for step in plan), plan # Index should be used
+        assert not any(step.startswith("SCAN mood_logs") for step in plan), plan # No full table scan
+
+# Ensure the stats are read from the daily rollups through their (user_id, day) primary key
+@pytest.mark.parametrize("method, kwargs", [
+    ("get_running_means", {"limit": 20}),
+    ("get_mood_stats", {}),
+    ("get_weekly_mood_stats", {}),
+])
+def test_stats_queries_use_rollup_primary_key(mood_repo, session, created_user, captured_queries, method, kwargs):
+    asyncio.run(getattr(mood_repo, method)(created_user["id"], **kwargs))
+    assert captured_queries # The repository should have issued a query
+
+    for plan in query_plans(session, captured_queries):
+        assert any("USING INDEX sqlite_autoindex_mood_daily_rollups_1" in step or "USING PRIMARY KEY" in step for step in plan), plan # Primary key should be used
+        assert not any(step.startswith("SCAN mood") for step in plan), plan # No full table scan